@@ -9,16 +9,14 @@
 
 import logging
 from dataclasses import dataclass
-from typing import Optional
+from typing import Optional, TYPE_CHECKING
 from pydantic_settings import BaseSettings
 from pydantic import Field
 from pydantic_ai import Agent, RunContext
-from pydantic_ai.providers.openai import OpenAIProvider
-from pydantic_ai.models.openai import OpenAIModel
 from dotenv import load_dotenv
 
-# 加载环境变量
-load_dotenv()
+if TYPE_CHECKING:
+    from pydantic_ai.models.openai import OpenAIModel
 
 logger = logging.getLogger(__name__)
 
@@ -37,8 +35,14 @@ class Settings(BaseSettings):
         case_sensitive = False
 
 
-def get_llm_model() -> OpenAIModel:
+def get_llm_model() -> "OpenAIModel":
     """从环境设置获取配置的 LLM 模型。"""
+    # 延迟导入 OpenAI SDK 并加载环境变量，只有真正构建代理时才付出这部分开销
+    from pydantic_ai.providers.openai import OpenAIProvider
+    from pydantic_ai.models.openai import OpenAIModel
+    
+    load_dotenv()
+    
     try:
         settings = Settings()
         provider = OpenAIProvider(
@@ -85,15 +89,6 @@ SYSTEM_PROMPT = """
 """
 
 
-# 创建基础聊天代理 - 注意：没有 result_type，默认为字符串
-chat_agent = Agent(
-    get_llm_model(),
-    deps_type=ConversationContext,
-    system_prompt=SYSTEM_PROMPT
-)
-
-
-@chat_agent.system_prompt
 def dynamic_context_prompt(ctx) -> str:
     """包含对话上下文的动态系统提示。"""
     prompt_parts = []
@@ -110,6 +105,36 @@ def dynamic_context_prompt(ctx) -> str:
     return " ".join(prompt_parts) if prompt_parts else ""
 
 
+_chat_agent: Optional[Agent] = None
+
+
+def get_chat_agent() -> Agent:
+    """
+    获取聊天代理，首次使用时才构建（包括加载设置和创建模型），之后复用。
+    
+    Returns:
+        基础聊天代理
+    """
+    global _chat_agent
+    if _chat_agent is None:
+        # 创建基础聊天代理 - 注意：没有 result_type，默认为字符串
+        agent = Agent(
+            get_llm_model(),
+            deps_type=ConversationContext,
+            system_prompt=SYSTEM_PROMPT
+        )
+        agent.system_prompt(dynamic_context_prompt)
+        _chat_agent = agent
+    return _chat_agent
+
+
+def __getattr__(name: str):
+    """保持 `from agent import chat_agent` 可用，同时延迟构建代理。"""
+    if name == "chat_agent":
+        return get_chat_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 async def chat_with_agent(message: str, context: Optional[ConversationContext] = None) -> str:
     """
     与代理聊天的主要函数。
@@ -128,7 +153,7 @@ async def chat_with_agent(message: str, context: Optional[ConversationContext] =
     context.conversation_count += 1
     
     # 使用消息和上下文运行代理
-    result = await chat_agent.run(message, deps=context)
+    result = await get_chat_agent().run(message, deps=context)
     
     return result.data
 
@@ -151,7 +176,7 @@ def chat_with_agent_sync(message: str, context: Optional[ConversationContext] =
     context.conversation_count += 1
     
     # 同步运行代理
-    result = chat_agent.run_sync(message, deps=context)
+    result = get_chat_agent().run_sync(message, deps=context)
     
     return result.data
 
@@ -0,0 +1,132 @@
+"""CLI 流式事件分发的微基准测试
+
+用一段典型的事件序列（大量文本增量，少量工具调用/结果）比较：
+- 按 type(event).__name__ 字符串比较加 hasattr 链分发（原实现）
+- StreamEventHandler 的 事件类型 -> 处理方法 表分发
+
+两者都通过异步迭代器消费事件（与 CLI 中的 node.stream() 一致），渲染器替换为
+空操作，只测量分发本身，报告每个事件的纳秒开销。
+
+用法：
+    python benchmarks/bench_dispatch.py [--events 200000] [--repeat 5]
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+from pydantic_ai.messages import (
+    FinalResultEvent,
+    FunctionToolCallEvent,
+    FunctionToolResultEvent,
+    PartDeltaEvent,
+    PartStartEvent,
+    TextPart,
+    TextPartDelta,
+    ToolCallPart,
+    ToolReturnPart,
+)
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "main_agent_reference"))
+
+from rendering import StreamEventHandler  # noqa: E402
+
+TOOL_EVENT_EVERY = 1000
+
+
+class NullRenderer:
+    """丢弃所有输出的渲染器。"""
+
+    def write(self, text):
+        pass
+
+    def print(self, markup="", end="\n"):
+        pass
+
+
+def make_events(count: int) -> list:
+    call = ToolCallPart(tool_name="search_web", args={"query": "pydantic ai", "max_results": 10})
+    events = [PartStartEvent(index=0, part=TextPart(content="Hello")), FinalResultEvent(None, None)]
+    for i in range(count):
+        events.append(PartDeltaEvent(index=0, delta=TextPartDelta(content_delta=f" tok{i % 10}")))
+        if i % TOOL_EVENT_EVERY == 0:
+            events.append(FunctionToolCallEvent(part=call))
+            events.append(FunctionToolResultEvent(
+                result=ToolReturnPart(tool_name="search_web", content="ok", tool_call_id=call.tool_call_id)
+            ))
+    return events
+
+
+async def stream(events: list):
+    for event in events:
+        yield event
+
+
+async def dispatch_by_name(events: list, renderer: NullRenderer) -> None:
+    """原 CLI 的分发逻辑（去掉了调试输出）。"""
+    response_text = ""
+    async for event in stream(events):
+        event_type = type(event).__name__
+        if event_type == "PartDeltaEvent":
+            if hasattr(event, 'delta') and hasattr(event.delta, 'content_delta'):
+                delta_text = event.delta.content_delta
+                if delta_text:
+                    renderer.write(delta_text)
+                    response_text += delta_text
+        elif event_type == "FinalResultEvent":
+            renderer.print()
+        elif event_type == "FunctionToolCallEvent":
+            tool_name = "Unknown Tool"
+            args = None
+            if hasattr(event, 'part'):
+                part = event.part
+                if hasattr(part, 'tool_name'):
+                    tool_name = part.tool_name
+                elif hasattr(part, 'function_name'):
+                    tool_name = part.function_name
+                elif hasattr(part, 'name'):
+                    tool_name = part.name
+                if hasattr(part, 'args'):
+                    args = part.args
+                elif hasattr(part, 'arguments'):
+                    args = part.arguments
+            renderer.print(f"Calling tool: {tool_name} {args}")
+        elif event_type == "FunctionToolResultEvent":
+            result = str(event.tool_return) if hasattr(event, 'tool_return') else "No result"
+            renderer.print(f"Tool result: {result[:100]}")
+
+
+async def dispatch_by_table(events: list, renderer: NullRenderer) -> None:
+    handler = StreamEventHandler(renderer)
+    handler.begin_response()
+    await handler.consume(stream(events))
+    handler.end_response()
+
+
+def best_of(fn, events: list, repeat: int) -> float:
+    renderer = NullRenderer()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        asyncio.run(fn(events, renderer))
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CLI 流式事件分发微基准测试")
+    parser.add_argument("--events", type=int, default=200000, help="文本增量事件数")
+    parser.add_argument("--repeat", type=int, default=5, help="重复次数（取最好成绩）")
+    args = parser.parse_args()
+
+    events = make_events(args.events)
+    print(f"{'分发方式':<28}{'ns/事件':>12}")
+    for name, fn in [("类型名字符串 + hasattr", dispatch_by_name), ("类型 -> 处理方法 表", dispatch_by_table)]:
+        elapsed = best_of(fn, events, args.repeat)
+        print(f"{name:<28}{elapsed * 1e9 / len(events):>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
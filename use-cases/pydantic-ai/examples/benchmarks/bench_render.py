@@ -0,0 +1,96 @@
+"""CLI 流式渲染的 CPU 基准测试
+
+模拟模型以固定速率产出文本增量（穿插工具事件行），比较：
+- 逐令牌 console.print（原实现）
+- StreamRenderer 按帧率上限合并刷新
+
+输出到终端模式的内存缓冲区，报告每 1k 令牌的进程 CPU 毫秒数和写入次数。
+
+用法：
+    python benchmarks/bench_render.py [--tokens 20000] [--rate 2000] [--fps 20]
+"""
+
+import argparse
+import asyncio
+import io
+import sys
+import time
+from pathlib import Path
+
+from rich.console import Console
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "main_agent_reference"))
+
+from rendering import StreamRenderer  # noqa: E402
+
+TOOL_EVENT_EVERY = 500
+
+
+def make_console() -> Console:
+    return Console(file=io.StringIO(), force_terminal=True, width=120)
+
+
+async def produce(tokens: int, rate: float, on_delta, on_event) -> None:
+    """按给定速率（令牌/秒）产出增量；每个事件循环批次产出的令牌数由速率决定。"""
+    batch = max(1, int(rate / 1000))  # 约每毫秒一批
+    for i in range(tokens):
+        on_delta(f"tok{i % 10} ")
+        if i % TOOL_EVENT_EVERY == 0:
+            on_event(f"  🔹 [cyan]Calling tool:[/cyan] [bold]search_web[/bold] #{i}")
+        if i % batch == 0:
+            await asyncio.sleep(0.001)
+
+
+async def run_direct(tokens: int, rate: float) -> int:
+    console = make_console()
+    writes = 0
+
+    def on_delta(text):
+        nonlocal writes
+        console.print(text, end="")
+        writes += 1
+
+    def on_event(markup):
+        nonlocal writes
+        console.print(markup)
+        writes += 1
+
+    await produce(tokens, rate, on_delta, on_event)
+    return writes
+
+
+async def run_buffered(tokens: int, rate: float, fps: float) -> int:
+    console = make_console()
+    async with StreamRenderer(console, max_fps=fps) as renderer:
+        await produce(tokens, rate, renderer.write, renderer.print)
+    return renderer.flushes
+
+
+def measure(coro_factory) -> tuple:
+    """返回 (写入次数, 进程 CPU 秒数, 墙钟秒数)。"""
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    writes = asyncio.run(coro_factory())
+    return writes, time.process_time() - cpu_start, time.perf_counter() - wall_start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CLI 流式渲染 CPU 基准测试")
+    parser.add_argument("--tokens", type=int, default=20000, help="模拟的令牌数")
+    parser.add_argument("--rate", type=float, default=2000.0, help="模拟的令牌速率（令牌/秒）")
+    parser.add_argument("--fps", type=float, default=20.0, help="StreamRenderer 的帧率上限")
+    args = parser.parse_args()
+
+    runs = [
+        ("逐令牌 console.print", lambda: run_direct(args.tokens, args.rate)),
+        (f"StreamRenderer ({args.fps:g} fps)", lambda: run_buffered(args.tokens, args.rate, args.fps)),
+    ]
+
+    print(f"{'渲染方式':<28}{'写入次数':>10}{'CPU ms/1k 令牌':>18}{'墙钟 (s)':>12}")
+    for name, factory in runs:
+        writes, cpu, wall = measure(factory)
+        print(f"{name:<28}{writes:>10}{cpu * 1000 / (args.tokens / 1000):>18.2f}{wall:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
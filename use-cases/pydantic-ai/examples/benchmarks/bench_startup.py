@@ -0,0 +1,84 @@
+"""示例代理的启动时间基准测试
+
+在独立的子进程中冷启动导入每个示例的代理模块，测量：
+- 模块导入耗时（不构建代理）
+- 首次获取代理（构建模型和代理）的耗时
+- 导入后是否已经加载了 OpenAI SDK
+
+用法：
+    python benchmarks/bench_startup.py [--runs 5]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+EXAMPLES_DIR = Path(__file__).resolve().parent.parent
+
+# (示例目录, 模块, 代理工厂函数)
+# main_agent_reference 以 agents 包的形式导入（模块内使用 agents.* 绝对导入）
+TARGETS = [
+    ("basic_chat_agent", "agent", "get_chat_agent"),
+    ("tool_enabled_agent", "agent", "get_tool_agent"),
+    ("structured_output_agent", "agent", "get_structured_agent"),
+    ("main_agent_reference", "agents.research_agent", "get_research_agent"),
+]
+
+PROBE = """
+import importlib, json, sys, time
+start = time.perf_counter()
+agent = importlib.import_module(sys.argv[1])
+imported = time.perf_counter()
+openai_loaded = "openai" in sys.modules
+getattr(agent, sys.argv[2])()
+built = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "build_ms": (built - imported) * 1000,
+    "openai_on_import": openai_loaded,
+}))
+"""
+
+
+def measure(example: str, module: str, factory: str, package_dir: str) -> dict:
+    """在新的解释器中运行一次探测脚本。"""
+    env = {
+        **os.environ,
+        "LLM_API_KEY": os.environ.get("LLM_API_KEY", "test-key"),
+        "PYTHONPATH": os.pathsep.join(filter(None, [package_dir, os.environ.get("PYTHONPATH")])),
+    }
+    completed = subprocess.run(
+        [sys.executable, "-c", PROBE, module, factory],
+        cwd=EXAMPLES_DIR / example,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="示例代理启动时间基准测试")
+    parser.add_argument("--runs", type=int, default=5, help="每个示例的冷启动次数")
+    args = parser.parse_args()
+
+    print(f"{'示例':<26}{'导入 (ms)':>12}{'首次构建 (ms)':>16}{'导入时加载 openai':>20}")
+    with tempfile.TemporaryDirectory() as package_dir:
+        # 把 main_agent_reference 以 agents 的名字放到导入路径上
+        os.symlink(EXAMPLES_DIR / "main_agent_reference", Path(package_dir) / "agents")
+        for example, module, factory in TARGETS:
+            samples = [measure(example, module, factory, package_dir) for _ in range(args.runs)]
+            import_ms = statistics.median(s["import_ms"] for s in samples)
+            build_ms = statistics.median(s["build_ms"] for s in samples)
+            openai_loaded = any(s["openai_on_import"] for s in samples)
+            print(f"{example:<26}{import_ms:>12.1f}{build_ms:>16.1f}{str(openai_loaded):>20}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""数值统计引擎在不同输入规模下的耗时基准测试
+
+比较 analyze_numerical_data 原来的多遍纯 Python 计算（只有均值、方差、极值和
+首尾比较趋势）与 numeric_stats.summarize 的纯 Python 后端和 NumPy 后端
+（额外计算百分位数、回归趋势、滚动均值和离群值），以及按块增量计算的
+online_stats.OnlineStats（常数内存，百分位数为 t-digest 估计值，最后一列为
+相对精确值的最大百分位误差）。输入是 Python 浮点数列表，与工具调用参数的
+形式一致，因此 NumPy 后端的耗时包含列表到数组的转换。
+
+用法：
+    python benchmarks/bench_stats.py [--sizes 1000,10000,100000,500000] [--repeat 5]
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "structured_output_agent"))
+
+from numeric_stats import NUMPY_AVAILABLE, summarize  # noqa: E402
+from online_stats import OnlineStats  # noqa: E402
+
+
+def naive_stats(numbers):
+    """原实现：多遍纯 Python 循环。"""
+    count = len(numbers)
+    total = sum(numbers)
+    average = total / count
+    minimum = min(numbers)
+    maximum = max(numbers)
+    variance = sum((x - average) ** 2 for x in numbers) / count
+    std_dev = variance ** 0.5
+    trend = "递增" if numbers[-1] > numbers[0] else "递减"
+    return average, minimum, maximum, std_dev, trend
+
+
+def make_series(size: int, seed: int = 42) -> list:
+    """带线性趋势、噪声和少量尖峰的序列。"""
+    rng = random.Random(seed)
+    series = [100.0 + 0.01 * i + rng.gauss(0, 5) for i in range(size)]
+    for i in range(0, size, max(1, size // 20)):
+        series[i] += 200.0
+    return series
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="数值统计引擎基准测试")
+    parser.add_argument("--sizes", default="1000,10000,100000,500000", help="输入规模列表")
+    parser.add_argument("--repeat", type=int, default=5, help="每项重复次数，取最快一次")
+    args = parser.parse_args()
+
+    backends = ["python"] + (["numpy"] if NUMPY_AVAILABLE else [])
+    if not NUMPY_AVAILABLE:
+        print("未安装 numpy，仅测试纯 Python 后端\n")
+
+    header = (
+        f"{'数据点':>10}{'原实现 (ms)':>14}" + "".join(f"{b + ' (ms)':>16}" for b in backends)
+        + f"{'online (ms)':>16}{'百分位误差':>12}"
+    )
+    print(header)
+    for size in (int(s) for s in args.sizes.split(",")):
+        series = make_series(size)
+        row = f"{size:>10}{best_of(lambda: naive_stats(series), args.repeat) * 1000:>14.2f}"
+        for backend in backends:
+            elapsed = best_of(lambda: summarize(series, backend=backend), args.repeat)
+            row += f"{elapsed * 1000:>16.2f}"
+        elapsed = best_of(lambda: OnlineStats().ingest(series).summary(), args.repeat)
+        exact = summarize(series, backend=backends[-1]).percentiles
+        estimated = OnlineStats().ingest(series).summary().percentiles
+        error = max(abs(estimated[p] - exact[p]) / abs(exact[p]) for p in exact)
+        row += f"{elapsed * 1000:>16.2f}{error:>12.2e}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""并发与顺序工具执行的墙钟时间基准测试
+
+用 FunctionModel 模拟模型在一次响应中发出 N 个工具调用（每个工具模拟一次
+固定延迟的网络请求），比较 ToolConcurrencyLimiter 的 sequential 模式和
+不同并发上限的 parallel 模式完成整轮运行所需的时间，并检查写回历史的
+工具结果是否始终按调用顺序排列。
+
+用法：
+    python benchmarks/bench_tools.py [--calls 8] [--latency 0.2] [--limits 2,4,8]
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+from pydantic_ai import Agent
+from pydantic_ai.messages import ModelResponse, TextPart, ToolCallPart, ToolReturnPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "main_agent_reference"))
+
+from tool_execution import ToolConcurrencyLimiter  # noqa: E402
+
+
+def make_model(calls: int) -> FunctionModel:
+    """第一次响应发出 calls 个工具调用，拿到结果后返回文本。"""
+
+    def respond(messages, info: AgentInfo) -> ModelResponse:
+        if len(messages) == 1:
+            return ModelResponse(parts=[
+                ToolCallPart("fetch", {"query": f"query {i}"}, tool_call_id=f"call_{i}")
+                for i in range(calls)
+            ])
+        return ModelResponse(parts=[TextPart("done")])
+
+    return FunctionModel(respond)
+
+
+def build_agent(calls: int, latency: float, limiter: ToolConcurrencyLimiter) -> Agent:
+    async def fetch(query: str) -> str:
+        """模拟一次网络请求。"""
+        await asyncio.sleep(latency)
+        return f"result for {query}"
+
+    agent = Agent(make_model(calls))
+    agent.tool_plain(limiter.wrap(fetch))
+    return agent
+
+
+async def run_once(agent: Agent) -> tuple:
+    """返回 (耗时, 结果是否按调用顺序排列)。"""
+    start = time.perf_counter()
+    result = await agent.run("go")
+    elapsed = time.perf_counter() - start
+
+    returned = [
+        part.tool_call_id
+        for message in result.new_messages()
+        for part in message.parts
+        if isinstance(part, ToolReturnPart)
+    ]
+    ordered = returned == sorted(returned, key=lambda call_id: int(call_id.split("_")[1]))
+    return elapsed, ordered
+
+
+def main():
+    parser = argparse.ArgumentParser(description="并发与顺序工具执行基准测试")
+    parser.add_argument("--calls", type=int, default=8, help="一次响应中的工具调用数")
+    parser.add_argument("--latency", type=float, default=0.2, help="每个工具调用的模拟延迟（秒）")
+    parser.add_argument("--limits", default="2,4,8", help="parallel 模式的并发上限列表")
+    args = parser.parse_args()
+
+    modes = [("sequential", 1)] + [("parallel", int(limit)) for limit in args.limits.split(",")]
+
+    print(f"{'模式':<22}{'墙钟 (s)':>12}{'加速比':>10}{'峰值并发':>10}{'顺序确定':>10}")
+    baseline = None
+    for mode, limit in modes:
+        limiter = ToolConcurrencyLimiter(mode, max_concurrency=limit)
+        elapsed, ordered = asyncio.run(run_once(build_agent(args.calls, args.latency, limiter)))
+        baseline = baseline or elapsed
+        label = mode if mode == "sequential" else f"{mode} (limit={limit})"
+        print(f"{label:<22}{elapsed:>12.2f}{baseline / elapsed:>10.1f}{limiter.peak:>10}{str(ordered):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+"""
+Brave 搜索结果的可插拔缓存（TTL + LRU）。
+
+提供内存和 SQLite 磁盘两种后端，键基于 API 地址、API 密钥的摘要和规范化的
+(query, count, offset, country, lang)，并记录命中/未命中计数。
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Optional, Tuple
+
+from .models import SearchResults
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def make_search_key(
+    query: str,
+    count: int = 10,
+    offset: int = 0,
+    country: Optional[str] = None,
+    lang: Optional[str] = None,
+    endpoint: Optional[str] = None,
+    api_key: Optional[str] = None
+) -> str:
+    """
+    为搜索参数构建规范化的缓存键。
+
+    查询会被去除首尾空白、合并连续空白并忽略大小写，
+    因此 "AI  Safety " 和 "ai safety" 命中同一条缓存。
+    不同的 API 地址或密钥（例如不同订阅层级）不共享缓存；
+    键中只保存密钥的摘要，不保存密钥本身。
+
+    Args:
+        query: 搜索查询
+        count: 结果数
+        offset: 分页偏移量
+        country: 国家代码
+        lang: 语言代码
+        endpoint: 搜索 API 地址
+        api_key: 搜索 API 密钥
+
+    Returns:
+        缓存键字符串
+    """
+    normalized_query = " ".join(query.split()).casefold()
+    credential = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16] if api_key else ""
+    return json.dumps(
+        [
+            endpoint or "",
+            credential,
+            normalized_query,
+            int(count),
+            int(offset),
+            (country or "").lower(),
+            (lang or "").lower()
+        ],
+        ensure_ascii=False,
+        separators=(",", ":")
+    )
+
+
+@dataclass
+class CacheStats:
+    """缓存的命中/未命中计数。"""
+    hits: int = 0
+    misses: int = 0
+    expirations: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """缓存命中率（0.0-1.0）。"""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """以字典形式返回统计信息，便于记录或展示。"""
+        return {**asdict(self), "hit_rate": self.hit_rate}
+
+
+class SearchCache(ABC):
+    """搜索结果缓存的基类，子类实现具体存储后端。"""
+
+    def __init__(self, ttl: float = 3600.0, max_entries: int = 1000):
+        """
+        Args:
+            ttl: 条目的存活时间（秒）
+            max_entries: 最大条目数，超出时按 LRU 淘汰
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[SearchResults]:
+        """获取缓存结果，未命中或已过期时返回 None。返回的容器应视为只读。"""
+
+    @abstractmethod
+    def set(self, key: str, value: SearchResults) -> None:
+        """写入缓存结果。"""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """清空缓存。"""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """当前缓存的条目数。"""
+
+    async def aget(self, key: str) -> Optional[SearchResults]:
+        """在事件循环中使用的 get；默认直接调用，会阻塞的后端应覆盖为在线程中执行。"""
+        return self.get(key)
+
+    async def aset(self, key: str, value: SearchResults) -> None:
+        """在事件循环中使用的 set；默认直接调用，会阻塞的后端应覆盖为在线程中执行。"""
+        self.set(key, value)
+
+
+class InMemorySearchCache(SearchCache):
+    """基于 OrderedDict 的进程内 TTL + LRU 缓存。"""
+
+    def __init__(self, ttl: float = 3600.0, max_entries: int = 1000):
+        super().__init__(ttl=ttl, max_entries=max_entries)
+        self._entries: "OrderedDict[str, Tuple[float, SearchResults]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[SearchResults]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats.misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return value
+
+    def set(self, key: str, value: SearchResults) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteSearchCache(SearchCache):
+    """基于 SQLite 的磁盘缓存，可在进程和对话之间共享。"""
+
+    def __init__(self, path: str, ttl: float = 3600.0, max_entries: int = 10000):
+        """
+        Args:
+            path: SQLite 数据库文件路径
+            ttl: 条目的存活时间（秒）
+            max_entries: 最大条目数，超出时按最近访问时间淘汰
+        """
+        super().__init__(ttl=ttl, max_entries=max_entries)
+        self.path = path
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS search_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_search_cache_last_access ON search_cache(last_access)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[SearchResults]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM search_cache WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.stats.misses += 1
+                return None
+
+            value, expires_at = row
+            if expires_at <= now:
+                self._conn.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE search_cache SET last_access = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            self.stats.hits += 1
+
+        # 按列存储，读取时无需为每个结果构建字典
+        return SearchResults(*json.loads(value))
+
+    def set(self, key: str, value: SearchResults) -> None:
+        now = time.time()
+        payload = json.dumps(
+            [value.titles, value.urls, value.descriptions, value.scores],
+            ensure_ascii=False
+        )
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_cache (key, value, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                (key, payload, now + self.ttl, now)
+            )
+
+            # 按最近访问时间淘汰超出上限的条目
+            (size,) = self._conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()
+            overflow = size - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM search_cache WHERE key IN ("
+                    "SELECT key FROM search_cache ORDER BY last_access ASC LIMIT ?)",
+                    (overflow,)
+                )
+                self.stats.evictions += overflow
+
+            self._conn.commit()
+
+    async def aget(self, key: str) -> Optional[SearchResults]:
+        # SQLite 查询和提交会阻塞（磁盘 I/O、等待锁），放到线程中执行以免卡住事件循环
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: SearchResults) -> None:
+        await asyncio.to_thread(self.set, key, value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM search_cache")
+            self._conn.commit()
+
+    def close(self) -> None:
+        """关闭数据库连接。"""
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            (size,) = self._conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()
+        return size
+
+
+# 进程级共享搜索缓存
+_search_cache: Optional[SearchCache] = None
+
+
+def get_search_cache() -> Optional[SearchCache]:
+    """
+    获取根据设置创建的共享搜索缓存。
+
+    Returns:
+        配置的缓存后端；如果 search_cache_backend 为 "none" 则返回 None
+    """
+    global _search_cache
+    backend = settings.search_cache_backend.lower()
+
+    if backend == "none":
+        return None
+
+    if _search_cache is None:
+        if backend == "sqlite":
+            _search_cache = SQLiteSearchCache(
+                settings.search_cache_path,
+                ttl=settings.search_cache_ttl,
+                max_entries=settings.search_cache_max_entries
+            )
+        elif backend == "memory":
+            _search_cache = InMemorySearchCache(
+                ttl=settings.search_cache_ttl,
+                max_entries=settings.search_cache_max_entries
+            )
+        else:
+            raise ValueError(f"Unknown search cache backend: {settings.search_cache_backend}")
+
+        logger.info(f"Search cache enabled ({backend}, ttl={settings.search_cache_ttl}s)")
+
+    return _search_cache
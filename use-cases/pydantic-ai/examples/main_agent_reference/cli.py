@@ -2,9 +2,10 @@
 """具有实时流式传输和工具调用可见性的 Pydantic AI 代理对话式 CLI。"""
 
 import asyncio
+import signal
 import sys
 import os
-from typing import List
+from contextlib import contextmanager
 
 # 将父目录添加到 Python 路径以进行导入
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -12,140 +13,131 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from rich.console import Console
 from rich.panel import Panel
 from rich.prompt import Prompt
-from rich.live import Live
 from rich.text import Text
 
 from pydantic_ai import Agent
-from agents.research_agent import research_agent
-from agents.dependencies import ResearchAgentDependencies
+from agents.research_agent import ResearchAgentDependencies, get_research_agent
 from agents.settings import settings
+from agents.http_client import close_http_pool
+from agents.providers import close_llm_clients
+from agents.memory import ConversationMemory
+from agents.rendering import StreamEventHandler, StreamRenderer
+from agents.subagent_cache import get_subagent_cache
 
 console = Console()
 
 
-async def stream_agent_interaction(user_input: str, conversation_history: List[str]) -> tuple[str, str]:
+def print_usage(usage, saved_tokens: int = 0) -> None:
+    """显示本轮的令牌用量，包括提供方报告的缓存命中令牌和子代理缓存节省的令牌。"""
+    details = usage.details or {}
+    cached_tokens = details.get("cached_tokens", 0)
+    saved = f" saved_by_subagent_cache={saved_tokens}" if saved_tokens else ""
+    console.print(
+        f"[dim]Tokens: prompt={usage.request_tokens or 0} "
+        f"(cached={cached_tokens}) completion={usage.response_tokens or 0}{saved}[/dim]"
+    )
+
+
+@contextmanager
+def interrupt_handler(callback):
+    """在代码块执行期间用 callback 处理 Ctrl+C（不支持信号处理的平台上保持默认行为）。"""
+    loop = asyncio.get_running_loop()
+    try:
+        loop.add_signal_handler(signal.SIGINT, callback)
+    except (NotImplementedError, RuntimeError):
+        yield
+        return
+    try:
+        yield
+    finally:
+        loop.remove_signal_handler(signal.SIGINT)
+
+
+async def stream_agent_interaction(user_input: str, memory: ConversationMemory) -> tuple[str, str]:
     """流式传输代理交互，实时显示工具调用。"""
     
+    turn = asyncio.current_task()
+    # 记录本轮是否由 Ctrl+C 取消，只吞掉自己发起的取消，外部取消照常传播
+    interrupted = False
+    
     try:
         # 设置依赖项
-        research_deps = ResearchAgentDependencies(brave_api_key=settings.brave_api_key)
+        research_deps = ResearchAgentDependencies(
+            brave_api_key=settings.brave_api_key,
+            gmail_credentials_path=settings.gmail_credentials_path,
+            gmail_token_path=settings.gmail_token_path
+        )
         
-        # 使用对话历史构建上下文
-        context = "\n".join(conversation_history[-6:]) if conversation_history else ""
+        subagent_cache = get_subagent_cache()
+        saved_before = subagent_cache.stats.saved_tokens if subagent_cache else 0
         
-        prompt = f"""Previous conversation:
-{context}
-
-User: {user_input}
-
-Respond naturally and helpfully."""
+        # 直接传入结构化历史：系统提示 → 摘要 → 轮次，前缀稳定以便命中提示缓存
+        history = memory.messages()
 
-        # 流式传输代理执行
-        async with research_agent.iter(prompt, deps=research_deps) as run:
+        # 流式传输代理执行；输出经缓冲后按帧率上限刷新，而不是逐令牌渲染
+        async with StreamRenderer(console, max_fps=settings.cli_render_fps) as renderer, \
+                get_research_agent().iter(
+                    user_input,
+                    deps=research_deps,
+                    message_history=history
+                ) as run:
             
-            async for node in run:
+            events = StreamEventHandler(renderer)
+            # 子代理委派的部分输出实时渲染在工具调用下方
+            research_deps.subagent_sink = events.on_subagent_event
+            
+            def on_interrupt():
+                # 有子代理正在流式运行时只取消委派，父代理拿到部分结果后继续；否则中止本轮
+                nonlocal interrupted
+                if events.cancel_delegations():
+                    renderer.print("\n[yellow]Cancelling delegated task...[/yellow]")
+                elif not interrupted:
+                    interrupted = True
+                    turn.cancel()
+            
+            with interrupt_handler(on_interrupt):
+                async for node in run:
                 
-                # 处理用户提示节点
-                if Agent.is_user_prompt_node(node):
-                    pass  # 干净的开始 - 无处理消息
+                    # 处理用户提示节点
+                    if Agent.is_user_prompt_node(node):
+                        pass  # 干净的开始 - 无处理消息
                 
-                # 处理模型请求节点 - 流式传输思考过程
-                elif Agent.is_model_request_node(node):
-                    # 在开始时显示助手前缀
-                    console.print("[bold blue]Assistant:[/bold blue] ", end="")
-                    
-                    # 流式传输模型请求事件以获取实时文本
-                    response_text = ""
-                    async with node.stream(run.ctx) as request_stream:
-                        async for event in request_stream:
-                            # 根据事件类型处理不同的事件类型
-                            event_type = type(event).__name__
-                            
-                            if event_type == "PartDeltaEvent":
-                                # 从增量中提取内容
-                                if hasattr(event, 'delta') and hasattr(event.delta, 'content_delta'):
-                                    delta_text = event.delta.content_delta
-                                    if delta_text:
-                                        console.print(delta_text, end="")
-                                        response_text += delta_text
-                            elif event_type == "FinalResultEvent":
-                                console.print()  # 流式传输后换行
+                    # 处理模型请求节点 - 流式传输思考过程
+                    elif Agent.is_model_request_node(node):
+                        events.begin_response()
+                        async with node.stream(run.ctx) as request_stream:
+                            await events.consume(request_stream)
+                        events.end_response()
                 
-                # 处理工具调用 - 这是关键部分
-                elif Agent.is_call_tools_node(node):
-                    # 流式传输工具执行事件
-                    async with node.stream(run.ctx) as tool_stream:
-                        async for event in tool_stream:
-                            event_type = type(event).__name__
-                            
-                            if event_type == "FunctionToolCallEvent":
-                                # 从 part 属性中提取工具名称  
-                                tool_name = "Unknown Tool"
-                                args = None
-                                
-                                # 检查 part 属性是否包含工具调用
-                                if hasattr(event, 'part'):
-                                    part = event.part
-                                    
-                                    # 检查 part 是否直接有 tool_name
-                                    if hasattr(part, 'tool_name'):
-                                        tool_name = part.tool_name
-                                    elif hasattr(part, 'function_name'):
-                                        tool_name = part.function_name
-                                    elif hasattr(part, 'name'):
-                                        tool_name = part.name
-                                    
-                                    # 检查 part 中的参数
-                                    if hasattr(part, 'args'):
-                                        args = part.args
-                                    elif hasattr(part, 'arguments'):
-                                        args = part.arguments
-                                
-                                # 调试：打印 part 属性以了解结构
-                                if tool_name == "Unknown Tool" and hasattr(event, 'part'):
-                                    part_attrs = [attr for attr in dir(event.part) if not attr.startswith('_')]
-                                    console.print(f"    [dim red]Debug - Part attributes: {part_attrs}[/dim red]")
-                                    
-                                    # 尝试获取有关 part 的更多详细信息
-                                    if hasattr(event.part, '__dict__'):
-                                        console.print(f"    [dim red]Part dict: {event.part.__dict__}[/dim red]")
-                                
-                                console.print(f"  🔹 [cyan]Calling tool:[/cyan] [bold]{tool_name}[/bold]")
-                                
-                                # 如果可用，显示工具参数
-                                if args and isinstance(args, dict):
-                                    # 显示每个参数的前几个字符
-                                    arg_preview = []
-                                    for key, value in list(args.items())[:3]:
-                                        val_str = str(value)
-                                        if len(val_str) > 50:
-                                            val_str = val_str[:47] + "..."
-                                        arg_preview.append(f"{key}={val_str}")
-                                    console.print(f"    [dim]Args: {', '.join(arg_preview)}[/dim]")
-                                elif args:
-                                    args_str = str(args)
-                                    if len(args_str) > 100:
-                                        args_str = args_str[:97] + "..."
-                                    console.print(f"    [dim]Args: {args_str}[/dim]")
-                            
-                            elif event_type == "FunctionToolResultEvent":
-                                # 显示工具结果
-                                result = str(event.tool_return) if hasattr(event, 'tool_return') else "No result"
-                                if len(result) > 100:
-                                    result = result[:97] + "..."
-                                console.print(f"  ✅ [green]Tool result:[/green] [dim]{result}[/dim]")
+                    # 处理工具调用 - 这是关键部分
+                    elif Agent.is_call_tools_node(node):
+                        # 流式传输工具执行事件
+                        async with node.stream(run.ctx) as tool_stream:
+                            await events.consume(tool_stream)
                 
-                # 处理结束节点  
-                elif Agent.is_end_node(node):
-                    # 不显示"处理完成" - 保持简洁
-                    pass
+                    # 处理结束节点  
+                    elif Agent.is_end_node(node):
+                        # 不显示"处理完成" - 保持简洁
+                        pass
         
         # 获取最终结果
         final_result = run.result
         final_output = final_result.output if hasattr(final_result, 'output') else str(final_result)
         
+        # 只追加本轮新产生的消息，已有历史保持原样
+        memory.add_turn(final_result.new_messages())
+        saved_tokens = subagent_cache.stats.saved_tokens - saved_before if subagent_cache else 0
+        print_usage(run.usage(), saved_tokens)
+        
         # 返回流式传输和最终内容
-        return (response_text.strip(), final_output)
+        return (events.response_text.strip(), final_output)
+        
+    except asyncio.CancelledError:
+        # 撤销本轮发起的取消请求；仍有其他取消请求时（如程序退出）继续传播
+        if not interrupted or turn.uncancel() > 0:
+            raise
+        console.print("\n[yellow]⏹ Turn cancelled[/yellow]")
+        return ("", "")
         
     except Exception as e:
         console.print(f"[red]❌ Error: {e}[/red]")
@@ -166,7 +158,10 @@ async def main():
     console.print(welcome)
     console.print()
     
-    conversation_history = []
+    memory = ConversationMemory(
+        max_tokens=settings.memory_max_tokens,
+        summary_max_tokens=settings.memory_summary_max_tokens
+    )
     
     while True:
         try:
@@ -181,22 +176,17 @@ async def main():
             if not user_input:
                 continue
             
-            # 添加到历史记录
-            conversation_history.append(f"User: {user_input}")
-            
             # 流式传输交互并获取响应
-            streamed_text, final_response = await stream_agent_interaction(user_input, conversation_history)
+            streamed_text, final_response = await stream_agent_interaction(user_input, memory)
             
             # 处理响应显示
             if streamed_text:
                 # 响应已流式传输，只需添加间距
                 console.print()
-                conversation_history.append(f"Assistant: {streamed_text}")
             elif final_response and final_response.strip():
                 # 响应未流式传输，使用适当的格式显示
                 console.print(f"[bold blue]Assistant:[/bold blue] {final_response}")
                 console.print()
-                conversation_history.append(f"Assistant: {final_response}")
             else:
                 # 无响应
                 console.print()
@@ -210,5 +200,14 @@ async def main():
             continue
 
 
+async def run_cli():
+    """运行 CLI，并在退出时关闭整个会话共享的 HTTP 连接池。"""
+    try:
+        await main()
+    finally:
+        await close_http_pool()
+        await close_llm_clients()
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(run_cli())
\ No newline at end of file
@@ -0,0 +1,198 @@
+"""
+流式子代理委派。
+
+父代理的工具把工作委托给子代理时（例如 create_email_draft 调用邮件代理），
+如果等待子代理 run() 完成后才返回，界面在整段委派期间都没有任何输出。
+Delegation 改为用 Agent.iter 流式运行子代理，把文本增量和工具调用作为
+SubAgentEvent 实时推送给调用方提供的回调（CLI 渲染、服务器转成 SSE），
+并允许在子运行结束前调用 cancel() 提前终止它。
+"""
+
+import asyncio
+import itertools
+import logging
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional, Tuple
+
+from pydantic_ai import Agent
+from pydantic_ai.messages import (
+    FunctionToolCallEvent,
+    FunctionToolResultEvent,
+    PartDeltaEvent,
+    PartStartEvent,
+    TextPart,
+    TextPartDelta,
+)
+from pydantic_ai.models import Model
+from pydantic_ai.usage import Usage
+
+logger = logging.getLogger(__name__)
+
+# 事件类型：start、text、tool_call、tool_result、end、cancelled
+SUBAGENT_EVENT_KINDS = ("start", "text", "tool_call", "tool_result", "end", "cancelled")
+
+
+@dataclass
+class SubAgentEvent:
+    """子代理运行中产生的一个事件。"""
+    delegation: "Delegation"
+    kind: str
+    content: str = ""
+    # 为 True 表示输出来自缓存，没有实际运行子代理
+    cached: bool = False
+
+
+SubAgentEventSink = Callable[[SubAgentEvent], None]
+
+
+class DelegationCancelled(Exception):
+    """子代理运行在完成前被取消。"""
+
+    def __init__(self, name: str, partial_output: str):
+        super().__init__(f"Delegation to {name} was cancelled")
+        self.name = name
+        self.partial_output = partial_output
+
+
+class Delegation:
+    """
+    一次可取消的流式子代理运行。
+
+    用法：
+
+        delegation = Delegation("email_agent", sink=ctx.deps.subagent_sink)
+        output, usage = await delegation.run(email_agent, prompt, deps=email_deps)
+
+    回调在子运行所在的任务中同步调用，应当只做缓冲或入队之类的轻量工作；
+    回调可以通过 event.delegation.cancel() 终止当前委派。
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, name: str, sink: Optional[SubAgentEventSink] = None):
+        """
+        Args:
+            name: 子代理名称，用于显示和日志
+            sink: 接收 SubAgentEvent 的回调，为 None 时不推送事件
+        """
+        self.id = next(self._ids)
+        self.name = name
+        self.sink = sink
+        self.cancelled = False
+        self._chunks: List[str] = []
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def partial_output(self) -> str:
+        """到目前为止流式输出的文本。"""
+        return "".join(self._chunks)
+
+    def cancel(self) -> bool:
+        """
+        请求取消子运行。
+
+        Returns:
+            子运行仍在进行并已请求取消时返回 True
+        """
+        if self.cancelled or (self._task is not None and self._task.done()):
+            return False
+        self.cancelled = True
+        if self._task is not None:
+            self._task.cancel()
+        return True
+
+    def _emit(self, kind: str, content: str = "", cached: bool = False) -> None:
+        if self.sink is None:
+            return
+        try:
+            self.sink(SubAgentEvent(self, kind, content, cached))
+        except Exception as e:
+            # 渲染失败不应中断子代理运行
+            logger.warning(f"Sub-agent event sink failed: {e}")
+
+    def _text(self, content: str) -> None:
+        if content:
+            self._chunks.append(content)
+            self._emit("text", content)
+        if self.cancelled:
+            # 模型流在两个增量之间未必让出控制权，在这里立即停止
+            raise asyncio.CancelledError()
+
+    async def run(
+        self,
+        agent: Agent,
+        prompt: str,
+        deps: Any = None,
+        usage: Optional[Usage] = None,
+        model: Optional[Model] = None
+    ) -> Tuple[Any, Usage]:
+        """
+        流式运行子代理直到完成。
+
+        Args:
+            agent: 子代理
+            prompt: 渲染后的完整提示
+            deps: 子代理的依赖项
+            usage: 传给子运行的用量对象，为 None 时子运行单独计数
+            model: 覆盖子代理构建时绑定的模型，为 None 时使用代理自己的模型
+
+        Returns:
+            子代理的输出和运行用量
+
+        Raises:
+            DelegationCancelled: 子运行被 cancel() 终止
+        """
+        self._emit("start")
+        if self.cancelled:
+            self._emit("cancelled")
+            raise DelegationCancelled(self.name, "")
+
+        self._task = asyncio.create_task(self._stream(agent, prompt, deps, usage, model))
+        try:
+            output, run_usage = await self._task
+        except asyncio.CancelledError:
+            current = asyncio.current_task()
+            # 只吞掉由 cancel() 引起的取消；外层任务自身被取消时照常传播
+            if not self.cancelled or (current is not None and current.cancelling()):
+                raise
+            logger.info(f"Delegation to {self.name} cancelled after {len(self.partial_output)} chars")
+            self._emit("cancelled")
+            raise DelegationCancelled(self.name, self.partial_output) from None
+
+        self._emit("end")
+        return output, run_usage
+
+    async def _stream(
+        self,
+        agent: Agent,
+        prompt: str,
+        deps: Any,
+        usage: Optional[Usage],
+        model: Optional[Model]
+    ) -> Tuple[Any, Usage]:
+        async with agent.iter(prompt, deps=deps, usage=usage, model=model) as run:
+            async for node in run:
+                if Agent.is_model_request_node(node):
+                    async with node.stream(run.ctx) as request_stream:
+                        async for event in request_stream:
+                            if isinstance(event, PartDeltaEvent):
+                                if isinstance(event.delta, TextPartDelta):
+                                    self._text(event.delta.content_delta)
+                            elif isinstance(event, PartStartEvent) and isinstance(event.part, TextPart):
+                                self._text(event.part.content)
+                elif Agent.is_call_tools_node(node):
+                    async with node.stream(run.ctx) as tool_stream:
+                        async for event in tool_stream:
+                            if isinstance(event, FunctionToolCallEvent):
+                                self._emit("tool_call", event.part.tool_name)
+                            elif isinstance(event, FunctionToolResultEvent):
+                                self._emit("tool_result", event.result.tool_name or "")
+        return run.result.output, run.usage()
+
+    def replay(self, output: Any) -> None:
+        """把缓存的输出作为一次完整的事件序列推送，界面无需区分两种来源。"""
+        text = str(output)
+        self._chunks = [text]
+        self._emit("start", cached=True)
+        self._emit("text", text, cached=True)
+        self._emit("end", cached=True)
@@ -0,0 +1,165 @@
+"""
+共享的、带生命周期管理的 HTTP 客户端池。
+
+所有对外 HTTP 调用（例如 Brave 搜索）复用同一个长连接客户端，
+避免每次工具调用都重新进行 TCP+TLS 握手。
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _http2_available() -> bool:
+    """检查是否安装了 HTTP/2 支持所需的 h2 包。"""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class HTTPClientPool:
+    """在整个会话中复用的 httpx.AsyncClient 连接池。"""
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        max_connections_per_host: int = 10,
+        http2: bool = True,
+        timeout: float = 30.0
+    ):
+        """
+        初始化连接池配置，客户端在首次使用时才创建。
+
+        Args:
+            max_connections: 全局最大连接数
+            max_keepalive_connections: 保持活动的最大空闲连接数
+            keepalive_expiry: 空闲连接的保持时间（秒）
+            max_connections_per_host: 每个主机的最大并发请求数
+            http2: 是否启用 HTTP/2（需要安装 h2）
+            timeout: 默认请求超时（秒）
+        """
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.max_connections_per_host = max_connections_per_host
+        self.http2 = http2 and _http2_available()
+        self.timeout = timeout
+
+        if http2 and not self.http2:
+            logger.warning("HTTP/2 requested but 'h2' is not installed, falling back to HTTP/1.1")
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """
+        获取共享客户端，必要时（首次使用、已关闭或事件循环变化）重新创建。
+
+        Returns:
+            绑定到当前事件循环的 httpx.AsyncClient
+        """
+        loop = asyncio.get_running_loop()
+
+        if self._client is None or self._client.is_closed or self._loop is not loop:
+            # 连接绑定到事件循环，循环变化时（例如多次 asyncio.run）必须重建
+            self._client = httpx.AsyncClient(
+                http2=self.http2,
+                limits=self.limits,
+                timeout=self.timeout
+            )
+            self._loop = loop
+            self._host_limits.clear()
+            logger.debug("Created shared HTTP client (http2=%s)", self.http2)
+
+        return self._client
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        """获取指定 URL 所属主机的并发限制信号量。"""
+        host = urlsplit(url).netloc
+        semaphore = self._host_limits.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_connections_per_host)
+            self._host_limits[host] = semaphore
+        return semaphore
+
+    async def request(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        """
+        通过共享客户端发送请求，并遵守每主机并发限制。
+
+        Args:
+            method: HTTP 方法
+            url: 请求 URL
+            **kwargs: 传递给 httpx.AsyncClient.request 的其他参数
+
+        Returns:
+            HTTP 响应
+        """
+        client = self.client
+        async with self._host_limit(url):
+            return await client.request(method, url, **kwargs)
+
+    async def get(self, url: str, **kwargs: Any) -> httpx.Response:
+        """发送 GET 请求。"""
+        return await self.request("GET", url, **kwargs)
+
+    async def aclose(self) -> None:
+        """关闭共享客户端并释放所有保持活动的连接。"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+            logger.debug("Closed shared HTTP client")
+        self._client = None
+        self._loop = None
+        self._host_limits.clear()
+
+    async def __aenter__(self) -> "HTTPClientPool":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
+
+# 进程级共享连接池
+_pool: Optional[HTTPClientPool] = None
+
+
+def get_http_pool() -> HTTPClientPool:
+    """
+    获取进程级共享 HTTP 连接池，首次调用时根据设置创建。
+
+    Returns:
+        共享的 HTTPClientPool
+    """
+    global _pool
+    if _pool is None:
+        _pool = HTTPClientPool(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+            keepalive_expiry=settings.http_keepalive_expiry,
+            max_connections_per_host=settings.http_max_connections_per_host,
+            http2=settings.http_http2,
+            timeout=settings.http_timeout
+        )
+    return _pool
+
+
+async def close_http_pool() -> None:
+    """关闭共享 HTTP 连接池的关闭钩子，应在会话结束时调用。"""
+    global _pool
+    if _pool is not None:
+        await _pool.aclose()
+        _pool = None
@@ -0,0 +1,254 @@
+"""
+研究 CLI 的令牌预算对话记忆。
+
+历史以结构化的 pydantic-ai 消息按轮次保存，使用快速的本地令牌估算
+强制执行预算；超出预算时最早的轮次会被增量压缩进摘要并移出历史。
+
+messages() 返回可直接作为 message_history 传入的消息，布局为：
+系统提示 → 摘要 → 按时间顺序的轮次。前缀只在成批淘汰时变化，
+因此 OpenAI 兼容的提示缓存可以在多轮之间命中。
+"""
+
+import logging
+from typing import Callable, List, Optional, Sequence
+
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelRequest,
+    ModelResponse,
+    RetryPromptPart,
+    SystemPromptPart,
+    TextPart,
+    ToolCallPart,
+    ToolReturnPart,
+    UserPromptPart,
+)
+
+logger = logging.getLogger(__name__)
+
+# 每个消息部分的固定开销（角色、分隔符等）
+PART_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    快速估算文本的令牌数，无需加载分词器。
+
+    ASCII 文本约 4 个字符一个令牌，中日韩等非 ASCII 字符约一个字符一个令牌。
+
+    Args:
+        text: 要估算的文本
+
+    Returns:
+        估算的令牌数
+    """
+    if not text:
+        return 0
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+def _part_text(part) -> str:
+    """提取消息部分中对模型可见的文本。"""
+    if isinstance(part, (SystemPromptPart, TextPart)):
+        return part.content
+    if isinstance(part, UserPromptPart):
+        return part.content if isinstance(part.content, str) else " ".join(
+            item for item in part.content if isinstance(item, str)
+        )
+    if isinstance(part, ToolCallPart):
+        return f"{part.tool_name} {part.args_as_json_str()}"
+    if isinstance(part, ToolReturnPart):
+        return part.model_response_str()
+    if isinstance(part, RetryPromptPart):
+        return part.model_response()
+    return ""
+
+
+def estimate_message_tokens(message: ModelMessage) -> int:
+    """估算单条消息的令牌数。"""
+    return sum(estimate_tokens(_part_text(part)) + PART_OVERHEAD_TOKENS for part in message.parts)
+
+
+def _truncate(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+def summarize_turn(messages: Sequence[ModelMessage]) -> str:
+    """
+    将一轮对话压缩为一行摘要（用户问题 + 助手最终回答）。
+
+    Args:
+        messages: 一轮对话中的消息
+
+    Returns:
+        摘要行
+    """
+    user_text = ""
+    assistant_text = ""
+    for message in messages:
+        for part in message.parts:
+            if isinstance(part, UserPromptPart) and not user_text:
+                user_text = _part_text(part)
+            elif isinstance(part, TextPart) and part.content.strip():
+                assistant_text = part.content
+    return f"- User: {_truncate(user_text, 200)} | Assistant: {_truncate(assistant_text, 300)}"
+
+
+class ConversationMemory:
+    """
+    按令牌预算保存结构化对话历史。
+
+    总量超过 max_tokens 时，从最早的轮次开始淘汰，直到降到
+    max_tokens * low_water_ratio 以下；被淘汰的轮次合并进摘要。
+    成批淘汰让历史前缀在多轮之间保持不变。
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 6000,
+        low_water_ratio: float = 0.6,
+        summary_max_tokens: int = 600,
+        summarizer: Optional[Callable[[str, List[List[ModelMessage]]], str]] = None
+    ):
+        """
+        Args:
+            max_tokens: 历史（含摘要和系统提示）的令牌预算
+            low_water_ratio: 淘汰后的目标占用比例
+            summary_max_tokens: 摘要的令牌上限
+            summarizer: 可选的自定义摘要函数 (旧摘要, 被淘汰的轮次) -> 新摘要
+        """
+        self.max_tokens = max_tokens
+        self.low_water_ratio = low_water_ratio
+        self.summary_max_tokens = summary_max_tokens
+        self.summarizer = summarizer
+
+        self.summary = ""
+        self._system_parts: List[SystemPromptPart] = []
+        self._head: Optional[ModelRequest] = None
+        self._turns: List[List[ModelMessage]] = []
+        self._turn_tokens: List[int] = []
+        self.evicted_turns = 0
+
+    @property
+    def turns(self) -> int:
+        """当前保留的轮次数。"""
+        return len(self._turns)
+
+    @property
+    def total_tokens(self) -> int:
+        """当前历史的估算令牌数。"""
+        system_tokens = sum(estimate_tokens(p.content) + PART_OVERHEAD_TOKENS for p in self._system_parts)
+        return system_tokens + estimate_tokens(self.summary) + sum(self._turn_tokens)
+
+    def add_turn(self, messages: Sequence[ModelMessage]) -> None:
+        """
+        添加一轮对话的新消息（通常来自 result.new_messages()）。
+
+        系统提示部分只保留第一次出现的，并从轮次消息中剥离。
+
+        Args:
+            messages: 本轮产生的消息
+        """
+        turn: List[ModelMessage] = []
+        for message in messages:
+            if isinstance(message, ModelRequest):
+                system_parts = [p for p in message.parts if isinstance(p, SystemPromptPart)]
+                if system_parts:
+                    if not self._system_parts:
+                        self._system_parts = system_parts
+                        self._head = None
+                    other_parts = [p for p in message.parts if not isinstance(p, SystemPromptPart)]
+                    if not other_parts:
+                        continue
+                    message = ModelRequest(parts=other_parts, instructions=message.instructions)
+            turn.append(message)
+
+        if not turn:
+            return
+
+        self._turns.append(turn)
+        self._turn_tokens.append(sum(estimate_message_tokens(m) for m in turn))
+        self._enforce_budget()
+
+    def add_exchange(self, user_text: str, assistant_text: str) -> None:
+        """
+        以结构化消息的形式添加一问一答。
+
+        Args:
+            user_text: 用户输入
+            assistant_text: 助手的最终回答
+        """
+        self.add_turn([
+            ModelRequest(parts=[UserPromptPart(user_text)]),
+            ModelResponse(parts=[TextPart(assistant_text)])
+        ])
+
+    def _enforce_budget(self) -> None:
+        if self.total_tokens <= self.max_tokens:
+            return
+
+        target = int(self.max_tokens * self.low_water_ratio)
+        evicted: List[List[ModelMessage]] = []
+
+        # 始终保留最新一轮
+        while len(self._turns) > 1 and self.total_tokens > target:
+            evicted.append(self._turns.pop(0))
+            self._turn_tokens.pop(0)
+
+        if evicted:
+            self.evicted_turns += len(evicted)
+            self._update_summary(evicted)
+            self._head = None
+            logger.debug(f"Evicted {len(evicted)} turns, history now ~{self.total_tokens} tokens")
+
+    def _update_summary(self, evicted: List[List[ModelMessage]]) -> None:
+        if self.summarizer is not None:
+            self.summary = self.summarizer(self.summary, evicted)
+            return
+
+        lines = self.summary.splitlines() if self.summary else []
+        lines.extend(summarize_turn(turn) for turn in evicted)
+
+        # 摘要本身也受预算约束，超出时丢弃最早的行
+        while len(lines) > 1 and estimate_tokens("\n".join(lines)) > self.summary_max_tokens:
+            lines.pop(0)
+        self.summary = "\n".join(lines)
+
+    def _head_request(self) -> Optional[ModelRequest]:
+        """构建（并缓存）包含系统提示和摘要的首条请求，保证前缀在淘汰之间不变。"""
+        if self._head is None:
+            parts = list(self._system_parts)
+            if self.summary:
+                parts.append(SystemPromptPart(f"Earlier conversation (summarized):\n{self.summary}"))
+            if parts:
+                self._head = ModelRequest(parts=parts)
+        return self._head
+
+    def messages(self) -> List[ModelMessage]:
+        """
+        返回可作为 message_history 传入的消息。
+
+        Returns:
+            首条系统/摘要请求加上所有保留轮次的消息；尚无历史时返回空列表
+        """
+        if not self._turns:
+            return []
+
+        history: List[ModelMessage] = []
+        head = self._head_request()
+        if head is not None:
+            history.append(head)
+        for turn in self._turns:
+            history.extend(turn)
+        return history
+
+    def clear(self) -> None:
+        """清空所有历史和摘要。"""
+        self.summary = ""
+        self._system_parts = []
+        self._head = None
+        self._turns.clear()
+        self._turn_tokens.clear()
+        self.evicted_turns = 0
@@ -0,0 +1,255 @@
+"""
+LLM 模型调用的持久化响应缓存（用于开发和 CI）。
+
+CachingModel 包装任意 pydantic-ai 模型，按 (模型名称, 消息, 工具, 设置)
+计算哈希，并从本地内容寻址存储中提供录制的响应：
+
+- record：命中时返回录制的响应，未命中时调用真实模型并录制
+- replay：只从存储中返回响应，未命中时抛出 CacheMissError（完全离线）
+- passthrough：直接调用真实模型，不读写缓存
+
+任何示例代理都可以在评估或回归测试中使用：
+
+    with chat_agent.override(model=CachingModel(chat_agent.model, mode="replay")):
+        ...
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from pydantic import TypeAdapter
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelMessagesTypeAdapter,
+    ModelResponse,
+    ModelResponseStreamEvent,
+    TextPart,
+    ThinkingPart,
+    ToolCallPart,
+)
+from pydantic_ai.models import Model, ModelRequestParameters, StreamedResponse
+from pydantic_ai.models.wrapper import WrapperModel
+from pydantic_ai.settings import ModelSettings
+
+logger = logging.getLogger(__name__)
+
+CACHE_MODES = ("record", "replay", "passthrough")
+
+# 每次运行都会变化、不应影响缓存键的字段
+_VOLATILE_KEYS = frozenset({"timestamp"})
+
+_request_parameters_adapter = TypeAdapter(ModelRequestParameters)
+
+
+class CacheMissError(LookupError):
+    """replay 模式下请求没有对应的录制响应。"""
+
+
+def _strip_volatile(value: Any) -> Any:
+    """递归移除时间戳等易变字段，使相同的对话得到相同的哈希。"""
+    if isinstance(value, dict):
+        return {k: _strip_volatile(v) for k, v in value.items() if k not in _VOLATILE_KEYS}
+    if isinstance(value, list):
+        return [_strip_volatile(v) for v in value]
+    return value
+
+
+def request_fingerprint(
+    model_name: str,
+    messages: List[ModelMessage],
+    model_settings: Optional[ModelSettings],
+    model_request_parameters: ModelRequestParameters
+) -> str:
+    """
+    计算模型请求的内容哈希。
+
+    Args:
+        model_name: 模型名称
+        messages: 发送给模型的消息
+        model_settings: 模型设置（温度等）
+        model_request_parameters: 工具定义和输出模式
+
+    Returns:
+        SHA-256 十六进制摘要
+    """
+    payload = {
+        "model": model_name,
+        "messages": _strip_volatile(ModelMessagesTypeAdapter.dump_python(messages, mode="json")),
+        "settings": model_settings or {},
+        "parameters": _request_parameters_adapter.dump_python(model_request_parameters, mode="json"),
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class ResponseStore:
+    """本地内容寻址的响应存储：<directory>/<哈希前两位>/<哈希>.json。"""
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[ModelResponse]:
+        """读取录制的响应，不存在时返回 None。"""
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        (response,) = ModelMessagesTypeAdapter.validate_json(data)
+        return response
+
+    def put(self, key: str, response: ModelResponse) -> None:
+        """原子地写入响应，避免并发运行读到半写入的文件。"""
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(ModelMessagesTypeAdapter.dump_json([response], indent=2))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+@dataclass
+class ReplayStreamedResponse(StreamedResponse):
+    """把录制的 ModelResponse 作为流式响应重放。"""
+
+    _response: ModelResponse = field(default=None)  # type: ignore[assignment]
+
+    def __post_init__(self):
+        self._usage = self._response.usage
+
+    async def _get_event_iterator(self) -> AsyncIterator[ModelResponseStreamEvent]:
+        for index, part in enumerate(self._response.parts):
+            if isinstance(part, TextPart):
+                event = self._parts_manager.handle_text_delta(vendor_part_id=index, content=part.content)
+                if event is not None:
+                    yield event
+            elif isinstance(part, ThinkingPart):
+                yield self._parts_manager.handle_thinking_delta(vendor_part_id=index, content=part.content)
+            elif isinstance(part, ToolCallPart):
+                yield self._parts_manager.handle_tool_call_part(
+                    vendor_part_id=index,
+                    tool_name=part.tool_name,
+                    args=part.args,
+                    tool_call_id=part.tool_call_id
+                )
+
+    @property
+    def model_name(self) -> str:
+        return self._response.model_name or ""
+
+    @property
+    def timestamp(self) -> datetime:
+        return self._response.timestamp
+
+
+@dataclass
+class CacheStats:
+    """模型响应缓存的统计信息。"""
+    hits: int = 0
+    misses: int = 0
+    recorded: int = 0
+
+    def to_dict(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "recorded": self.recorded}
+
+
+class CachingModel(WrapperModel):
+    """在真实模型前加一层 record/replay/passthrough 响应缓存。"""
+
+    def __init__(self, wrapped: Model, directory: str = ".cache/llm_responses", mode: str = "record"):
+        """
+        Args:
+            wrapped: 被包装的模型
+            directory: 响应存储目录
+            mode: "record"、"replay" 或 "passthrough"
+        """
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown LLM cache mode: {mode}")
+
+        super().__init__(wrapped)
+        self.mode = mode
+        self.store = ResponseStore(directory)
+        self.stats = CacheStats()
+
+    def _lookup(self, key: str) -> Optional[ModelResponse]:
+        response = self.store.get(key)
+        if response is not None:
+            self.stats.hits += 1
+            logger.debug(f"LLM cache hit: {key[:12]}")
+            return response
+
+        self.stats.misses += 1
+        if self.mode == "replay":
+            raise CacheMissError(
+                f"No recorded response for request {key[:12]} in {self.store.directory}; "
+                "re-run with LLM_CACHE_MODE=record to record it"
+            )
+        return None
+
+    def _record(self, key: str, response: ModelResponse) -> None:
+        self.store.put(key, response)
+        self.stats.recorded += 1
+        logger.debug(f"LLM cache recorded: {key[:12]}")
+
+    async def request(
+        self,
+        messages: List[ModelMessage],
+        model_settings: Optional[ModelSettings],
+        model_request_parameters: ModelRequestParameters
+    ) -> ModelResponse:
+        if self.mode == "passthrough":
+            return await self.wrapped.request(messages, model_settings, model_request_parameters)
+
+        key = request_fingerprint(self.model_name, messages, model_settings, model_request_parameters)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+
+        response = await self.wrapped.request(messages, model_settings, model_request_parameters)
+        self._record(key, response)
+        return response
+
+    @asynccontextmanager
+    async def request_stream(
+        self,
+        messages: List[ModelMessage],
+        model_settings: Optional[ModelSettings],
+        model_request_parameters: ModelRequestParameters
+    ) -> AsyncIterator[StreamedResponse]:
+        if self.mode == "passthrough":
+            async with self.wrapped.request_stream(
+                messages, model_settings, model_request_parameters
+            ) as response_stream:
+                yield response_stream
+            return
+
+        key = request_fingerprint(self.model_name, messages, model_settings, model_request_parameters)
+        cached = self._lookup(key)
+        if cached is not None:
+            yield ReplayStreamedResponse(_response=cached)
+            return
+
+        async with self.wrapped.request_stream(
+            messages, model_settings, model_request_parameters
+        ) as response_stream:
+            yield response_stream
+
+        # 代理在退出流上下文前会耗尽事件，此时 get() 就是完整响应；从未被读取的流不录制
+        if response_stream._event_iterator is not None:
+            self._record(key, response_stream.get())
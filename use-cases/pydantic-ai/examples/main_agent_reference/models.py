@@ -2,10 +2,17 @@
 多代理系统的核心数据模型。
 """
 
+import json
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterable, Iterator, Mapping, NamedTuple, Union
 from datetime import datetime
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # orjson 是可选的快速解析器
+    _json_loads = json.loads
+
 
 class ResearchQuery(BaseModel):
     """研究查询请求的模型。"""
@@ -33,6 +40,113 @@ class BraveSearchResult(BaseModel):
         }
 
 
+class SearchHit(NamedTuple):
+    """单个搜索结果的轻量只读视图，不做验证。"""
+    title: str
+    url: str
+    description: str
+    score: float
+
+
+def position_score(position: int) -> float:
+    """基于位置计算简单的相关性评分：每个位置减少 0.05，最低 0.1。"""
+    return max(1.0 - (position * 0.05), 0.1)
+
+
+class SearchResults:
+    """
+    紧凑的列式搜索结果容器。
+
+    标题、URL、描述和评分分别存放在并列的列表中，从响应字节解析一次，
+    只有在确实需要验证时才转换为 BraveSearchResult。
+    """
+
+    __slots__ = ("titles", "urls", "descriptions", "scores")
+
+    def __init__(
+        self,
+        titles: Optional[List[str]] = None,
+        urls: Optional[List[str]] = None,
+        descriptions: Optional[List[str]] = None,
+        scores: Optional[List[float]] = None
+    ):
+        self.titles = titles if titles is not None else []
+        self.urls = urls if urls is not None else []
+        self.descriptions = descriptions if descriptions is not None else []
+        self.scores = scores if scores is not None else []
+
+    @classmethod
+    def from_brave_response(cls, content: Union[bytes, str]) -> "SearchResults":
+        """
+        从 Brave 搜索 API 的原始响应体解析结果。
+
+        Args:
+            content: 响应体字节或字符串
+
+        Returns:
+            按位置评分的 SearchResults
+        """
+        data = _json_loads(content)
+        web_results = (data.get("web") or {}).get("results") or []
+
+        results = cls()
+        for idx, item in enumerate(web_results):
+            results.titles.append(item.get("title", ""))
+            results.urls.append(item.get("url", ""))
+            results.descriptions.append(item.get("description", ""))
+            results.scores.append(position_score(idx))
+        return results
+
+    @classmethod
+    def from_records(cls, records: Iterable[Mapping[str, Any]]) -> "SearchResults":
+        """
+        从结果字典（例如模型传回的工具参数或缓存内容）构建容器。
+
+        缺少 title 或 url 的记录会被跳过。
+
+        Args:
+            records: 包含 title、url、description、score 的映射
+
+        Returns:
+            SearchResults
+        """
+        results = cls()
+        for record in records:
+            title = record.get("title")
+            url = record.get("url")
+            if title is None or url is None:
+                continue
+            results.titles.append(title)
+            results.urls.append(url)
+            results.descriptions.append(record.get("description") or "")
+            results.scores.append(record.get("score", 0.0))
+        return results
+
+    def __len__(self) -> int:
+        return len(self.urls)
+
+    def __iter__(self) -> Iterator[SearchHit]:
+        return map(SearchHit, self.titles, self.urls, self.descriptions, self.scores)
+
+    def __getitem__(self, index: int) -> SearchHit:
+        return SearchHit(
+            self.titles[index], self.urls[index], self.descriptions[index], self.scores[index]
+        )
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """转换为字典列表，用于工具返回值或 JSON 序列化。"""
+        return [
+            {"title": title, "url": url, "description": description, "score": score}
+            for title, url, description, score in zip(
+                self.titles, self.urls, self.descriptions, self.scores
+            )
+        ]
+
+    def to_models(self) -> List["BraveSearchResult"]:
+        """转换为经过验证的 BraveSearchResult 列表。"""
+        return [BraveSearchResult(**hit._asdict()) for hit in self]
+
+
 class EmailDraft(BaseModel):
     """邮件草稿创建的模型。"""
     to: List[str] = Field(..., min_length=1, description="收件人邮件地址列表")
@@ -1,30 +1,145 @@
 """LLM 模型的灵活提供者配置。
 基于 examples/agent/providers.py 模式。"""
 
-from typing import Optional
-from pydantic_ai.providers.openai import OpenAIProvider
-from pydantic_ai.models.openai import OpenAIModel
+import threading
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from pydantic_ai.models import Model
 from .settings import settings
 
+if TYPE_CHECKING:
+    from pydantic_ai.providers.openai import OpenAIProvider
+
+
+# 进程级提供者/模型注册表：同一配置只创建一次，并共享底层 HTTP 连接池
+_registry_lock = threading.Lock()
+_llm_http_client: Optional[httpx.AsyncClient] = None
+_providers: Dict[Tuple[Optional[str], str], "OpenAIProvider"] = {}
+_models: Dict[Tuple[Optional[str], str, str, str, str], Model] = {}
+# 注册表清空时调用的回调，持有模型的缓存（例如构建好的代理）借此丢弃旧模型
+_invalidation_hooks: List[Callable[[], None]] = []
+
+
+def on_llm_models_invalidated(hook: Callable[[], None]) -> None:
+    """
+    注册在提供者/模型注册表被清空时调用的回调。
+
+    回调在持有注册表锁时调用，只应丢弃缓存的引用，不能在其中调用 get_llm_model()。
+    
+    Args:
+        hook: 无参数回调
+    """
+    with _registry_lock:
+        _invalidation_hooks.append(hook)
+
+
+def _clear_registry() -> None:
+    """清空提供者和模型注册表并通知回调（调用方需持有注册表锁）。"""
+    _providers.clear()
+    _models.clear()
+    for hook in _invalidation_hooks:
+        hook()
+
+
+def _get_llm_http_client() -> httpx.AsyncClient:
+    """获取所有 LLM 提供者共享的 HTTP 客户端（调用方需持有注册表锁）。"""
+    global _llm_http_client
+    if _llm_http_client is None or _llm_http_client.is_closed:
+        _llm_http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.http_max_connections,
+                max_keepalive_connections=settings.http_max_keepalive_connections,
+                keepalive_expiry=settings.http_keepalive_expiry
+            ),
+            # LLM 响应可能很慢，使用较长的读取超时
+            timeout=httpx.Timeout(timeout=600, connect=5)
+        )
+        # 旧提供者引用的是已关闭的客户端，必须重建
+        _clear_registry()
+    return _llm_http_client
+
+
+def get_llm_provider(base_url: Optional[str] = None, api_key: Optional[str] = None) -> "OpenAIProvider":
+    """
+    获取按 (base_url, api_key) 缓存的 OpenAI 兼容提供者。
+    
+    Args:
+        base_url: API 地址（默认使用设置中的值）
+        api_key: API 密钥（默认使用设置中的值）
+    
+    Returns:
+        共享 HTTP 连接池的 OpenAIProvider
+    """
+    # 延迟导入 OpenAI SDK，导入代理模块时不付出这部分开销
+    from pydantic_ai.providers.openai import OpenAIProvider
+    
+    base_url = base_url or settings.llm_base_url
+    api_key = api_key or settings.llm_api_key
+    key = (base_url, api_key)
+    
+    with _registry_lock:
+        http_client = _get_llm_http_client()
+        provider = _providers.get(key)
+        if provider is None:
+            provider = OpenAIProvider(base_url=base_url, api_key=api_key, http_client=http_client)
+            _providers[key] = provider
+        return provider
+
 
-def get_llm_model(model_choice: Optional[str] = None) -> OpenAIModel:
+def get_llm_model(model_choice: Optional[str] = None) -> Model:
     """
     基于环境变量获取 LLM 模型配置。
     
+    相同的 (base_url, api_key, model) 在进程内只创建一次；
+    修改相关设置后请调用 invalidate_llm_models()。
+    
     Args:
         model_choice: 模型选择的可选覆盖
     
     Returns:
-        配置好的 OpenAI 兼容模型
+        配置好的 OpenAI 兼容模型；LLM_CACHE_MODE 不是 passthrough 时包装响应缓存
     """
     llm_choice = model_choice or settings.llm_model
     base_url = settings.llm_base_url
     api_key = settings.llm_api_key
+    key = (base_url, api_key, llm_choice, settings.llm_cache_mode, settings.llm_cache_dir)
     
-    # 基于配置创建提供者
-    provider = OpenAIProvider(base_url=base_url, api_key=api_key)
+    model = _models.get(key)
+    if model is not None:
+        return model
     
-    return OpenAIModel(llm_choice, provider=provider)
+    from pydantic_ai.models.openai import OpenAIModel
+    from .model_cache import CachingModel
+    
+    # 基于配置创建（或复用）提供者
+    provider = get_llm_provider(base_url=base_url, api_key=api_key)
+    
+    model = OpenAIModel(llm_choice, provider=provider)
+    
+    # 开发和 CI 中录制/重放模型响应
+    if settings.llm_cache_mode != "passthrough":
+        model = CachingModel(model, directory=settings.llm_cache_dir, mode=settings.llm_cache_mode)
+    
+    with _registry_lock:
+        return _models.setdefault(key, model)
+
+
+def invalidate_llm_models() -> None:
+    """清空提供者和模型注册表，下次调用 get_llm_model() 时按当前设置重建。"""
+    with _registry_lock:
+        _clear_registry()
+
+
+async def close_llm_clients() -> None:
+    """关闭共享的 LLM HTTP 客户端并清空注册表，应在进程退出前调用。"""
+    global _llm_http_client
+    with _registry_lock:
+        client = _llm_http_client
+        _llm_http_client = None
+        _clear_registry()
+    if client is not None and not client.is_closed:
+        await client.aclose()
 
 
 def get_model_info() -> dict:
@@ -38,6 +153,7 @@ def get_model_info() -> dict:
         "llm_provider": settings.llm_provider,
         "llm_model": settings.llm_model,
         "llm_base_url": settings.llm_base_url,
+        "llm_cache_mode": settings.llm_cache_mode,
         "app_env": settings.app_env,
         "debug": settings.debug,
     }
@@ -0,0 +1,306 @@
+"""
+Brave 搜索 API 的客户端速率限制和自适应退避。
+
+所有并发代理运行共享同一个令牌桶，它会根据 Brave 返回的
+X-RateLimit-* 响应头自动调整；遇到 429/5xx 时使用带抖动的指数退避重试。
+"""
+
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Mapping, Optional, Tuple
+
+import httpx
+
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitExceeded(Exception):
+    """速率限制无法在允许的等待时间内满足，或重试次数已用尽。"""
+
+
+def _parse_header_values(value: Optional[str]) -> List[float]:
+    """解析 Brave 的逗号分隔速率限制头，例如 "1, 15000"。"""
+    if not value:
+        return []
+    parsed = []
+    for item in value.split(","):
+        try:
+            parsed.append(float(item.strip()))
+        except ValueError:
+            continue
+    return parsed
+
+
+def _parse_policy_windows(value: Optional[str]) -> List[float]:
+    """解析 X-RateLimit-Policy 中的窗口长度，例如 "1;w=1, 15000;w=2592000"。"""
+    if not value:
+        return []
+    windows = []
+    for item in value.split(","):
+        for field in item.split(";")[1:]:
+            key, _, raw = field.strip().partition("=")
+            if key == "w":
+                try:
+                    windows.append(float(raw))
+                except ValueError:
+                    pass
+    return windows
+
+
+class TokenBucket:
+    """
+    异步令牌桶速率限制器。
+
+    "queue" 模式下突发请求会排队等待令牌以平滑流量；
+    "fail" 模式下没有可用令牌时立即抛出 RateLimitExceeded。
+    """
+
+    def __init__(
+        self,
+        rate: float = 1.0,
+        capacity: float = 1.0,
+        mode: str = "queue",
+        max_wait: float = 30.0
+    ):
+        """
+        Args:
+            rate: 每秒补充的令牌数
+            capacity: 桶容量（允许的最大突发请求数）
+            mode: "queue"（排队等待）或 "fail"（立即失败）
+            max_wait: 排队模式下单个请求的最长等待时间（秒）
+        """
+        if mode not in ("queue", "fail"):
+            raise ValueError(f"Unknown rate limit mode: {mode}")
+
+        self.rate = rate
+        self.capacity = capacity
+        self.mode = mode
+        self.max_wait = max_wait
+
+        # 可以为负：表示已经预留给正在等待的请求的令牌
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated_at
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated_at = now
+
+    def _wait_time(self, now: float) -> float:
+        """计算获得下一个令牌需要等待的秒数（包括排在前面的预留）。"""
+        blocked = max(0.0, self._blocked_until - now)
+        if self._tokens >= 1.0:
+            return blocked
+        missing = (1.0 - self._tokens) / self.rate if self.rate > 0 else float("inf")
+        return max(blocked, missing)
+
+    async def acquire(self) -> None:
+        """
+        获取一个令牌。
+
+        排队模式下先预留令牌再等待：后到的请求看到前面的预留，等待时间按 FIFO 顺序
+        累加，max_wait 限制的是每个请求的总等待时间。等待期间不持有任何锁。
+
+        Raises:
+            RateLimitExceeded: 在 "fail" 模式下无令牌可用，或等待时间超过 max_wait
+        """
+        now = time.monotonic()
+        self._refill(now)
+        wait = self._wait_time(now)
+
+        if wait > 0:
+            if self.mode == "fail":
+                raise RateLimitExceeded(
+                    f"Rate limit exceeded, next request allowed in {wait:.2f}s"
+                )
+            if wait > self.max_wait:
+                raise RateLimitExceeded(
+                    f"Rate limit wait of {wait:.2f}s exceeds max_wait={self.max_wait}s"
+                )
+
+        self._tokens -= 1.0
+        if wait <= 0:
+            return
+
+        logger.debug(f"Rate limiter queueing request for {wait:.2f}s")
+        deadline = now + self.max_wait
+        try:
+            await asyncio.sleep(wait)
+            # 等待期间收到 429 时，暂停结束前不发出请求
+            while (blocked := self._blocked_until - time.monotonic()) > 0:
+                if time.monotonic() + blocked > deadline:
+                    raise RateLimitExceeded(
+                        f"Rate limit pause of {blocked:.2f}s exceeds max_wait={self.max_wait}s"
+                    )
+                await asyncio.sleep(blocked)
+        except BaseException:
+            # 取消或超时：归还预留的令牌
+            self._tokens = min(self.capacity, self._tokens + 1.0)
+            raise
+
+    def block_for(self, seconds: float) -> None:
+        """在指定秒数内暂停发放令牌（例如收到 429 或 Retry-After 后）。"""
+        now = time.monotonic()
+        self._refill(now)
+        self._blocked_until = max(self._blocked_until, now + seconds)
+        # 保留已有的预留（负数），只清空可用令牌
+        self._tokens = min(self._tokens, 0.0)
+
+    def update_from_headers(self, headers: Mapping[str, str]) -> None:
+        """
+        根据 Brave 的速率限制响应头调整令牌桶。
+
+        Brave 返回多个窗口的值（例如每秒和每月），第一个值对应最短窗口。
+
+        Args:
+            headers: HTTP 响应头
+        """
+        limits = _parse_header_values(headers.get("X-RateLimit-Limit"))
+        remaining = _parse_header_values(headers.get("X-RateLimit-Remaining"))
+        resets = _parse_header_values(headers.get("X-RateLimit-Reset"))
+        windows = _parse_policy_windows(headers.get("X-RateLimit-Policy"))
+
+        if limits and limits[0] > 0:
+            window = windows[0] if windows else 1.0
+            self.rate = limits[0] / window
+            self.capacity = max(1.0, min(self.capacity, limits[0]))
+
+        # 任一窗口的剩余额度耗尽时，暂停到该窗口重置
+        for idx, left in enumerate(remaining):
+            if left <= 0 and idx < len(resets):
+                logger.warning(f"Brave rate limit window exhausted, pausing for {resets[idx]:.0f}s")
+                self.block_for(resets[idx])
+
+
+@dataclass
+class RetryPolicy:
+    """带抖动的指数退避重试策略。"""
+    max_retries: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 8.0
+    retry_statuses: Tuple[int, ...] = (429, 500, 502, 503, 504)
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        计算第 attempt 次重试前的等待时间（full jitter）。
+
+        Args:
+            attempt: 从 0 开始的重试序号
+            retry_after: 服务器通过 Retry-After 指定的最短等待时间
+
+        Returns:
+            等待秒数
+        """
+        delay = random.uniform(0.0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    """解析 Retry-After 响应头（仅支持秒数形式）。"""
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+async def send_with_retry(
+    send: Callable[[], Awaitable[httpx.Response]],
+    limiter: Optional[TokenBucket] = None,
+    policy: Optional[RetryPolicy] = None
+) -> httpx.Response:
+    """
+    在速率限制器下发送请求，并在 429/5xx 或连接错误、超时时退避重试。
+
+    Args:
+        send: 每次调用都会发送一次新请求的协程工厂
+        limiter: 可选的共享令牌桶
+        policy: 可选的重试策略
+
+    Returns:
+        最后一次请求的响应（重试用尽时可能仍是 429/5xx）
+
+    Raises:
+        httpx.TransportError: 重试用尽后仍然连接失败或超时
+    """
+    policy = policy or RetryPolicy()
+    attempt = 0
+
+    while True:
+        if limiter is not None:
+            await limiter.acquire()
+
+        try:
+            response = await send()
+        except httpx.TransportError as e:
+            # 连接失败、超时（httpx.TimeoutException）等瞬时错误同样退避重试
+            if attempt >= policy.max_retries:
+                raise
+            delay = policy.backoff(attempt)
+            logger.warning(
+                f"Brave API request failed ({type(e).__name__}: {e}), "
+                f"retrying in {delay:.2f}s (attempt {attempt + 1}/{policy.max_retries})"
+            )
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+
+        if limiter is not None:
+            limiter.update_from_headers(response.headers)
+
+        if response.status_code not in policy.retry_statuses or attempt >= policy.max_retries:
+            return response
+
+        retry_after = _retry_after(response)
+        delay = policy.backoff(attempt, retry_after)
+        if limiter is not None and response.status_code == 429:
+            # 让共享同一限制器的其他请求也一起退避
+            limiter.block_for(delay)
+
+        logger.warning(
+            f"Brave API returned {response.status_code}, "
+            f"retrying in {delay:.2f}s (attempt {attempt + 1}/{policy.max_retries})"
+        )
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+# 所有并发代理运行共享的速率限制器
+_brave_limiter: Optional[TokenBucket] = None
+
+
+def get_brave_rate_limiter() -> TokenBucket:
+    """
+    获取进程级共享的 Brave 速率限制器，首次调用时根据设置创建。
+
+    Returns:
+        共享的 TokenBucket
+    """
+    global _brave_limiter
+    if _brave_limiter is None:
+        _brave_limiter = TokenBucket(
+            rate=settings.brave_rate_limit,
+            capacity=settings.brave_rate_burst,
+            mode=settings.brave_rate_limit_mode,
+            max_wait=settings.brave_rate_limit_max_wait
+        )
+    return _brave_limiter
+
+
+def get_brave_retry_policy() -> RetryPolicy:
+    """根据设置创建 Brave 请求的重试策略。"""
+    return RetryPolicy(
+        max_retries=settings.brave_max_retries,
+        base_delay=settings.brave_retry_base_delay,
+        max_delay=settings.brave_retry_max_delay
+    )
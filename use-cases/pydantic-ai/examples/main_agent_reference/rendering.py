@@ -0,0 +1,248 @@
+"""
+CLI 流式输出的缓冲渲染器。
+
+逐令牌调用 console.print 会让 Rich 对每个增量都做一次渲染和写入，
+快速模型下 CPU 开销很高。StreamRenderer 把文本增量和工具事件行
+先放进缓冲区，由后台任务按固定帧率合并刷新，每帧只渲染一次。
+
+StreamEventHandler 用预先计算的 事件类型 -> 处理方法 表分发 pydantic-ai
+流式事件，热路径上每个事件只做一次字典查找；工具委派给子代理时，
+子代理的流式事件通过 on_subagent_event 回调渲染在工具调用行下方。
+"""
+
+import asyncio
+from typing import Any, AsyncIterable, Callable, Dict, List, Optional
+
+from pydantic_ai.messages import (
+    FunctionToolCallEvent,
+    FunctionToolResultEvent,
+    PartDeltaEvent,
+    PartStartEvent,
+    TextPart,
+    TextPartDelta,
+    ToolReturnPart,
+)
+from rich.console import Console
+from rich.markup import escape
+from rich.text import Text
+
+from .delegation import Delegation, SubAgentEvent
+
+
+class StreamRenderer:
+    """
+    按帧率上限合并输出的渲染器。
+
+    用法：
+
+        async with StreamRenderer(console, max_fps=20) as renderer:
+            renderer.write(delta_text)
+            renderer.print("[cyan]Calling tool[/cyan]")
+    """
+
+    def __init__(self, console: Console, max_fps: float = 20.0):
+        """
+        Args:
+            console: 输出使用的 Rich 控制台
+            max_fps: 每秒最多刷新次数
+        """
+        self.console = console
+        self.interval = 1.0 / max_fps
+        self._pending: List[Text] = []
+        self._ticker: Optional[asyncio.Task] = None
+        self.writes = 0
+        self.flushes = 0
+
+    def write(self, text: str) -> None:
+        """缓冲一段原样输出的文本（不解析标记）。"""
+        if text:
+            self._pending.append(Text(text))
+            self.writes += 1
+
+    def print(self, markup: str = "", end: str = "\n") -> None:
+        """缓冲一行 Rich 标记文本。"""
+        self._pending.append(Text.from_markup(markup + end))
+        self.writes += 1
+
+    def flush(self) -> None:
+        """把缓冲区合并为一次渲染写出。"""
+        if not self._pending:
+            return
+        chunk = Text().join(self._pending)
+        self._pending.clear()
+        self.console.print(chunk, end="", soft_wrap=True)
+        self.flushes += 1
+
+    async def _tick(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            self.flush()
+
+    async def __aenter__(self) -> "StreamRenderer":
+        self._ticker = asyncio.create_task(self._tick())
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        if self._ticker is not None:
+            self._ticker.cancel()
+            try:
+                await self._ticker
+            except asyncio.CancelledError:
+                pass
+            self._ticker = None
+        self.flush()
+
+
+
+def _truncate(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+def format_tool_args(args: Any) -> str:
+    """生成工具参数的简短预览：字典显示前三个参数，其他形式截断为 100 个字符。"""
+    if isinstance(args, dict):
+        return ", ".join(f"{key}={_truncate(str(value), 50)}" for key, value in list(args.items())[:3])
+    return _truncate(str(args), 100)
+
+
+class StreamEventHandler:
+    """
+    把代理流式事件渲染到 StreamRenderer。
+
+    模型请求节点和工具调用节点的事件都交给 dispatch()；
+    未在表中注册的事件类型（如 FinalResultEvent）直接忽略。
+    """
+
+    # 事件类 -> 处理方法名，在实例化时绑定，避免每个事件都做属性查找
+    HANDLERS: Dict[type, str] = {
+        PartStartEvent: "on_part_start",
+        PartDeltaEvent: "on_part_delta",
+        FunctionToolCallEvent: "on_tool_call",
+        FunctionToolResultEvent: "on_tool_result",
+    }
+
+    def __init__(self, renderer: StreamRenderer):
+        self.renderer = renderer
+        self._handlers: Dict[type, Callable[[Any], None]] = {
+            event_type: getattr(self, name) for event_type, name in self.HANDLERS.items()
+        }
+        self._write = renderer.write
+        self._chunks: List[str] = []
+        self._append = self._chunks.append
+        self._in_text = False
+        # tool_call_id -> 调用编号，并发执行的工具结果按完成顺序到达，用编号对应到调用
+        self._call_numbers: Dict[str, int] = {}
+        # 正在流式运行的子代理委派，用于提前取消
+        self.delegations: Dict[int, Delegation] = {}
+        self._subagent_midline = False
+
+    @property
+    def response_text(self) -> str:
+        """最近一次模型响应中流式输出的文本。"""
+        return "".join(self._chunks)
+
+    def dispatch(self, event: Any) -> None:
+        """按事件的具体类型调用对应的处理方法。"""
+        handler = self._handlers.get(type(event))
+        if handler is not None:
+            handler(event)
+
+    async def consume(self, stream: AsyncIterable[Any]) -> None:
+        """
+        消费一个节点的事件流。
+
+        文本增量占事件的绝大多数，在循环内联处理；其余事件走分发表。
+        查找和写入方法都在循环外绑定为局部变量。
+        """
+        lookup = self._handlers.get
+        write = self._write
+        append = self._append
+        async for event in stream:
+            event_type = type(event)
+            if event_type is PartDeltaEvent:
+                delta = event.delta
+                if type(delta) is TextPartDelta:
+                    write(delta.content_delta)
+                    append(delta.content_delta)
+                continue
+            handler = lookup(event_type)
+            if handler is not None:
+                handler(event)
+
+    def begin_response(self) -> None:
+        """开始新的模型响应。"""
+        self._chunks.clear()
+        self._in_text = False
+
+    def end_response(self) -> None:
+        """结束模型响应，如果输出过文本则换行。"""
+        if self._in_text:
+            self.renderer.print()
+            self._in_text = False
+
+    def on_part_start(self, event: PartStartEvent) -> None:
+        part = event.part
+        if type(part) is TextPart:
+            # 文本部分总是先以 PartStartEvent 开始，在这里显示助手前缀，增量处理无需再判断
+            if not self._in_text:
+                self.renderer.print("[bold blue]Assistant:[/bold blue] ", end="")
+                self._in_text = True
+            if part.content:
+                self._write(part.content)
+                self._append(part.content)
+
+    def on_part_delta(self, event: PartDeltaEvent) -> None:
+        # 热路径：只有一次类型判断，写入方法已预先绑定
+        delta = event.delta
+        if type(delta) is TextPartDelta:
+            self._write(delta.content_delta)
+            self._append(delta.content_delta)
+
+    def on_tool_call(self, event: FunctionToolCallEvent) -> None:
+        part = event.part
+        number = self._call_numbers.setdefault(part.tool_call_id, len(self._call_numbers) + 1)
+        self.renderer.print(f"  🔹 [cyan]Calling tool #{number}:[/cyan] [bold]{escape(part.tool_name)}[/bold]")
+        if part.args:
+            self.renderer.print(f"    [dim]Args: {escape(format_tool_args(part.args))}[/dim]")
+
+    def on_tool_result(self, event: FunctionToolResultEvent) -> None:
+        result = event.result
+        if isinstance(result, ToolReturnPart):
+            text = result.model_response_str()
+        else:
+            text = result.model_response()
+        number = self._call_numbers.get(result.tool_call_id, "?")
+        self.renderer.print(
+            f"  ✅ [green]Tool result #{number}[/green] [bold]{escape(result.tool_name or '')}[/bold]: "
+            f"[dim]{escape(_truncate(text, 100))}[/dim]"
+        )
+
+    def on_subagent_event(self, event: SubAgentEvent) -> None:
+        """渲染子代理委派的流式事件；作为 ResearchAgentDependencies.subagent_sink 传入。"""
+        delegation = event.delegation
+        kind = event.kind
+        if kind == "text":
+            if not self._subagent_midline:
+                self._write("      ")
+            self._write(event.content)
+            self._subagent_midline = True
+        elif kind == "start":
+            self.delegations[delegation.id] = delegation
+            source = " (cached)" if event.cached else ""
+            self.renderer.print(f"    📨 [magenta]{escape(delegation.name)}{source}:[/magenta] ", end="")
+            self._subagent_midline = True
+        elif kind == "tool_call":
+            prefix = "\n" if self._subagent_midline else ""
+            self.renderer.print(f"{prefix}    🔸 [dim]{escape(delegation.name)} → {escape(event.content)}[/dim]")
+            self._subagent_midline = False
+        elif kind in ("end", "cancelled"):
+            self.delegations.pop(delegation.id, None)
+            if kind == "cancelled":
+                self.renderer.print(" [yellow](cancelled)[/yellow]")
+            elif self._subagent_midline:
+                self.renderer.print()
+            self._subagent_midline = False
+
+    def cancel_delegations(self) -> int:
+        """取消所有正在进行的子代理委派，返回被取消的数量。"""
+        return sum(1 for delegation in list(self.delegations.values()) if delegation.cancel())
@@ -2,13 +2,17 @@
 
 import logging
 from typing import Dict, Any, List, Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 from pydantic_ai import Agent, RunContext
 
-from .providers import get_llm_model
-from .email_agent import email_agent, EmailAgentDependencies
-from .tools import search_web_tool
+from .providers import get_llm_model, on_llm_models_invalidated
+from .settings import settings
+from .models import SearchResults
+from .tools import search_web_tool, search_web_tool_batch
+from .tool_execution import ToolConcurrencyLimiter
+from .subagent_cache import get_subagent_cache
+from .delegation import Delegation, DelegationCancelled, SubAgentEventSink
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +26,7 @@ SYSTEM_PROMPT = """
 
 进行研究时：
 - 使用具体、有针对性的搜索查询
+- 需要多个查询时，使用 search_web_many 一次性并发搜索，而不是逐个调用 search_web
 - 分析搜索结果的相关性和可信度
 - 综合来自多个来源的信息
 - 提供清晰、组织良好的摘要
@@ -44,17 +49,12 @@ class ResearchAgentDependencies:
     gmail_credentials_path: str
     gmail_token_path: str
     session_id: Optional[str] = None
+    # 为 True 时跳过子代理缓存，总是重新运行子代理
+    bypass_subagent_cache: bool = False
+    # 接收子代理流式事件的回调（CLI 渲染、服务器转发为 SSE）
+    subagent_sink: Optional[SubAgentEventSink] = field(default=None, compare=False, repr=False)
 
 
-# 初始化研究代理
-research_agent = Agent(
-    get_llm_model(),
-    deps_type=ResearchAgentDependencies,
-    system_prompt=SYSTEM_PROMPT
-)
-
-
-@research_agent.tool
 async def search_web(
     ctx: RunContext[ResearchAgentDependencies],
     query: str,
@@ -88,27 +88,69 @@ async def search_web(
         return [{"error": f"Search failed: {str(e)}"}]
 
 
-@research_agent.tool
+async def search_web_many(
+    ctx: RunContext[ResearchAgentDependencies],
+    queries: List[str],
+    max_results_per_query: int = 10,
+    max_results: int = 20
+) -> List[Dict[str, Any]]:
+    """
+    并发执行多个搜索查询，返回按 URL 去重并重新评分的合并结果。
+    
+    Args:
+        queries: 搜索查询列表
+        max_results_per_query: 每个查询的最大结果数（1-20）
+        max_results: 合并后返回的最大结果数
+    
+    Returns:
+        包含标题、URL、描述、评分和命中查询的搜索结果列表
+    """
+    try:
+        max_results_per_query = min(max(max_results_per_query, 1), 20)
+        
+        results = await search_web_tool_batch(
+            api_key=ctx.deps.brave_api_key,
+            queries=queries,
+            count=max_results_per_query,
+            max_results=max(max_results, 1)
+        )
+        
+        logger.info(f"Found {len(results)} merged results for {len(queries)} queries")
+        return results
+        
+    except Exception as e:
+        logger.error(f"Batch web search failed: {e}")
+        return [{"error": f"Search failed: {str(e)}"}]
+
+
 async def create_email_draft(
     ctx: RunContext[ResearchAgentDependencies],
     recipient_email: str,
     subject: str,
     context: str,
-    research_summary: Optional[str] = None
+    research_summary: Optional[str] = None,
+    regenerate: bool = False
 ) -> Dict[str, Any]:
     """
     使用邮件代理基于研究上下文创建邮件草稿。
     
+    相同的收件人、主题、上下文和研究摘要会直接返回之前创建的草稿，
+    不会重复运行邮件代理。
+    
     Args:
         recipient_email: 收件人的邮件地址
         subject: 邮件主题行
         context: 邮件的上下文或目的
         research_summary: 可选的研究结果包含
+        regenerate: 用户明确要求重新生成时设为 True，跳过已有草稿
     
     Returns:
         包含草稿创建结果的字典
     """
     try:
+        # 邮件代理模块在导入时构建模型，只在第一次委派时才导入
+        from .email_agent import email_agent, EmailAgentDependencies
+        
         # 准备邮件内容提示
         if research_summary:
             email_prompt = f"""
@@ -144,23 +186,57 @@ Please create a well-structured email that addresses the context provided.
             session_id=ctx.deps.session_id
         )
         
-        # 运行邮件代理
-        result = await email_agent.run(
-            email_prompt,
-            deps=email_deps,
-            usage=ctx.usage  # 传递使用情况以进行令牌跟踪
-        )
+        # 流式运行邮件代理，部分输出实时推送给 subagent_sink，父级可以提前取消
+        delegation = Delegation("email_agent", sink=ctx.deps.subagent_sink)
+        # 邮件代理在导入时绑定模型，每次委派都传入当前模型，避免使用失效模型及其已关闭的客户端
+        model = get_llm_model()
         
-        logger.info(f"Email agent invoked for recipient: {recipient_email}")
+        # 相同的提示和依赖项在 TTL 内复用之前的输出
+        cache = get_subagent_cache()
+        if cache is not None:
+            result = await cache.run(
+                email_agent,
+                email_prompt,
+                deps=email_deps,
+                name="email_agent",
+                usage=ctx.usage,  # 实际运行时把子代理用量计入父运行
+                bypass=regenerate or ctx.deps.bypass_subagent_cache,
+                runner=lambda: delegation.run(email_agent, email_prompt, deps=email_deps, model=model)
+            )
+            agent_response, cached = result.output, result.cached
+            if cached:
+                delegation.replay(agent_response)
+        else:
+            agent_response, _ = await delegation.run(
+                email_agent,
+                email_prompt,
+                deps=email_deps,
+                usage=ctx.usage,  # 传递使用情况以进行令牌跟踪
+                model=model
+            )
+            cached = False
+        
+        logger.info(f"Email agent {'reused' if cached else 'invoked'} for recipient: {recipient_email}")
         
         return {
             "success": True,
-            "agent_response": result.data,
+            "agent_response": agent_response,
+            "cached": cached,
             "recipient": recipient_email,
             "subject": subject,
             "context": context
         }
         
+    except DelegationCancelled as e:
+        logger.info(f"Email draft for {recipient_email} cancelled by the caller")
+        return {
+            "success": False,
+            "cancelled": True,
+            "partial_response": e.partial_output,
+            "recipient": recipient_email,
+            "subject": subject
+        }
+        
     except Exception as e:
         logger.error(f"Failed to create email draft via Email Agent: {e}")
         return {
@@ -171,7 +247,6 @@ Please create a well-structured email that addresses the context provided.
         }
 
 
-@research_agent.tool
 async def summarize_research(
     ctx: RunContext[ResearchAgentDependencies],
     search_results: List[Dict[str, Any]],
@@ -197,15 +272,10 @@ async def summarize_research(
                 "sources": []
             }
         
-        # 提取关键信息
-        sources = []
-        descriptions = []
-        
-        for result in search_results:
-            if "title" in result and "url" in result:
-                sources.append(f"- {result['title']}: {result['url']}")
-                if "description" in result:
-                    descriptions.append(result["description"])
+        # 单次遍历提取为列式结果，跳过缺少标题或 URL 的条目
+        results = SearchResults.from_records(search_results)
+        sources = [f"- {title}: {url}" for title, url in zip(results.titles, results.urls)]
+        descriptions = [description for description in results.descriptions if description]
         
         # 创建摘要内容
         content_summary = "\n".join(descriptions[:5])  # 限制为前 5 个描述
@@ -239,6 +309,50 @@ Sources:
         }
 
 
+_research_agent: Optional[Agent] = None
+
+
+def get_research_agent() -> Agent:
+    """
+    获取研究代理，首次使用时才构建模型和代理，之后复用。
+    
+    Returns:
+        注册了所有工具的研究代理
+    """
+    global _research_agent
+    if _research_agent is None:
+        # 初始化研究代理
+        agent = Agent(
+            get_llm_model(),
+            deps_type=ResearchAgentDependencies,
+            system_prompt=SYSTEM_PROMPT
+        )
+        # 同一次运行中的多个工具调用共享并发上限（每次运行各自计数）
+        limiter = ToolConcurrencyLimiter(settings.tool_execution_mode, settings.tool_max_concurrency)
+        for tool in (search_web, search_web_many, summarize_research):
+            agent.tool(limiter.wrap(tool))
+        # 邮件委派会运行整个子代理，不占用执行槽位，否则会在整个子代理运行期间阻塞其他工具
+        agent.tool(create_email_draft)
+        _research_agent = agent
+    return _research_agent
+
+
+def _reset_research_agent() -> None:
+    """模型注册表被清空后丢弃已构建的代理，下次使用时按当前设置重建。"""
+    global _research_agent
+    _research_agent = None
+
+
+on_llm_models_invalidated(_reset_research_agent)
+
+
+def __getattr__(name: str):
+    """保持 `from agents.research_agent import research_agent` 可用，同时延迟构建代理。"""
+    if name == "research_agent":
+        return get_research_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 # 创建带有依赖项的研究代理的便利函数
 def create_research_agent(
     brave_api_key: str,
@@ -258,4 +372,4 @@ def create_research_agent(
     Returns:
         配置的研究代理
     """
-    return research_agent
\ No newline at end of file
+    return get_research_agent()
\ No newline at end of file
@@ -0,0 +1,497 @@
+"""
+研究代理的无界面多会话服务器（HTTP + SSE）。
+
+单个进程通过 asyncio 托管大量并发会话，所有会话共享模型客户端、
+搜索 HTTP 连接池和代理实例。代理运行数受信号量限制，排队的运行
+超过上限时直接返回 503，流式响应在客户端读取变慢时随写缓冲区施加背压。
+
+接口：
+    POST   /sessions                    创建会话，返回 {"session_id": ...}
+    GET    /sessions/{id}               获取会话状态（SessionState）
+    DELETE /sessions/{id}               删除会话
+    POST   /sessions/{id}/messages      发送 {"message": ...}，以 SSE 流式返回事件
+    POST   /sessions/{id}/delegations/cancel  取消会话中正在流式运行的子代理委派
+    GET    /metrics                     服务器和会话指标
+    GET    /health                      健康检查
+
+用法：
+    python -m agents.server --host 127.0.0.1 --port 8080
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import re
+from dataclasses import dataclass
+from http import HTTPStatus
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pydantic_ai import Agent
+from pydantic_ai.messages import (
+    FunctionToolCallEvent,
+    FunctionToolResultEvent,
+    PartDeltaEvent,
+    PartStartEvent,
+    TextPart,
+    TextPartDelta,
+    ToolReturnPart,
+)
+
+from .delegation import Delegation, SubAgentEvent
+from .http_client import close_http_pool
+from .providers import close_llm_clients
+from .research_agent import ResearchAgentDependencies, get_research_agent
+from .session_store import SessionStoreCorruptedError
+from .sessions import Session, SessionManager, SessionNotFoundError
+from .subagent_cache import get_subagent_cache
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+SendEvent = Callable[[str, Dict[str, Any]], Awaitable[None]]
+SendEventNowait = Callable[[str, Dict[str, Any]], None]
+
+
+class HTTPError(Exception):
+    """以指定状态码结束请求。"""
+
+    def __init__(self, status: HTTPStatus, message: str, headers: Optional[Dict[str, str]] = None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or {}
+
+
+@dataclass
+class Request:
+    """解析后的 HTTP 请求。"""
+    method: str
+    path: str
+    headers: Dict[str, str]
+    body: bytes
+
+    def json(self) -> Dict[str, Any]:
+        if not self.body:
+            return {}
+        try:
+            payload = json.loads(self.body)
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Request body is not valid JSON")
+        if not isinstance(payload, dict):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Request body must be a JSON object")
+        return payload
+
+
+def _encode_part_start(event: PartStartEvent) -> Optional[Tuple[str, Dict[str, Any]]]:
+    if type(event.part) is TextPart and event.part.content:
+        return "text", {"delta": event.part.content}
+    return None
+
+
+def _encode_part_delta(event: PartDeltaEvent) -> Optional[Tuple[str, Dict[str, Any]]]:
+    if type(event.delta) is TextPartDelta:
+        return "text", {"delta": event.delta.content_delta}
+    return None
+
+
+def _encode_tool_call(event: FunctionToolCallEvent) -> Optional[Tuple[str, Dict[str, Any]]]:
+    return "tool_call", {
+        "tool_name": event.part.tool_name,
+        "tool_call_id": event.part.tool_call_id,
+        "args": event.part.args_as_dict(),
+    }
+
+
+def _encode_tool_result(event: FunctionToolResultEvent) -> Optional[Tuple[str, Dict[str, Any]]]:
+    result = event.result
+    content = result.model_response_str() if isinstance(result, ToolReturnPart) else result.model_response()
+    return "tool_result", {
+        "tool_name": result.tool_name,
+        "tool_call_id": result.tool_call_id,
+        "content": content,
+    }
+
+
+# 事件类 -> SSE 编码函数，与 CLI 的 StreamEventHandler 使用相同的查表分发
+EVENT_ENCODERS: Dict[type, Callable[[Any], Optional[Tuple[str, Dict[str, Any]]]]] = {
+    PartStartEvent: _encode_part_start,
+    PartDeltaEvent: _encode_part_delta,
+    FunctionToolCallEvent: _encode_tool_call,
+    FunctionToolResultEvent: _encode_tool_result,
+}
+
+
+class ResearchServer:
+    """在一个事件循环中托管多个研究代理会话的 HTTP/SSE 服务器。"""
+
+    ROUTES = [
+        ("POST", re.compile(r"^/sessions$"), "create_session"),
+        ("GET", re.compile(r"^/sessions/(?P<session_id>[0-9a-f]{32})$"), "get_session"),
+        ("DELETE", re.compile(r"^/sessions/(?P<session_id>[0-9a-f]{32})$"), "delete_session"),
+        ("POST", re.compile(r"^/sessions/(?P<session_id>[0-9a-f]{32})/messages$"), "post_message"),
+        ("POST", re.compile(r"^/sessions/(?P<session_id>[0-9a-f]{32})/delegations/cancel$"), "cancel_delegations"),
+        ("GET", re.compile(r"^/metrics$"), "get_metrics"),
+        ("GET", re.compile(r"^/health$"), "get_health"),
+    ]
+
+    def __init__(
+        self,
+        sessions: Optional[SessionManager] = None,
+        max_concurrent_runs: Optional[int] = None,
+        max_pending_runs: Optional[int] = None,
+        max_request_bytes: Optional[int] = None
+    ):
+        """
+        Args:
+            sessions: 会话管理器
+            max_concurrent_runs: 同时执行的代理运行数上限
+            max_pending_runs: 等待执行槽位的运行数上限，超出时返回 503
+            max_request_bytes: 请求体大小上限
+        """
+        # SessionManager 定义了 __len__，没有会话时为假值，不能用 or 选择默认值
+        self.sessions = sessions if sessions is not None else SessionManager()
+        self.max_concurrent_runs = max_concurrent_runs or settings.server_max_concurrent_runs
+        self.max_pending_runs = (
+            max_pending_runs if max_pending_runs is not None else settings.server_max_pending_runs
+        )
+        self.max_request_bytes = max_request_bytes or settings.server_max_request_bytes
+
+        self._run_slots = asyncio.Semaphore(self.max_concurrent_runs)
+        self.active_runs = 0
+        self.pending_runs = 0
+        self.completed_runs = 0
+        self.failed_runs = 0
+        self.rejected_runs = 0
+        # session_id -> 正在流式运行的子代理委派
+        self._delegations: Dict[str, Dict[int, Delegation]] = {}
+
+    # ---- HTTP 处理 ----
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Request:
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.LimitOverrunError:
+            raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Request headers too large")
+
+        request_line, *header_lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = request_line.split(" ", 2)
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+
+        headers = {}
+        for line in header_lines:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+
+        # 只接受十进制非负整数；int() 会放过 "+5"、"-1" 和 "1_000"
+        raw_length = headers.get("content-length") or "0"
+        if not (raw_length.isascii() and raw_length.isdigit()):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length")
+        length = int(raw_length)
+        if length > self.max_request_bytes:
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large")
+        body = await reader.readexactly(length) if length else b""
+
+        return Request(method=method.upper(), path=target.split("?", 1)[0], headers=headers, body=body)
+
+    @staticmethod
+    async def _write_head(
+        writer: asyncio.StreamWriter,
+        status: HTTPStatus,
+        headers: Dict[str, str]
+    ) -> None:
+        lines = [f"HTTP/1.1 {status.value} {status.phrase}"]
+        lines.extend(f"{name}: {value}" for name, value in headers.items())
+        lines.append("Connection: close")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+
+    async def _write_json(
+        self,
+        writer: asyncio.StreamWriter,
+        status: HTTPStatus,
+        payload: Any,
+        headers: Optional[Dict[str, str]] = None
+    ) -> None:
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        await self._write_head(writer, status, {
+            "Content-Type": "application/json; charset=utf-8",
+            "Content-Length": str(len(body)),
+            **(headers or {}),
+        })
+        writer.write(body)
+        await writer.drain()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """处理一个连接上的单个请求。"""
+        try:
+            request = await self._read_request(reader)
+            await self._dispatch(request, writer)
+        except HTTPError as e:
+            await self._write_json(writer, e.status, {"error": e.message}, e.headers)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # 客户端提前断开
+            pass
+        except Exception as e:
+            logger.exception(f"Unhandled server error: {e}")
+            try:
+                await self._write_json(writer, HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Internal server error"})
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _dispatch(self, request: Request, writer: asyncio.StreamWriter) -> None:
+        path_matched = False
+        for method, pattern, handler_name in self.ROUTES:
+            match = pattern.match(request.path)
+            if match is None:
+                continue
+            path_matched = True
+            if method == request.method:
+                await getattr(self, handler_name)(request, writer, **match.groupdict())
+                return
+
+        if path_matched:
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, f"Method {request.method} not allowed")
+        raise HTTPError(HTTPStatus.NOT_FOUND, f"No route for {request.path}")
+
+    async def _get_session(self, session_id: str) -> Session:
+        try:
+            return await self.sessions.get(session_id)
+        except SessionNotFoundError:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Session {session_id} not found")
+        except SessionStoreCorruptedError as e:
+            logger.error(str(e))
+            raise HTTPError(HTTPStatus.INTERNAL_SERVER_ERROR, f"Session {session_id} could not be restored")
+
+    # ---- 路由 ----
+
+    async def create_session(self, request: Request, writer: asyncio.StreamWriter) -> None:
+        payload = request.json()
+        session = await self.sessions.create(user_id=payload.get("user_id"))
+        await self._write_json(writer, HTTPStatus.CREATED, {"session_id": session.session_id})
+
+    async def get_session(self, request: Request, writer: asyncio.StreamWriter, session_id: str) -> None:
+        session = await self._get_session(session_id)
+        state = await self.sessions.full_state(session)
+        await self._write_json(writer, HTTPStatus.OK, state.model_dump(mode="json"))
+
+    async def delete_session(self, request: Request, writer: asyncio.StreamWriter, session_id: str) -> None:
+        session = await self._get_session(session_id)
+        if session.busy:
+            raise HTTPError(HTTPStatus.CONFLICT, "Session has a run in progress")
+        await self.sessions.delete(session_id)
+        await self._write_head(writer, HTTPStatus.NO_CONTENT, {"Content-Length": "0"})
+
+    async def get_metrics(self, request: Request, writer: asyncio.StreamWriter) -> None:
+        await self._write_json(writer, HTTPStatus.OK, self.metrics())
+
+    async def get_health(self, request: Request, writer: asyncio.StreamWriter) -> None:
+        await self._write_json(writer, HTTPStatus.OK, {"status": "ok"})
+
+    async def post_message(self, request: Request, writer: asyncio.StreamWriter, session_id: str) -> None:
+        message = request.json().get("message")
+        if not isinstance(message, str) or not message.strip():
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Field 'message' must be a non-empty string")
+
+        session = await self._get_session(session_id)
+        if session.busy:
+            raise HTTPError(HTTPStatus.CONFLICT, "Session has a run in progress")
+
+        # 背压：排队的运行超过上限时立即拒绝，而不是无限堆积
+        if self.pending_runs >= self.max_pending_runs and self._run_slots.locked():
+            self.rejected_runs += 1
+            raise HTTPError(
+                HTTPStatus.SERVICE_UNAVAILABLE,
+                "Server is at capacity, retry later",
+                {"Retry-After": "1"}
+            )
+
+        async with session.lock:
+            self.sessions.mark_active(session)
+            self.pending_runs += 1
+            try:
+                await self._run_slots.acquire()
+            finally:
+                self.pending_runs -= 1
+
+            try:
+                await self._write_head(writer, HTTPStatus.OK, {
+                    "Content-Type": "text/event-stream; charset=utf-8",
+                    "Cache-Control": "no-cache",
+                })
+
+                def send_nowait(event: str, data: Dict[str, Any]) -> None:
+                    frame = f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+                    writer.write(frame.encode("utf-8"))
+
+                async def send(event: str, data: Dict[str, Any]) -> None:
+                    send_nowait(event, data)
+                    # 客户端读取变慢时在此等待，代理运行随之放慢
+                    await writer.drain()
+
+                self.active_runs += 1
+                try:
+                    await self.run_turn(session, message.strip(), send, send_nowait)
+                    self.completed_runs += 1
+                except ConnectionError:
+                    # 客户端断开：放弃本轮，不写入会话
+                    self.failed_runs += 1
+                    raise
+                except Exception as e:
+                    self.failed_runs += 1
+                    logger.error(f"Run failed for session {session_id}: {e}")
+                    await send("error", {"error": str(e)})
+                finally:
+                    self.active_runs -= 1
+            finally:
+                self._run_slots.release()
+
+    async def cancel_delegations(self, request: Request, writer: asyncio.StreamWriter, session_id: str) -> None:
+        await self._get_session(session_id)
+        delegations = list(self._delegations.get(session_id, {}).values())
+        cancelled = sum(1 for delegation in delegations if delegation.cancel())
+        await self._write_json(writer, HTTPStatus.OK, {"cancelled": cancelled})
+
+    # ---- 代理运行 ----
+
+    def _subagent_sink(self, session_id: str, send_nowait: Optional[SendEventNowait]) -> Callable[[SubAgentEvent], None]:
+        """创建把子代理事件转发为 SSE "subagent" 事件并登记可取消委派的回调。"""
+        active = self._delegations.setdefault(session_id, {})
+
+        def sink(event: SubAgentEvent) -> None:
+            delegation = event.delegation
+            if event.kind == "start":
+                active[delegation.id] = delegation
+            elif event.kind in ("end", "cancelled"):
+                active.pop(delegation.id, None)
+            if send_nowait is not None:
+                # 回调是同步的：帧直接写入缓冲区，由下一次 send() 的 drain 施加背压
+                send_nowait("subagent", {
+                    "delegation_id": delegation.id,
+                    "agent": delegation.name,
+                    "kind": event.kind,
+                    "content": event.content,
+                    "cached": event.cached,
+                })
+
+        return sink
+
+    async def run_turn(
+        self,
+        session: Session,
+        user_text: str,
+        send: SendEvent,
+        send_nowait: Optional[SendEventNowait] = None
+    ) -> None:
+        """
+        在会话中执行一轮代理运行，并把流式事件发送给客户端。
+
+        Args:
+            session: 会话
+            user_text: 用户输入
+            send: 发送 SSE 事件的协程函数
+            send_nowait: 不等待写缓冲区排空的发送函数，用于转发子代理的流式事件
+        """
+        deps = ResearchAgentDependencies(
+            brave_api_key=settings.brave_api_key,
+            gmail_credentials_path=settings.gmail_credentials_path,
+            gmail_token_path=settings.gmail_token_path,
+            session_id=session.session_id,
+            subagent_sink=self._subagent_sink(session.session_id, send_nowait)
+        )
+        tools_used: List[Dict[str, Any]] = []
+        encoders = EVENT_ENCODERS
+
+        try:
+            async with get_research_agent().iter(
+                user_text,
+                deps=deps,
+                message_history=session.memory.messages()
+            ) as run:
+                async for node in run:
+                    if Agent.is_model_request_node(node) or Agent.is_call_tools_node(node):
+                        async with node.stream(run.ctx) as stream:
+                            async for event in stream:
+                                encoder = encoders.get(type(event))
+                                if encoder is None:
+                                    continue
+                                encoded = encoder(event)
+                                if encoded is None:
+                                    continue
+                                name, data = encoded
+                                if name == "tool_call":
+                                    tools_used.append({"tool_name": data["tool_name"], "args": data["args"]})
+                                await send(name, data)
+        finally:
+            self._delegations.pop(session.session_id, None)
+
+        result = run.result
+        output = str(result.output)
+        await self.sessions.record_turn(session, user_text, output, result.new_messages(), tools_used)
+
+        usage = run.usage()
+        await send("done", {
+            "output": output,
+            "usage": {
+                "request_tokens": usage.request_tokens or 0,
+                "response_tokens": usage.response_tokens or 0,
+                "cached_tokens": (usage.details or {}).get("cached_tokens", 0),
+            },
+        })
+
+    def metrics(self) -> Dict[str, Any]:
+        """返回运行计数、会话和子代理缓存指标。"""
+        subagent_cache = get_subagent_cache()
+        return {
+            "subagent_cache": subagent_cache.stats.to_dict() if subagent_cache else None,
+            "runs": {
+                "active": self.active_runs,
+                "pending": self.pending_runs,
+                "completed": self.completed_runs,
+                "failed": self.failed_runs,
+                "rejected": self.rejected_runs,
+                "max_concurrent": self.max_concurrent_runs,
+                "max_pending": self.max_pending_runs,
+            },
+            **self.sessions.metrics(),
+        }
+
+    async def serve(self, host: str, port: int) -> None:
+        """启动服务器并一直运行，退出时关闭共享的 HTTP 客户端。"""
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        logger.info(f"Research agent server listening on http://{host}:{port}")
+        sweeper = asyncio.create_task(self.sessions.run_idle_sweeper())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            sweeper.cancel()
+            self.sessions.close()
+            await close_http_pool()
+            await close_llm_clients()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="研究代理多会话服务器")
+    parser.add_argument("--host", default=settings.server_host, help="监听地址")
+    parser.add_argument("--port", type=int, default=settings.server_port, help="监听端口")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=settings.log_level.upper())
+    try:
+        asyncio.run(ResearchServer().serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
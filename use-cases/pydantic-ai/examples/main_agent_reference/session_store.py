@@ -0,0 +1,423 @@
+"""
+会话的持久化存储。
+
+每轮对话只追加一条记录（用户/助手的 ChatMessage 加上本轮的代理消息），
+不会重写整个历史；恢复会话时才读取并重放该会话的记录。
+
+记录使用紧凑的二进制编码：安装了 msgpack 时使用 msgpack，否则退回 JSON。
+每条记录带一个字节的格式标记，因此两种编码的记录可以混在同一个存储中。
+
+提供两种后端：
+- SQLiteSessionStore：单个 SQLite 文件，适合大量会话
+- LogSessionStore：每个会话一个只追加的日志文件
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import struct
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from pydantic_ai.messages import ModelMessage, ModelMessagesTypeAdapter
+
+from .models import ChatMessage, SessionState
+from .settings import settings
+
+try:
+    import msgpack
+except ImportError:  # msgpack 是可选的紧凑编码
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+_MSGPACK = b"M"
+_JSON = b"J"
+
+
+def pack_record(record: Dict[str, Any]) -> bytes:
+    """把只包含 JSON 兼容值的记录编码为带格式标记的字节串。"""
+    if msgpack is not None:
+        return _MSGPACK + msgpack.packb(record, use_bin_type=True)
+    return _JSON + json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def unpack_record(data: bytes) -> Dict[str, Any]:
+    """解码 pack_record 生成的字节串。"""
+    marker, payload = data[:1], data[1:]
+    if marker == _MSGPACK:
+        if msgpack is None:
+            raise RuntimeError("Session record was written with msgpack, which is not installed")
+        return msgpack.unpackb(payload, raw=False)
+    if marker == _JSON:
+        return json.loads(payload)
+    raise ValueError(f"Unknown session record format: {marker!r}")
+
+
+class SessionStoreCorruptedError(Exception):
+    """存储中的会话记录无法解码（而不是会话不存在）。"""
+
+    def __init__(self, session_id: str, reason: str):
+        self.session_id = session_id
+        super().__init__(f"Session {session_id} is corrupted: {reason}")
+
+
+def _turn_record(chat_messages: Sequence[ChatMessage], model_messages: Sequence[ModelMessage]) -> Dict[str, Any]:
+    return {
+        "chat": [message.model_dump(mode="json", exclude_none=True) for message in chat_messages],
+        "model": ModelMessagesTypeAdapter.dump_python(list(model_messages), mode="json"),
+    }
+
+
+@dataclass
+class StoredSession:
+    """从存储中恢复的会话：状态（含聊天记录）和每轮的代理消息。"""
+    state: SessionState
+    turns: List[List[ModelMessage]] = field(default_factory=list)
+
+
+def _restore(state: SessionState, records: Sequence[Dict[str, Any]]) -> StoredSession:
+    stored = StoredSession(state=state)
+    for record in records:
+        state.messages.extend(ChatMessage.model_validate(message) for message in record["chat"])
+        stored.turns.append(ModelMessagesTypeAdapter.validate_python(record["model"]))
+    return stored
+
+
+class SessionStore(ABC):
+    """会话存储的基类，子类实现具体后端。"""
+
+    @abstractmethod
+    def create(self, state: SessionState) -> None:
+        """保存新会话的元数据。"""
+
+    @abstractmethod
+    def append_turn(
+        self,
+        session_id: str,
+        chat_messages: Sequence[ChatMessage],
+        model_messages: Sequence[ModelMessage],
+        last_activity: datetime
+    ) -> int:
+        """
+        追加一轮对话。
+
+        Args:
+            session_id: 会话 ID
+            chat_messages: 本轮的用户/助手聊天消息
+            model_messages: 本轮代理运行产生的新消息
+            last_activity: 本轮结束时间
+
+        Returns:
+            写入的字节数
+        """
+
+    @abstractmethod
+    def load(self, session_id: str) -> Optional[StoredSession]:
+        """
+        读取会话，不存在时返回 None。
+
+        Raises:
+            SessionStoreCorruptedError: 会话存在但记录无法解码
+        """
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        """删除会话及其所有记录。"""
+
+    @abstractmethod
+    def session_ids(self) -> List[str]:
+        """列出所有已保存的会话 ID。"""
+
+    def close(self) -> None:
+        """释放存储占用的资源。"""
+
+    @abstractmethod
+    def __contains__(self, session_id: str) -> bool:
+        """会话是否存在。"""
+
+
+class SQLiteSessionStore(SessionStore):
+    """基于 SQLite 的会话存储，每轮插入一行。"""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: SQLite 数据库文件路径
+        """
+        self.path = path
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                user_id TEXT,
+                created_at TEXT NOT NULL,
+                last_activity TEXT NOT NULL,
+                turns INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS session_turns (
+                session_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                payload BLOB NOT NULL,
+                PRIMARY KEY (session_id, seq)
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.commit()
+
+    def create(self, state: SessionState) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO sessions (session_id, user_id, created_at, last_activity) VALUES (?, ?, ?, ?)",
+                (state.session_id, state.user_id, state.created_at.isoformat(), state.last_activity.isoformat())
+            )
+            self._conn.commit()
+
+    def append_turn(
+        self,
+        session_id: str,
+        chat_messages: Sequence[ChatMessage],
+        model_messages: Sequence[ModelMessage],
+        last_activity: datetime
+    ) -> int:
+        payload = pack_record(_turn_record(chat_messages, model_messages))
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE sessions SET turns = turns + 1, last_activity = ? WHERE session_id = ?",
+                (last_activity.isoformat(), session_id)
+            )
+            if cursor.rowcount == 0:
+                self._conn.rollback()
+                raise KeyError(session_id)
+            row = self._conn.execute(
+                "SELECT turns FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT INTO session_turns (session_id, seq, payload) VALUES (?, ?, ?)",
+                (session_id, row[0], payload)
+            )
+            self._conn.commit()
+        return len(payload)
+
+    def load(self, session_id: str) -> Optional[StoredSession]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT user_id, created_at, last_activity FROM sessions WHERE session_id = ?",
+                (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            payloads = self._conn.execute(
+                "SELECT payload FROM session_turns WHERE session_id = ? ORDER BY seq",
+                (session_id,)
+            ).fetchall()
+
+        user_id, created_at, last_activity = row
+        state = SessionState(
+            session_id=session_id,
+            user_id=user_id,
+            created_at=datetime.fromisoformat(created_at),
+            last_activity=datetime.fromisoformat(last_activity)
+        )
+        try:
+            return _restore(state, [unpack_record(payload) for (payload,) in payloads])
+        except (ValueError, KeyError, TypeError) as e:
+            raise SessionStoreCorruptedError(session_id, str(e)) from e
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM session_turns WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+
+    def session_ids(self) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT session_id FROM sessions").fetchall()
+        return [session_id for (session_id,) in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return row is not None
+
+
+class LogSessionStore(SessionStore):
+    """
+    每个会话一个只追加日志文件的存储：<directory>/<session_id>.log。
+
+    文件由长度前缀（4 字节大端）的记录组成，第一条是会话元数据，之后每轮一条。
+    崩溃时写了一半的末尾记录在读取时会被忽略，并在下一次追加前截断，
+    保证新记录紧接在最后一条完整记录之后。
+    """
+
+    _LENGTH = struct.Struct(">I")
+
+    def __init__(self, directory: str):
+        """
+        Args:
+            directory: 日志文件目录
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # 每个会话最后一条完整记录的结束位置（本进程内首次追加时扫描得到）
+        self._ends: Dict[str, int] = {}
+
+    def _path(self, session_id: str) -> Path:
+        return self.directory / f"{session_id}.log"
+
+    def _scan(self, data: bytes, path: Path) -> Tuple[List[bytes], int]:
+        """切分日志中的完整记录，返回记录和最后一条完整记录的结束位置。"""
+        records = []
+        offset = 0
+        while offset + self._LENGTH.size <= len(data):
+            (length,) = self._LENGTH.unpack_from(data, offset)
+            start = offset + self._LENGTH.size
+            if start + length > len(data):
+                break
+            records.append(data[start:start + length])
+            offset = start + length
+        if offset < len(data):
+            logger.warning(f"Ignoring {len(data) - offset} bytes of truncated record at end of {path}")
+        return records, offset
+
+    def _append(self, session_id: str, payload: bytes, create: bool = False) -> None:
+        path = self._path(session_id)
+        frame = self._LENGTH.pack(len(payload)) + payload
+        with self._lock:
+            if create:
+                with open(path, "xb") as f:
+                    f.write(frame)
+                self._ends[session_id] = len(frame)
+                return
+
+            end = self._ends.get(session_id)
+            if end is None:
+                end = self._scan(path.read_bytes(), path)[1]
+            with open(path, "r+b") as f:
+                size = f.seek(0, os.SEEK_END)
+                if size > end:
+                    # 崩溃留下的半条记录：截断后再追加，否则新记录会接在损坏的字节之后
+                    logger.warning(f"Truncating partial record ({size - end} bytes) at end of {path}")
+                    f.truncate(end)
+                f.seek(end)
+                try:
+                    f.write(frame)
+                    f.flush()
+                except OSError:
+                    f.truncate(end)
+                    raise
+            self._ends[session_id] = end + len(frame)
+
+    def create(self, state: SessionState) -> None:
+        header = {
+            "session_id": state.session_id,
+            "user_id": state.user_id,
+            "created_at": state.created_at.isoformat(),
+        }
+        self._append(state.session_id, pack_record(header), create=True)
+
+    def append_turn(
+        self,
+        session_id: str,
+        chat_messages: Sequence[ChatMessage],
+        model_messages: Sequence[ModelMessage],
+        last_activity: datetime
+    ) -> int:
+        if not self._path(session_id).exists():
+            raise KeyError(session_id)
+        record = _turn_record(chat_messages, model_messages)
+        record["last_activity"] = last_activity.isoformat()
+        payload = pack_record(record)
+        self._append(session_id, payload)
+        return len(payload)
+
+    def load(self, session_id: str) -> Optional[StoredSession]:
+        path = self._path(session_id)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+
+        records, _ = self._scan(data, path)
+        try:
+            header, *turns = [unpack_record(record) for record in records]
+            created_at = datetime.fromisoformat(header["created_at"])
+            last_activity = datetime.fromisoformat(turns[-1]["last_activity"]) if turns else created_at
+            state = SessionState(
+                session_id=session_id,
+                user_id=header.get("user_id"),
+                created_at=created_at,
+                last_activity=last_activity
+            )
+            return _restore(state, turns)
+        except (ValueError, KeyError, TypeError) as e:
+            raise SessionStoreCorruptedError(session_id, str(e)) from e
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._ends.pop(session_id, None)
+        try:
+            self._path(session_id).unlink()
+        except FileNotFoundError:
+            pass
+
+    def session_ids(self) -> List[str]:
+        return [path.stem for path in self.directory.glob("*.log")]
+
+    def __contains__(self, session_id: str) -> bool:
+        return self._path(session_id).exists()
+
+
+# 进程级共享会话存储
+_session_store: Optional[SessionStore] = None
+
+
+def get_session_store() -> Optional[SessionStore]:
+    """
+    获取根据设置创建的共享会话存储。
+
+    Returns:
+        配置的存储后端；如果 session_store_backend 为 "none" 则返回 None
+    """
+    global _session_store
+    backend = settings.session_store_backend.lower()
+
+    if backend == "none":
+        return None
+
+    if _session_store is None:
+        if backend == "sqlite":
+            _session_store = SQLiteSessionStore(settings.session_store_path)
+        elif backend == "log":
+            _session_store = LogSessionStore(settings.session_log_dir)
+        else:
+            raise ValueError(f"Unknown session store backend: {settings.session_store_backend}")
+
+        logger.info(f"Session store enabled ({backend})")
+
+    return _session_store
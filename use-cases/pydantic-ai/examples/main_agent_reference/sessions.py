@@ -0,0 +1,364 @@
+"""
+多会话宿主的会话管理。
+
+每个会话持有自己的 SessionState（面向用户的聊天记录）和 ConversationMemory
+（传给代理的结构化历史）；模型客户端、HTTP 连接池和代理本身在所有会话间共享。
+
+配置了会话存储时，每轮对话增量写入存储；不在内存中的会话在首次访问时
+才从存储中恢复。
+
+长时间运行的宿主中，常驻内存的会话受以下限制（需要配置会话存储）：
+- 常驻会话数上限：超出时按最后活动时间淘汰最久未活动的会话
+- 空闲超时：超过 idle_seconds 未活动的会话被移出内存
+- 单会话字节上限：超出时只在内存中保留最近的聊天记录
+被淘汰的会话已经写入存储，下次访问时重新加载。正在运行的会话不会被淘汰。
+"""
+
+import asyncio
+import logging
+import os
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+from pydantic_ai.messages import ModelMessage
+
+from .memory import ConversationMemory
+from .models import ChatMessage, SessionState
+from .session_store import SessionStore, StoredSession, get_session_store
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+# 对话记忆按每个令牌约 4 字节估算内存占用
+BYTES_PER_TOKEN = 4
+# 每条聊天消息的固定开销（对象、时间戳等）
+CHAT_MESSAGE_OVERHEAD_BYTES = 64
+
+
+def chat_message_bytes(message: ChatMessage) -> int:
+    """估算一条聊天消息在内存中的字节数。"""
+    return len(message.content) + CHAT_MESSAGE_OVERHEAD_BYTES
+
+
+def process_rss_bytes() -> Optional[int]:
+    """读取当前进程的常驻内存（仅 Linux），不可用时返回 None。"""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+class SessionNotFoundError(KeyError):
+    """请求的会话不存在。"""
+
+
+@dataclass
+class Session:
+    """一个会话的运行时状态。"""
+    state: SessionState
+    memory: ConversationMemory
+    # 同一会话同一时间只允许一个代理运行
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    # 内存中聊天记录的估算字节数
+    chat_bytes: int = 0
+    # 因超出字节上限而只保留在存储中的较早聊天消息数
+    trimmed_messages: int = 0
+
+    @property
+    def session_id(self) -> str:
+        return self.state.session_id
+
+    @property
+    def busy(self) -> bool:
+        return self.lock.locked()
+
+    @property
+    def estimated_bytes(self) -> int:
+        """会话在内存中的估算字节数（聊天记录 + 对话记忆）。"""
+        return self.chat_bytes + self.memory.total_tokens * BYTES_PER_TOKEN
+
+    def touch(self) -> None:
+        """更新最后活动时间。"""
+        self.state.last_activity = datetime.now()
+
+
+class SessionManager:
+    """创建、查找、记录和淘汰会话。"""
+
+    def __init__(
+        self,
+        store: Optional[SessionStore] = None,
+        memory_max_tokens: Optional[int] = None,
+        memory_summary_max_tokens: Optional[int] = None,
+        max_resident_sessions: Optional[int] = None,
+        max_session_bytes: Optional[int] = None,
+        idle_seconds: Optional[float] = None
+    ):
+        """
+        Args:
+            store: 会话存储，默认使用 get_session_store() 的共享存储（可能为 None，即只在内存中）
+            memory_max_tokens: 每个会话历史的令牌预算，默认取自设置
+            memory_summary_max_tokens: 每个会话摘要的令牌上限，默认取自设置
+            max_resident_sessions: 常驻内存的会话数上限，默认取自设置
+            max_session_bytes: 单个会话在内存中的估算字节上限，默认取自设置
+            idle_seconds: 空闲多久后移出内存，默认取自设置
+        """
+        if store is None:
+            store = get_session_store()
+        self.store = store
+        self.max_resident_sessions = max_resident_sessions or settings.session_max_resident
+        self.max_session_bytes = max_session_bytes or settings.session_max_bytes
+        self.idle_seconds = idle_seconds or settings.session_idle_seconds
+        self.memory_max_tokens = memory_max_tokens or settings.memory_max_tokens
+        self.memory_summary_max_tokens = (
+            memory_summary_max_tokens
+            if memory_summary_max_tokens is not None
+            else settings.memory_summary_max_tokens
+        )
+        # 按最后活动时间排序，最久未活动的在最前面
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        # 正在从存储恢复的会话，并发访问同一会话时共享一次加载
+        self._loading: Dict[str, "asyncio.Task[Optional[StoredSession]]"] = {}
+        self.loaded_sessions = 0
+        self.bytes_written = 0
+        self.evicted_sessions = 0
+        self.idle_evictions = 0
+
+        if self.store is None:
+            logger.warning("No session store configured; idle sessions will stay in memory")
+
+    def _new_memory(self) -> ConversationMemory:
+        return ConversationMemory(
+            max_tokens=self.memory_max_tokens,
+            summary_max_tokens=self.memory_summary_max_tokens
+        )
+
+    async def create(self, user_id: Optional[str] = None) -> Session:
+        """
+        创建新会话。
+
+        Args:
+            user_id: 可选的用户标识符
+
+        Returns:
+            新会话
+        """
+        state = SessionState(session_id=uuid.uuid4().hex, user_id=user_id)
+        if self.store is not None:
+            await asyncio.to_thread(self.store.create, state)
+        session = Session(state=state, memory=self._new_memory())
+        self._sessions[state.session_id] = session
+        logger.info(f"Created session {state.session_id}")
+        self._enforce_resident_limit()
+        return session
+
+    async def get(self, session_id: str) -> Session:
+        """
+        获取会话。
+
+        Raises:
+            SessionNotFoundError: 会话不存在
+        """
+        session = self._sessions.get(session_id)
+        if session is not None:
+            return session
+        if self.store is None:
+            raise SessionNotFoundError(session_id)
+
+        task = self._loading.get(session_id)
+        if task is None:
+            task = asyncio.ensure_future(asyncio.to_thread(self.store.load, session_id))
+            self._loading[session_id] = task
+            task.add_done_callback(lambda _: self._loading.pop(session_id, None))
+        stored = await asyncio.shield(task)
+
+        # 等待期间可能已有其他协程完成了恢复
+        session = self._sessions.get(session_id)
+        if session is not None:
+            return session
+        if stored is None:
+            raise SessionNotFoundError(session_id)
+
+        session = self._restore(stored)
+        self._sessions[session_id] = session
+        self._trim_chat(session)
+        self._enforce_resident_limit()
+        return session
+
+    def _restore(self, stored: StoredSession) -> Session:
+        """按顺序重放存储的轮次，重建与写入时相同的对话记忆。"""
+        memory = self._new_memory()
+        for turn in stored.turns:
+            memory.add_turn(turn)
+        self.loaded_sessions += 1
+        logger.info(f"Restored session {stored.state.session_id} ({len(stored.turns)} turns)")
+        return Session(
+            state=stored.state,
+            memory=memory,
+            chat_bytes=sum(chat_message_bytes(message) for message in stored.state.messages)
+        )
+
+    async def full_state(self, session: Session) -> SessionState:
+        """返回包含完整聊天记录的会话状态；内存中的记录被截断时从存储读取。"""
+        if not session.trimmed_messages or self.store is None:
+            return session.state
+        stored = await asyncio.to_thread(self.store.load, session.session_id)
+        return stored.state if stored is not None else session.state
+
+    async def delete(self, session_id: str) -> None:
+        """
+        删除会话。
+
+        Raises:
+            SessionNotFoundError: 会话不存在
+        """
+        in_memory = self._sessions.pop(session_id, None) is not None
+        if self.store is not None:
+            if not in_memory and session_id not in self.store:
+                raise SessionNotFoundError(session_id)
+            await asyncio.to_thread(self.store.delete, session_id)
+        elif not in_memory:
+            raise SessionNotFoundError(session_id)
+        logger.info(f"Deleted session {session_id}")
+
+    async def record_turn(
+        self,
+        session: Session,
+        user_text: str,
+        assistant_text: str,
+        new_messages: Sequence[ModelMessage],
+        tools_used: Optional[List[Dict[str, Any]]] = None
+    ) -> None:
+        """
+        记录一轮完成的对话。
+
+        Args:
+            session: 会话
+            user_text: 用户输入
+            assistant_text: 助手的最终回答
+            new_messages: 本轮代理运行产生的新消息
+            tools_used: 本轮调用的工具
+        """
+        chat_messages = [
+            ChatMessage(role="user", content=user_text),
+            ChatMessage(role="assistant", content=assistant_text, tools_used=tools_used or None),
+        ]
+        session.memory.add_turn(new_messages)
+        session.state.messages.extend(chat_messages)
+        session.chat_bytes += sum(chat_message_bytes(message) for message in chat_messages)
+        self.mark_active(session)
+
+        # 只追加本轮的记录，不重写整个历史
+        if self.store is not None:
+            self.bytes_written += await asyncio.to_thread(
+                self.store.append_turn,
+                session.session_id,
+                chat_messages,
+                new_messages,
+                session.state.last_activity
+            )
+            self._trim_chat(session)
+
+    def mark_active(self, session: Session) -> None:
+        """更新会话的最后活动时间并移到 LRU 顺序的末尾。"""
+        session.touch()
+        if session.session_id in self._sessions:
+            self._sessions.move_to_end(session.session_id)
+
+    def _trim_chat(self, session: Session) -> None:
+        """会话超出字节上限时，只在内存中保留最近的聊天消息（完整记录仍在存储中）。"""
+        if self.store is None:
+            return
+        messages = session.state.messages
+        trimmed = 0
+        # 至少保留最近一问一答
+        while session.estimated_bytes > self.max_session_bytes and len(messages) - trimmed > 2:
+            session.chat_bytes -= chat_message_bytes(messages[trimmed])
+            trimmed += 1
+        if trimmed:
+            del messages[:trimmed]
+            session.trimmed_messages += trimmed
+            logger.debug(f"Trimmed {trimmed} chat messages from session {session.session_id}")
+
+    def _evict(self, session_id: str) -> None:
+        # 每轮已经写入存储，移出内存即完成落盘
+        del self._sessions[session_id]
+        self.evicted_sessions += 1
+        logger.debug(f"Evicted session {session_id} from memory")
+
+    def _enforce_resident_limit(self) -> None:
+        """常驻会话超出上限时，从最久未活动的开始淘汰空闲会话。"""
+        if self.store is None:
+            return
+        overflow = len(self._sessions) - self.max_resident_sessions
+        if overflow <= 0:
+            return
+        for session_id in [
+            session_id for session_id, session in self._sessions.items() if not session.busy
+        ][:overflow]:
+            self._evict(session_id)
+
+    def evict_idle(self, now: Optional[datetime] = None) -> int:
+        """
+        淘汰空闲超过 idle_seconds 的会话。
+
+        Args:
+            now: 当前时间，默认 datetime.now()
+
+        Returns:
+            淘汰的会话数
+        """
+        if self.store is None:
+            return 0
+        cutoff = (now or datetime.now()) - timedelta(seconds=self.idle_seconds)
+        idle = [
+            session_id for session_id, session in self._sessions.items()
+            if not session.busy and session.state.last_activity < cutoff
+        ]
+        for session_id in idle:
+            self._evict(session_id)
+        self.idle_evictions += len(idle)
+        return len(idle)
+
+    async def run_idle_sweeper(self, interval: Optional[float] = None) -> None:
+        """周期性淘汰空闲会话，直到被取消。"""
+        interval = interval or settings.session_sweep_interval
+        while True:
+            await asyncio.sleep(interval)
+            evicted = self.evict_idle()
+            if evicted:
+                logger.info(f"Evicted {evicted} idle sessions, {len(self._sessions)} resident")
+
+    def close(self) -> None:
+        """关闭会话存储。"""
+        if self.store is not None:
+            self.store.close()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def metrics(self) -> Dict[str, Any]:
+        """返回会话数量和内存占用指标。"""
+        resident = list(self._sessions.values())
+        session_bytes = [session.estimated_bytes for session in resident]
+        return {
+            "sessions": len(resident),
+            "busy_sessions": sum(1 for session in resident if session.busy),
+            "loaded_sessions": self.loaded_sessions,
+            "evicted_sessions": self.evicted_sessions,
+            "idle_evictions": self.idle_evictions,
+            "store_bytes_written": self.bytes_written,
+            "memory": {
+                "resident_bytes": sum(session_bytes),
+                "largest_session_bytes": max(session_bytes, default=0),
+                "trimmed_messages": sum(session.trimmed_messages for session in resident),
+                "max_resident_sessions": self.max_resident_sessions,
+                "max_session_bytes": self.max_session_bytes,
+                "rss_bytes": process_rss_bytes(),
+            },
+        }
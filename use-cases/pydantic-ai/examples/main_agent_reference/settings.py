@@ -3,14 +3,12 @@
 """
 
 import os
-from typing import Optional
+import threading
+from typing import Any, Optional
 from pydantic_settings import BaseSettings
 from pydantic import Field, field_validator, ConfigDict
 from dotenv import load_dotenv
 
-# 从 .env 文件加载环境变量
-load_dotenv()
-
 
 class Settings(BaseSettings):
     """支持环境变量的应用程序设置。"""
@@ -27,11 +25,75 @@ class Settings(BaseSettings):
     llm_model: str = Field(default="gpt-4")
     llm_base_url: Optional[str] = Field(default="https://api.openai.com/v1")
     
+    # LLM 响应缓存配置（record, replay, passthrough）
+    llm_cache_mode: str = Field(default="passthrough")
+    llm_cache_dir: str = Field(default=".cache/llm_responses")
+    
     # Brave 搜索配置
     brave_api_key: str = Field(...)
     brave_search_url: str = Field(
         default="https://api.search.brave.com/res/v1/web/search"
     )
+
+    # Gmail 配置
+    gmail_credentials_path: str = Field(default="credentials/credentials.json")
+    gmail_token_path: str = Field(default="credentials/token.json")
+
+    # HTTP 连接池配置
+    http_max_connections: int = Field(default=100, ge=1)
+    http_max_keepalive_connections: int = Field(default=20, ge=0)
+    http_keepalive_expiry: float = Field(default=30.0, ge=0.0)
+    http_max_connections_per_host: int = Field(default=10, ge=1)
+    http_http2: bool = Field(default=True)
+    http_timeout: float = Field(default=30.0, gt=0.0)
+
+    # 搜索结果缓存配置
+    search_cache_backend: str = Field(default="memory")  # memory, sqlite, none
+    search_cache_ttl: float = Field(default=3600.0, gt=0.0)
+    search_cache_max_entries: int = Field(default=1000, ge=1)
+    search_cache_path: str = Field(default=".cache/search_cache.sqlite3")
+
+    # Brave 速率限制和重试配置
+    brave_rate_limit: float = Field(default=1.0, gt=0.0)  # 每秒请求数
+    brave_rate_burst: float = Field(default=1.0, ge=1.0)
+    brave_rate_limit_mode: str = Field(default="queue")  # queue, fail
+    brave_rate_limit_max_wait: float = Field(default=30.0, ge=0.0)
+    brave_max_retries: int = Field(default=3, ge=0)
+    brave_retry_base_delay: float = Field(default=0.5, ge=0.0)
+    brave_retry_max_delay: float = Field(default=8.0, ge=0.0)
+    search_batch_max_concurrency: int = Field(default=4, ge=1)
+
+    # 工具执行配置：一次响应中的多个工具调用并发（parallel）或逐个（sequential）执行
+    tool_execution_mode: str = Field(default="parallel")
+    tool_max_concurrency: int = Field(default=4, ge=1)  # 每次代理运行同时执行的工具调用上限
+
+    # 子代理调用缓存配置（例如 create_email_draft 调用的邮件代理）
+    subagent_cache_enabled: bool = Field(default=True)
+    subagent_cache_ttl: float = Field(default=600.0, gt=0.0)
+    subagent_cache_max_entries: int = Field(default=256, ge=1)
+
+    # 对话记忆配置
+    memory_max_tokens: int = Field(default=6000, ge=256)
+    memory_summary_max_tokens: int = Field(default=600, ge=0)
+
+    # CLI 渲染配置
+    cli_render_fps: float = Field(default=20.0, gt=0.0)  # 流式输出每秒最多刷新次数
+
+    # 多会话服务器配置
+    server_host: str = Field(default="127.0.0.1")
+    server_port: int = Field(default=8080, ge=1, le=65535)
+    server_max_concurrent_runs: int = Field(default=32, ge=1)  # 同时执行的代理运行数
+    server_max_pending_runs: int = Field(default=64, ge=0)  # 排队等待的运行数，超出时返回 503
+    server_max_request_bytes: int = Field(default=1_048_576, ge=1024)
+
+    # 会话存储配置
+    session_store_backend: str = Field(default="sqlite")  # sqlite, log, none
+    session_store_path: str = Field(default=".cache/sessions.sqlite3")
+    session_log_dir: str = Field(default=".cache/sessions")
+    session_max_resident: int = Field(default=1000, ge=1)  # 常驻内存的会话数上限
+    session_max_bytes: int = Field(default=262_144, ge=1024)  # 单个会话在内存中的估算字节上限
+    session_idle_seconds: float = Field(default=900.0, gt=0.0)  # 空闲多久后移出内存
+    session_sweep_interval: float = Field(default=60.0, gt=0.0)
     
     # 应用程序配置
     app_env: str = Field(default="development")
@@ -47,12 +109,45 @@ class Settings(BaseSettings):
         return v
 
 
+_settings: Optional[Settings] = None
+_settings_lock = threading.Lock()
+
+
+def get_settings() -> Settings:
+    """获取全局设置，首次调用时才加载 .env 并读取环境变量。"""
+    global _settings
+    if _settings is None:
+        with _settings_lock:
+            if _settings is None:
+                # 从 .env 文件加载环境变量
+                load_dotenv()
+                try:
+                    _settings = Settings()
+                except Exception:
+                    # 用于测试，使用虚拟值创建设置
+                    os.environ.setdefault("LLM_API_KEY", "test_key")
+                    os.environ.setdefault("BRAVE_API_KEY", "test_key")
+                    _settings = Settings()
+    return _settings
+
+
+class _LazySettings:
+    """
+    全局设置的代理：首次读取属性时才构建 Settings。
+
+    各模块在导入时执行 `from .settings import settings`，只在函数内读取属性，
+    因此导入代理模块不会读取 .env 或校验配置。
+    """
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(get_settings(), name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(get_settings(), name, value)
+
+    def __repr__(self) -> str:
+        return repr(get_settings())
+
+
 # 全局设置实例
-try:
-    settings = Settings()
-except Exception:
-    # 用于测试，使用虚拟值创建设置
-    import os
-    os.environ.setdefault("LLM_API_KEY", "test_key")
-    os.environ.setdefault("BRAVE_API_KEY", "test_key")
-    settings = Settings()
\ No newline at end of file
+settings = _LazySettings()
\ No newline at end of file
@@ -0,0 +1,223 @@
+"""
+子代理调用的记忆化缓存。
+
+父代理的工具把工作委托给子代理时（例如 create_email_draft 调用邮件代理），
+模型重试或重复请求常常产生完全相同的调用。SubAgentCache 按
+(子代理名称, 渲染后的提示, 依赖项指纹) 缓存子代理的输出，在 TTL 内直接返回，
+并记录因此节省的令牌；并发的相同调用通过 single-flight 合并为一次运行。
+"""
+
+import dataclasses
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from pydantic import BaseModel
+from pydantic_ai import Agent
+from pydantic_ai.usage import Usage
+
+from .settings import settings
+from .tools import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+def deps_fingerprint(deps: Any) -> Any:
+    """把依赖项转换为可稳定序列化的值，用于缓存键。"""
+    if deps is None:
+        return None
+    if dataclasses.is_dataclass(deps):
+        return dataclasses.asdict(deps)
+    if isinstance(deps, BaseModel):
+        return deps.model_dump(mode="json")
+    return repr(deps)
+
+
+def make_subagent_key(agent_name: str, prompt: str, deps: Any) -> str:
+    """
+    计算子代理调用的缓存键。
+
+    Args:
+        agent_name: 子代理名称
+        prompt: 渲染后的完整提示
+        deps: 子代理的依赖项
+
+    Returns:
+        SHA-256 十六进制摘要
+    """
+    payload = json.dumps(
+        [agent_name, prompt, deps_fingerprint(deps)],
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class SubAgentResult:
+    """一次子代理调用的结果。"""
+    output: Any
+    usage: Usage
+    cached: bool = False
+
+
+@dataclass
+class SubAgentCacheStats:
+    """子代理缓存的命中计数和节省的令牌。"""
+    hits: int = 0
+    misses: int = 0
+    bypassed: int = 0
+    coalesced: int = 0
+    saved_requests: int = 0
+    saved_request_tokens: int = 0
+    saved_response_tokens: int = 0
+
+    @property
+    def saved_tokens(self) -> int:
+        """节省的令牌总数。"""
+        return self.saved_request_tokens + self.saved_response_tokens
+
+    def record_saving(self, usage: Usage) -> None:
+        self.saved_requests += usage.requests
+        self.saved_request_tokens += usage.request_tokens or 0
+        self.saved_response_tokens += usage.response_tokens or 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """以字典形式返回统计信息，便于记录或展示。"""
+        return {**dataclasses.asdict(self), "saved_tokens": self.saved_tokens}
+
+
+class SubAgentCache:
+    """带 TTL 和 LRU 上限的子代理输出缓存。"""
+
+    def __init__(self, ttl: float = 600.0, max_entries: int = 256):
+        """
+        Args:
+            ttl: 条目的存活时间（秒）
+            max_entries: 最大条目数，超出时按 LRU 淘汰
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats = SubAgentCacheStats()
+        self._entries: "OrderedDict[str, Tuple[float, Any, Usage]]" = OrderedDict()
+        self._singleflight = SingleFlight()
+
+    def _get(self, key: str) -> Optional[Tuple[Any, Usage]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, output, usage = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return output, usage
+
+    def _set(self, key: str, output: Any, usage: Usage) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, output, usage)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def run(
+        self,
+        agent: Agent,
+        prompt: str,
+        deps: Any = None,
+        name: Optional[str] = None,
+        usage: Optional[Usage] = None,
+        bypass: bool = False,
+        runner: Optional[Callable[[], Awaitable[Tuple[Any, Usage]]]] = None
+    ) -> SubAgentResult:
+        """
+        运行子代理，或返回相同调用的缓存输出。
+
+        Args:
+            agent: 子代理
+            prompt: 渲染后的完整提示
+            deps: 子代理的依赖项
+            name: 缓存键中使用的子代理名称，默认 agent.name
+            usage: 父代理运行的用量，实际运行子代理时把子运行的用量累加进去
+            bypass: 为 True 时跳过缓存读取，总是重新运行（结果仍会写入缓存）
+            runner: 未命中时代替 agent.run 执行子代理的协程工厂，返回 (输出, 用量)，
+                例如流式的 Delegation.run；抛出异常时不写入缓存
+
+        Returns:
+            子代理的输出、本次调用的用量（缓存命中时为原运行的用量）以及是否来自缓存
+        """
+        key = make_subagent_key(name or agent.name or "agent", prompt, deps)
+
+        if bypass:
+            self.stats.bypassed += 1
+        else:
+            cached = self._get(key)
+            if cached is not None:
+                output, cached_usage = cached
+                self.stats.hits += 1
+                self.stats.record_saving(cached_usage)
+                logger.debug(f"Sub-agent cache hit: {key[:12]}")
+                return SubAgentResult(output=output, usage=cached_usage, cached=True)
+
+        led = False
+
+        async def invoke() -> Tuple[Any, Usage]:
+            # 只有真正发起子代理运行的调用方会执行到这里
+            nonlocal led
+            led = True
+            self.stats.misses += 1
+            if runner is not None:
+                output, run_usage = await runner()
+            else:
+                result = await agent.run(prompt, deps=deps)
+                output, run_usage = result.output, result.usage()
+            self._set(key, output, run_usage)
+            return output, run_usage
+
+        # bypass 的调用不与进行中的相同调用合并
+        if bypass:
+            output, run_usage = await invoke()
+        else:
+            output, run_usage = await self._singleflight.do(key, invoke)
+
+        if led:
+            if usage is not None:
+                usage.incr(run_usage)
+        else:
+            self.stats.coalesced += 1
+            self.stats.record_saving(run_usage)
+
+        return SubAgentResult(output=output, usage=run_usage, cached=not led)
+
+    def clear(self) -> None:
+        """清空缓存。"""
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# 进程级共享的子代理缓存
+_subagent_cache: Optional[SubAgentCache] = None
+
+
+def get_subagent_cache() -> Optional[SubAgentCache]:
+    """
+    获取根据设置创建的共享子代理缓存。
+
+    Returns:
+        缓存实例；如果 subagent_cache_enabled 为 False 则返回 None
+    """
+    global _subagent_cache
+    if not settings.subagent_cache_enabled:
+        return None
+    if _subagent_cache is None:
+        _subagent_cache = SubAgentCache(
+            ttl=settings.subagent_cache_ttl,
+            max_entries=settings.subagent_cache_max_entries
+        )
+    return _subagent_cache
@@ -0,0 +1,120 @@
+"""main_agent_reference 测试的公共夹具
+
+模块之间按 `agents` 包互相导入（例如 `from agents.models import ...`），
+这里把示例目录注册为 `agents` 包，不需要重命名目录或创建符号链接。
+"""
+
+import asyncio
+import json
+import sys
+import types
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import pytest
+
+PACKAGE_DIR = Path(__file__).resolve().parent.parent
+
+if "agents" not in sys.modules:
+    package = types.ModuleType("agents")
+    package.__path__ = [str(PACKAGE_DIR)]
+    sys.modules["agents"] = package
+
+
+def brave_body(count: int = 2) -> bytes:
+    """构造 Brave 搜索 API 格式的响应体。"""
+    results = [
+        {"title": f"Result {i}", "url": f"https://example.com/{i}", "description": f"Description {i}"}
+        for i in range(count)
+    ]
+    return json.dumps({"web": {"results": results}}).encode("utf-8")
+
+
+@dataclass
+class StubBraveServer:
+    """
+    本地 HTTP 桩服务器：按顺序返回预设的 (状态码, 响应头, 响应体)，
+    预设用完后返回 200 和 respond(查询参数) 生成的响应体，并记录收到的每个请求行。
+
+    连接保持活动，可以观察连接复用；delay 用于制造并发重叠，
+    max_in_flight 记录同时处理中的最大请求数。
+    """
+    responses: List[Tuple[int, Dict[str, str], bytes]] = field(default_factory=list)
+    requests: List[str] = field(default_factory=list)
+    respond: Callable[[Dict[str, str]], bytes] = lambda params: brave_body()
+    delay: float = 0.0
+    url: str = ""
+    connections: int = 0
+    in_flight: int = 0
+    max_in_flight: int = 0
+
+    def script(self, status: int, headers: Optional[Dict[str, str]] = None, body: Optional[bytes] = None) -> None:
+        if body is None:
+            body = brave_body() if status == 200 else b""
+        self.responses.append((status, headers or {}, body))
+
+    def queries(self) -> List[Dict[str, str]]:
+        """返回每个请求的查询参数。"""
+        return [dict(parse_qsl(urlsplit(line.split(" ")[1]).query)) for line in self.requests]
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                request_line = head.split(b"\r\n", 1)[0].decode("latin-1")
+                self.requests.append(request_line)
+
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                try:
+                    if self.delay:
+                        await asyncio.sleep(self.delay)
+                finally:
+                    self.in_flight -= 1
+
+                if self.responses:
+                    status, headers, body = self.responses.pop(0)
+                else:
+                    params = dict(parse_qsl(urlsplit(request_line.split(" ")[1]).query))
+                    status, headers, body = 200, {}, self.respond(params)
+                lines = [f"HTTP/1.1 {status} Stub", f"Content-Length: {len(body)}"]
+                lines.extend(f"{name}: {value}" for name, value in headers.items())
+                writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+                await writer.drain()
+        finally:
+            writer.close()
+
+
+@pytest.fixture
+async def brave_server():
+    """启动绑定随机端口的桩服务器。"""
+    stub = StubBraveServer()
+    server = await asyncio.start_server(stub.handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    stub.url = f"http://127.0.0.1:{port}/res/v1/web/search"
+    async with server:
+        yield stub
+
+
+@pytest.fixture
+async def search_kwargs(brave_server):
+    """指向桩服务器的 search_web_results 参数：独立的连接池、限制器和请求合并层，不使用缓存。"""
+    from agents.http_client import HTTPClientPool
+    from agents.rate_limit import RetryPolicy, TokenBucket
+    from agents.tools import SingleFlight
+
+    async with HTTPClientPool(http2=False, timeout=5.0) as pool:
+        yield {
+            "pool": pool,
+            "use_cache": False,
+            "limiter": TokenBucket(rate=1000.0, capacity=100.0),
+            "retry_policy": RetryPolicy(max_retries=0),
+            "base_url": brave_server.url,
+            "singleflight": SingleFlight(),
+        }
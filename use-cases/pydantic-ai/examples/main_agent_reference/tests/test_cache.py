@@ -0,0 +1,187 @@
+"""搜索结果缓存（内存和 SQLite 后端）的行为测试"""
+
+import asyncio
+import time
+
+import pytest
+
+from agents.cache import InMemorySearchCache, SearchCache, SQLiteSearchCache, make_search_key
+from agents.http_client import HTTPClientPool
+from agents.models import SearchResults
+from agents.rate_limit import TokenBucket
+from agents.tools import SingleFlight, search_web_results
+
+
+def results(*urls: str) -> SearchResults:
+    return SearchResults(
+        titles=[f"Title {url}" for url in urls],
+        urls=list(urls),
+        descriptions=[f"About {url}" for url in urls],
+        scores=[1.0] * len(urls)
+    )
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_cache(request, tmp_path):
+    """按参数创建两种后端，测试结束时关闭 SQLite 连接。"""
+    created = []
+
+    def factory(ttl: float = 60.0, max_entries: int = 100) -> SearchCache:
+        if request.param == "memory":
+            cache = InMemorySearchCache(ttl=ttl, max_entries=max_entries)
+        else:
+            cache = SQLiteSearchCache(str(tmp_path / "search.db"), ttl=ttl, max_entries=max_entries)
+        created.append(cache)
+        return cache
+
+    yield factory
+    for cache in created:
+        if isinstance(cache, SQLiteSearchCache):
+            cache.close()
+
+
+class TestSearchKey:
+    def test_query_is_normalized(self):
+        assert make_search_key("  AI   Safety ") == make_search_key("ai safety")
+
+    def test_parameters_distinguish_keys(self):
+        base = make_search_key("ai", count=10)
+        assert make_search_key("ai", count=5) != base
+        assert make_search_key("ai", offset=10) != base
+        assert make_search_key("ai", country="US") == make_search_key("ai", country="us")
+        assert make_search_key("ai", lang="en") != base
+
+    def test_endpoint_and_credential_distinguish_keys(self):
+        base = make_search_key("ai", endpoint="https://a/search", api_key="key-1")
+        assert make_search_key("ai", endpoint="https://b/search", api_key="key-1") != base
+        assert make_search_key("ai", endpoint="https://a/search", api_key="key-2") != base
+        assert make_search_key("ai", endpoint="https://a/search", api_key="key-1") == base
+        # 键中不出现密钥本身
+        assert "key-1" not in base
+
+
+class TestSearchCache:
+    def test_base_class_is_abstract(self):
+        with pytest.raises(TypeError):
+            SearchCache()
+
+    def test_round_trip_and_stats(self, make_cache):
+        cache = make_cache()
+        assert cache.get("k") is None
+        cache.set("k", results("https://a", "https://b"))
+
+        cached = cache.get("k")
+        assert cached.urls == ["https://a", "https://b"]
+        assert cached.titles == ["Title https://a", "Title https://b"]
+        assert (cache.stats.hits, cache.stats.misses) == (1, 1)
+        assert cache.stats.hit_rate == 0.5
+        assert len(cache) == 1
+
+    def test_entries_expire(self, make_cache):
+        cache = make_cache(ttl=0.05)
+        cache.set("k", results("https://a"))
+        time.sleep(0.06)
+        assert cache.get("k") is None
+        assert cache.stats.expirations == 1
+        assert len(cache) == 0
+
+    def test_least_recently_used_entry_is_evicted(self, make_cache):
+        cache = make_cache(max_entries=2)
+        cache.set("a", results("https://a"))
+        cache.set("b", results("https://b"))
+        assert cache.get("a") is not None
+        cache.set("c", results("https://c"))
+
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert cache.get("c") is not None
+        assert cache.stats.evictions == 1
+
+    def test_clear(self, make_cache):
+        cache = make_cache()
+        cache.set("k", results("https://a"))
+        cache.clear()
+        assert len(cache) == 0
+
+    async def test_async_access(self, make_cache):
+        cache = make_cache()
+        await cache.aset("k", results("https://a"))
+        assert (await cache.aget("k")).urls == ["https://a"]
+        assert await cache.aget("missing") is None
+
+    def test_sqlite_cache_is_shared_across_instances(self, tmp_path):
+        path = str(tmp_path / "shared.db")
+        writer = SQLiteSearchCache(path)
+        writer.set("k", results("https://a"))
+        writer.close()
+
+        reader = SQLiteSearchCache(path)
+        try:
+            assert reader.get("k").urls == ["https://a"]
+        finally:
+            reader.close()
+
+
+class TestSearchWithCache:
+    async def test_repeated_search_is_served_from_cache(self, brave_server):
+        cache = InMemorySearchCache()
+        async with HTTPClientPool(http2=False) as pool:
+            for query in ("Pydantic AI", "  pydantic   ai "):
+                found = await search_web_results(
+                    api_key="test-key",
+                    query=query,
+                    pool=pool,
+                    cache=cache,
+                    limiter=TokenBucket(rate=1000.0, capacity=100.0),
+                    base_url=brave_server.url,
+                    singleflight=SingleFlight()
+                )
+                assert len(found) == 2
+
+            # use_cache=False 强制请求 API，但结果仍写回缓存
+            await search_web_results(
+                api_key="test-key",
+                query="pydantic ai",
+                pool=pool,
+                cache=cache,
+                use_cache=False,
+                limiter=TokenBucket(rate=1000.0, capacity=100.0),
+                base_url=brave_server.url,
+                singleflight=SingleFlight()
+            )
+
+        assert len(brave_server.requests) == 2
+        assert cache.stats.hits == 1
+
+    async def test_credentials_and_endpoints_do_not_share_results(self, brave_server):
+        cache = InMemorySearchCache()
+        singleflight = SingleFlight()
+        pool = HTTPClientPool(http2=False)
+        brave_server.delay = 0.05
+
+        async def search(api_key: str, base_url: str):
+            return await search_web_results(
+                api_key=api_key,
+                query="pydantic ai",
+                pool=pool,
+                cache=cache,
+                limiter=TokenBucket(rate=1000.0, capacity=100.0),
+                base_url=base_url,
+                singleflight=singleflight
+            )
+
+        other_url = brave_server.url.replace("/res/v1/", "/res/v2/")
+        async with pool:
+            # 并发请求只在密钥和地址都相同时合并
+            await asyncio.gather(
+                search("key-1", brave_server.url),
+                search("key-1", brave_server.url),
+                search("key-2", brave_server.url),
+                search("key-1", other_url),
+            )
+            await search("key-2", brave_server.url)
+
+        assert len(brave_server.requests) == 3
+        assert singleflight.coalesced_calls == 1
+        assert cache.stats.hits == 1
+        assert len(cache) == 3
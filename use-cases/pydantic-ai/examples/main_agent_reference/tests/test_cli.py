@@ -0,0 +1,84 @@
+"""CLI 轮次中断（Ctrl+C）的行为测试
+
+研究代理的模型由 FunctionModel 代替并被闸门挡住；
+信号处理器被替换为直接保存回调，测试中手动触发中断。
+"""
+
+import asyncio
+from contextlib import contextmanager
+
+import pytest
+from pydantic_ai.messages import ModelResponse, TextPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+from agents import cli
+from agents.memory import ConversationMemory
+from agents.research_agent import get_research_agent
+
+
+class BlockedTurn:
+    """流式输出一段文本后一直阻塞，直到被取消。"""
+
+    def __init__(self):
+        self.started = asyncio.Event()
+        self.interrupt = None
+
+    async def respond(self, messages, info: AgentInfo) -> ModelResponse:
+        return ModelResponse(parts=[TextPart("never")])
+
+    async def stream(self, messages, info: AgentInfo):
+        yield "Thinking"
+        self.started.set()
+        await asyncio.Event().wait()
+
+    @contextmanager
+    def interrupt_handler(self, callback):
+        self.interrupt = callback
+        yield
+
+
+@pytest.fixture
+def blocked(monkeypatch):
+    turn = BlockedTurn()
+    monkeypatch.setattr(cli, "interrupt_handler", turn.interrupt_handler)
+    model = FunctionModel(turn.respond, stream_function=turn.stream, model_name="test-model")
+    with get_research_agent().override(model=model):
+        yield turn
+
+
+async def start_turn(blocked: BlockedTurn) -> asyncio.Task:
+    """在独立任务中运行一轮对话，返回值附带结束时任务的取消计数。"""
+
+    async def run():
+        result = await cli.stream_agent_interaction("hello", ConversationMemory())
+        return result, asyncio.current_task().cancelling()
+
+    task = asyncio.create_task(run())
+    async with asyncio.timeout(2):
+        await blocked.started.wait()
+    return task
+
+
+class TestTurnInterrupt:
+    async def test_interrupt_cancels_turn_and_clears_request(self, blocked):
+        task = await start_turn(blocked)
+        blocked.interrupt()
+        # 重复按 Ctrl+C 不会叠加取消请求
+        blocked.interrupt()
+
+        result, cancelling = await task
+        assert result == ("", "")
+        assert cancelling == 0
+
+    async def test_outside_cancellation_propagates(self, blocked):
+        task = await start_turn(blocked)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    async def test_outside_cancellation_wins_over_interrupt(self, blocked):
+        task = await start_turn(blocked)
+        blocked.interrupt()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
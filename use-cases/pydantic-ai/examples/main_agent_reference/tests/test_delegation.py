@@ -0,0 +1,130 @@
+"""可取消的流式子代理委派的行为测试
+
+子代理的模型由 FunctionModel 代替，流式输出可以被闸门挡住，
+以便在委派进行中取消它。
+"""
+
+import asyncio
+
+import pytest
+from pydantic_ai import Agent
+from pydantic_ai.messages import ModelResponse, TextPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+from agents.delegation import Delegation, DelegationCancelled
+
+
+class GatedAgent:
+    """流式输出 "Hello " 后等待 gate，再输出 "world"。"""
+
+    def __init__(self):
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.agent = Agent(FunctionModel(self.respond, stream_function=self.stream), name="email_agent")
+
+    async def respond(self, messages, info: AgentInfo) -> ModelResponse:
+        return ModelResponse(parts=[TextPart("Hello world")])
+
+    async def stream(self, messages, info: AgentInfo):
+        yield "Hello "
+        await self.gate.wait()
+        yield "world"
+
+
+def recording_delegation(on_event=None):
+    """构造记录 (kind, content) 事件的委派；on_event 在每个事件后调用。"""
+    events = []
+
+    def sink(event):
+        events.append((event.kind, event.content))
+        if on_event is not None:
+            on_event(event)
+
+    return Delegation("email_agent", sink=sink), events
+
+
+async def wait_for_text(events, timeout: float = 2.0) -> None:
+    async with asyncio.timeout(timeout):
+        while not any(kind == "text" for kind, _ in events):
+            await asyncio.sleep(0.001)
+
+
+class TestDelegation:
+    async def test_streams_events_until_end(self):
+        delegation, events = recording_delegation()
+        output, usage = await delegation.run(GatedAgent().agent, "write")
+
+        assert output == "Hello world"
+        assert usage.requests == 1
+        assert delegation.partial_output == "Hello world"
+        assert events[0] == ("start", "") and events[-1] == ("end", "")
+        assert "".join(content for kind, content in events if kind == "text") == "Hello world"
+
+    async def test_cancel_from_sink_stops_immediately(self):
+        delegation, events = recording_delegation(
+            lambda event: event.kind == "text" and event.delegation.cancel()
+        )
+
+        with pytest.raises(DelegationCancelled) as exc_info:
+            await delegation.run(GatedAgent().agent, "write")
+
+        assert exc_info.value.partial_output == "Hello "
+        assert exc_info.value.name == "email_agent"
+        assert events[-1] == ("cancelled", "")
+        assert ("end", "") not in events
+
+    async def test_cancel_while_waiting_on_model(self):
+        model = GatedAgent()
+        model.gate.clear()
+        delegation, events = recording_delegation()
+        run = asyncio.create_task(delegation.run(model.agent, "write"))
+        await wait_for_text(events)
+
+        assert delegation.cancel()
+        assert not delegation.cancel()
+        with pytest.raises(DelegationCancelled) as exc_info:
+            await run
+        assert exc_info.value.partial_output == "Hello "
+
+    async def test_cancel_before_run(self):
+        delegation, events = recording_delegation()
+        assert delegation.cancel()
+
+        with pytest.raises(DelegationCancelled) as exc_info:
+            await delegation.run(GatedAgent().agent, "write")
+        assert exc_info.value.partial_output == ""
+        assert events == [("start", ""), ("cancelled", "")]
+
+    async def test_cancel_after_completion_is_a_no_op(self):
+        delegation, _ = recording_delegation()
+        await delegation.run(GatedAgent().agent, "write")
+        assert not delegation.cancel()
+        assert not delegation.cancelled
+
+    async def test_outer_cancellation_propagates(self):
+        model = GatedAgent()
+        model.gate.clear()
+        delegation, events = recording_delegation()
+        run = asyncio.create_task(delegation.run(model.agent, "write"))
+        await wait_for_text(events)
+
+        run.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await run
+        assert ("cancelled", "") not in events
+
+    async def test_sink_errors_do_not_abort_run(self):
+        def sink(event):
+            raise RuntimeError("render failed")
+
+        delegation = Delegation("email_agent", sink=sink)
+        output, _ = await delegation.run(GatedAgent().agent, "write")
+        assert output == "Hello world"
+
+    def test_replay_emits_cached_sequence(self):
+        cached = []
+        delegation = Delegation("email_agent", sink=lambda event: cached.append((event.kind, event.cached)))
+        delegation.replay("Cached draft")
+
+        assert cached == [("start", True), ("text", True), ("end", True)]
+        assert delegation.partial_output == "Cached draft"
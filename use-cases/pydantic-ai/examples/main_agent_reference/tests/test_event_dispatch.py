@@ -0,0 +1,109 @@
+"""CLI 流式事件分发的行为测试"""
+
+import io
+
+import pytest
+from pydantic_ai.messages import (
+    FinalResultEvent,
+    FunctionToolCallEvent,
+    FunctionToolResultEvent,
+    PartDeltaEvent,
+    PartStartEvent,
+    RetryPromptPart,
+    TextPart,
+    TextPartDelta,
+    ToolCallPart,
+    ToolCallPartDelta,
+    ToolReturnPart,
+)
+from rich.console import Console
+
+from agents.rendering import StreamEventHandler, StreamRenderer, format_tool_args
+
+
+@pytest.fixture
+def renderer():
+    return StreamRenderer(Console(file=io.StringIO(), force_terminal=False, width=200))
+
+
+def rendered(renderer: StreamRenderer) -> str:
+    renderer.flush()
+    return renderer.console.file.getvalue()
+
+
+def text_events():
+    return [
+        PartStartEvent(index=0, part=TextPart("Hel")),
+        PartDeltaEvent(index=0, delta=TextPartDelta("lo")),
+        FinalResultEvent(tool_name=None, tool_call_id=None),
+        PartDeltaEvent(index=0, delta=TextPartDelta(" world")),
+        PartDeltaEvent(index=1, delta=ToolCallPartDelta(args_delta='{"q"')),
+    ]
+
+
+async def stream(events):
+    for event in events:
+        yield event
+
+
+class TestStreamEventHandler:
+    def test_dispatch_renders_text(self, renderer):
+        handler = StreamEventHandler(renderer)
+        handler.begin_response()
+        for event in text_events():
+            handler.dispatch(event)
+        handler.end_response()
+
+        assert handler.response_text == "Hello world"
+        assert rendered(renderer) == "Assistant: Hello world\n"
+
+    async def test_consume_matches_dispatch(self, renderer):
+        handler = StreamEventHandler(renderer)
+        handler.begin_response()
+        await handler.consume(stream(text_events()))
+        handler.end_response()
+
+        assert handler.response_text == "Hello world"
+        assert rendered(renderer) == "Assistant: Hello world\n"
+
+    def test_begin_response_resets_text(self, renderer):
+        handler = StreamEventHandler(renderer)
+        handler.dispatch(PartStartEvent(index=0, part=TextPart("first")))
+        handler.begin_response()
+        handler.dispatch(PartStartEvent(index=0, part=TextPart("second")))
+        assert handler.response_text == "second"
+
+    def test_tool_results_are_matched_to_calls(self, renderer):
+        handler = StreamEventHandler(renderer)
+        handler.dispatch(FunctionToolCallEvent(ToolCallPart("search_web", {"query": "ai"}, tool_call_id="a")))
+        handler.dispatch(FunctionToolCallEvent(ToolCallPart("search_web", {"query": "ml"}, tool_call_id="b")))
+        # 并发工具按完成顺序返回
+        handler.dispatch(FunctionToolResultEvent(ToolReturnPart("search_web", "ml results", tool_call_id="b")))
+        handler.dispatch(FunctionToolResultEvent(RetryPromptPart("bad args", tool_name="search_web", tool_call_id="a")))
+
+        lines = rendered(renderer).splitlines()
+        assert lines[0].strip() == "🔹 Calling tool #1: search_web"
+        assert lines[1].strip() == "Args: query=ai"
+        assert lines[4].strip() == "✅ Tool result #2 search_web: ml results"
+        assert lines[5].strip().startswith("✅ Tool result #1 search_web: bad args")
+
+    def test_markup_in_tool_output_is_escaped(self, renderer):
+        handler = StreamEventHandler(renderer)
+        handler.dispatch(FunctionToolCallEvent(ToolCallPart("search", {"query": "[red]x[/red]"}, tool_call_id="a")))
+        assert "query=[red]x[/red]" in rendered(renderer)
+
+    def test_unknown_events_are_ignored(self, renderer):
+        handler = StreamEventHandler(renderer)
+        handler.dispatch(FinalResultEvent(tool_name=None, tool_call_id=None))
+        handler.dispatch(object())
+        assert rendered(renderer) == ""
+
+
+class TestFormatToolArgs:
+    def test_dict_shows_first_three_arguments(self):
+        args = {"a": 1, "b": "x" * 60, "c": 3, "d": 4}
+        assert format_tool_args(args) == f"a=1, b={'x' * 47}..., c=3"
+
+    def test_other_values_are_truncated(self):
+        assert format_tool_args("y" * 150) == "y" * 97 + "..."
+        assert format_tool_args('{"q": 1}') == '{"q": 1}'
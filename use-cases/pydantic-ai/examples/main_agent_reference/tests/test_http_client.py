@@ -0,0 +1,67 @@
+"""共享 HTTP 连接池的行为测试"""
+
+import asyncio
+
+import pytest
+
+from agents import http_client
+from agents.http_client import HTTPClientPool, close_http_pool, get_http_pool
+
+
+@pytest.fixture
+async def pool():
+    async with HTTPClientPool(http2=False, timeout=5.0) as pool:
+        yield pool
+
+
+class TestHTTPClientPool:
+    async def test_client_is_created_lazily_and_reused(self, pool):
+        assert pool._client is None
+        assert pool.client is pool.client
+
+    async def test_connections_are_kept_alive(self, brave_server, pool):
+        for _ in range(3):
+            response = await pool.get(brave_server.url, params={"q": "ai"})
+            assert response.status_code == 200
+        assert len(brave_server.requests) == 3
+        assert brave_server.connections == 1
+
+    async def test_per_host_limit(self, brave_server):
+        brave_server.delay = 0.05
+        async with HTTPClientPool(http2=False, max_connections_per_host=2) as pool:
+            responses = await asyncio.gather(*(pool.get(brave_server.url) for _ in range(6)))
+        assert [response.status_code for response in responses] == [200] * 6
+        assert brave_server.max_in_flight == 2
+
+    async def test_client_is_rebuilt_after_close(self, brave_server, pool):
+        first = pool.client
+        await pool.aclose()
+        assert first.is_closed
+
+        response = await pool.get(brave_server.url)
+        assert response.status_code == 200
+        assert pool.client is not first
+
+    def test_client_is_rebuilt_for_new_event_loop(self):
+        pool = HTTPClientPool(http2=False)
+
+        async def get_client():
+            return pool.client
+
+        first = asyncio.run(get_client())
+        second = asyncio.run(get_client())
+        assert second is not first
+        asyncio.run(pool.aclose())
+
+    def test_http2_falls_back_without_h2(self, monkeypatch):
+        monkeypatch.setattr(http_client, "_http2_available", lambda: False)
+        assert HTTPClientPool(http2=True).http2 is False
+
+
+class TestSharedPool:
+    async def test_shared_pool_is_reused_until_closed(self):
+        shared = get_http_pool()
+        assert get_http_pool() is shared
+        await close_http_pool()
+        assert get_http_pool() is not shared
+        await close_http_pool()
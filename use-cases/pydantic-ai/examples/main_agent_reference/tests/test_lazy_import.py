@@ -0,0 +1,62 @@
+"""研究代理延迟构建的行为测试
+
+导入开销需要在全新的解释器中测量，因此这些测试在子进程中导入模块。
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from agents import research_agent as research_agent_module
+from agents.research_agent import get_research_agent
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, sys, types
+package = types.ModuleType("agents")
+package.__path__ = [sys.argv[1]]
+sys.modules["agents"] = package
+
+import agents.research_agent as module
+import agents.settings
+state = {
+    "openai_on_import": "openai" in sys.modules,
+    "settings_on_import": agents.settings._settings is not None,
+    "agent_on_import": module._research_agent is not None,
+}
+module.get_research_agent()
+state["openai_after_build"] = "openai" in sys.modules
+print(json.dumps(state))
+"""
+
+
+def test_import_does_not_build_agent_or_load_openai(tmp_path):
+    env = {**os.environ, "LLM_API_KEY": "test-key", "BRAVE_API_KEY": "test-key"}
+    completed = subprocess.run(
+        [sys.executable, "-c", PROBE, PACKAGE_DIR],
+        cwd=tmp_path,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    assert json.loads(completed.stdout.strip().splitlines()[-1]) == {
+        "openai_on_import": False,
+        "settings_on_import": False,
+        "agent_on_import": False,
+        "openai_after_build": True,
+    }
+
+
+def test_module_attribute_builds_agent_once():
+    assert research_agent_module.research_agent is get_research_agent()
+    assert research_agent_module.research_agent is research_agent_module.research_agent
+
+
+def test_unknown_module_attribute_raises():
+    with pytest.raises(AttributeError):
+        research_agent_module.not_an_agent
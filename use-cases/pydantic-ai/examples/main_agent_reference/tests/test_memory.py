@@ -0,0 +1,165 @@
+"""令牌预算对话记忆（淘汰和摘要）的行为测试"""
+
+from pydantic_ai import Agent
+from pydantic_ai.messages import ModelRequest, ModelResponse, SystemPromptPart, TextPart, UserPromptPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+from agents.memory import PART_OVERHEAD_TOKENS, ConversationMemory, estimate_tokens, summarize_turn
+
+# 40 个 ASCII 字符约 10 个令牌，每轮（问 + 答）约 28 个令牌
+TEXT = "x" * 40
+TURN_TOKENS = 2 * (10 + PART_OVERHEAD_TOKENS)
+
+
+def exchange_messages(user_text: str, assistant_text: str, system_prompt: str = None):
+    parts = [SystemPromptPart(system_prompt)] if system_prompt else []
+    return [
+        ModelRequest(parts=parts + [UserPromptPart(user_text)]),
+        ModelResponse(parts=[TextPart(assistant_text)]),
+    ]
+
+
+class TestEstimateTokens:
+    def test_ascii_and_non_ascii(self):
+        assert estimate_tokens("") == 0
+        assert estimate_tokens("abcd") == 1
+        assert estimate_tokens("abcde") == 2
+        assert estimate_tokens("你好世界") == 4
+        assert estimate_tokens("hi 你好") == 1 + 2
+
+    def test_summarize_turn(self):
+        line = summarize_turn(exchange_messages("What is AI?", "  Artificial\nintelligence. "))
+        assert line == "- User: What is AI? | Assistant: Artificial intelligence."
+
+
+class TestConversationMemory:
+    def test_history_under_budget_is_kept(self):
+        memory = ConversationMemory(max_tokens=1000)
+        memory.add_exchange("q1", "a1")
+        memory.add_exchange("q2", "a2")
+
+        messages = memory.messages()
+        assert memory.turns == 2
+        assert len(messages) == 4
+        assert messages[0].parts[0].content == "q1"
+        assert memory.summary == ""
+
+    def test_empty_memory_has_no_messages(self):
+        assert ConversationMemory().messages() == []
+
+    def test_oldest_turns_are_evicted_to_low_water_mark(self):
+        memory = ConversationMemory(max_tokens=100, low_water_ratio=0.5)
+        for n in range(3):
+            memory.add_exchange(f"{n}{TEXT}"[:40], TEXT)
+        assert memory.turns == 3
+        assert memory.total_tokens == 3 * TURN_TOKENS
+
+        memory.add_exchange(TEXT, TEXT)
+
+        # 112 > 100，淘汰到 50 以下；最新一轮始终保留
+        assert memory.turns == 1
+        assert memory.evicted_turns == 3
+        assert len(memory.summary.splitlines()) == 3
+        assert memory.summary.startswith("- User: 0")
+
+    def test_latest_turn_is_kept_even_if_over_budget(self):
+        memory = ConversationMemory(max_tokens=10)
+        memory.add_exchange("a" * 400, "b" * 400)
+        assert memory.turns == 1
+        assert memory.evicted_turns == 0
+
+    def test_summary_is_placed_after_system_prompt(self):
+        memory = ConversationMemory(max_tokens=60, low_water_ratio=0.5)
+        memory.add_turn(exchange_messages("first", "answer", system_prompt="You are helpful."))
+        memory.add_exchange(TEXT, TEXT)
+        memory.add_exchange(TEXT, TEXT)
+
+        head = memory.messages()[0]
+        assert [type(part) for part in head.parts] == [SystemPromptPart, SystemPromptPart]
+        assert head.parts[0].content == "You are helpful."
+        assert head.parts[1].content.startswith("Earlier conversation (summarized):\n- User: first")
+
+    def test_system_prompt_is_kept_once(self):
+        memory = ConversationMemory()
+        memory.add_turn(exchange_messages("q1", "a1", system_prompt="sys"))
+        memory.add_turn(exchange_messages("q2", "a2", system_prompt="sys"))
+
+        messages = memory.messages()
+        system_parts = [
+            part for message in messages for part in message.parts if isinstance(part, SystemPromptPart)
+        ]
+        assert [part.content for part in system_parts] == ["sys"]
+        assert len(messages) == 5
+
+    def test_summary_is_capped(self):
+        memory = ConversationMemory(max_tokens=40, low_water_ratio=0.1, summary_max_tokens=30)
+        for n in range(10):
+            memory.add_exchange(f"question {n} {TEXT}", TEXT)
+        assert estimate_tokens(memory.summary) <= 30
+        assert "question 8" in memory.summary
+        assert "question 0" not in memory.summary
+
+    def test_custom_summarizer(self):
+        calls = []
+
+        def summarizer(previous, evicted):
+            calls.append((previous, len(evicted)))
+            return f"{len(calls)} summaries"
+
+        memory = ConversationMemory(max_tokens=60, low_water_ratio=0.5, summarizer=summarizer)
+        for _ in range(4):
+            memory.add_exchange(TEXT, TEXT)
+
+        assert calls[0] == ("", 2)
+        assert memory.summary == f"{len(calls)} summaries"
+
+    def test_clear(self):
+        memory = ConversationMemory(max_tokens=60, low_water_ratio=0.5)
+        for _ in range(4):
+            memory.add_exchange(TEXT, TEXT)
+        memory.clear()
+        assert memory.messages() == []
+        assert memory.summary == ""
+        assert memory.total_tokens == 0
+
+
+class TestMessageHistory:
+    """messages() 作为原生 message_history 传给代理。"""
+
+    def test_prefix_is_stable_between_evictions(self):
+        memory = ConversationMemory(max_tokens=100, low_water_ratio=0.5)
+        memory.add_turn(exchange_messages("q1", "a1", system_prompt="sys"))
+        before = memory.messages()
+        memory.add_exchange("q2", "a2")
+        after = memory.messages()
+
+        # 未淘汰时已有消息原样保留（同一对象），只在末尾追加
+        assert all(a is b for a, b in zip(before, after))
+        assert len(after) == len(before) + 2
+
+        for _ in range(3):
+            memory.add_exchange(TEXT, TEXT)
+        assert memory.evicted_turns > 0
+        assert memory.messages()[0] is not before[0]
+
+    async def test_agent_receives_structured_history(self):
+        seen = []
+
+        def respond(messages, info: AgentInfo) -> ModelResponse:
+            seen.append(list(messages))
+            return ModelResponse(parts=[TextPart(f"answer {len(seen)}")])
+
+        agent = Agent(FunctionModel(respond), system_prompt="You are a researcher.")
+        memory = ConversationMemory()
+        for prompt in ("first question", "second question"):
+            result = await agent.run(prompt, message_history=memory.messages())
+            memory.add_turn(result.new_messages())
+
+        second = seen[1]
+        parts = [part for message in second for part in message.parts]
+        assert [part.content for part in parts if isinstance(part, SystemPromptPart)] == ["You are a researcher."]
+        assert [part.content for part in parts if isinstance(part, UserPromptPart)] == [
+            "first question", "second question"
+        ]
+        assert isinstance(second[-2], ModelResponse)
+        assert second[-2].parts[0].content == "answer 1"
@@ -0,0 +1,111 @@
+"""LLM 响应缓存（record/replay/passthrough）的行为测试"""
+
+import pytest
+from pydantic_ai import Agent
+from pydantic_ai.messages import ModelResponse, TextPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+from agents.model_cache import CacheMissError, CachingModel
+
+MODEL_NAME = "test-model"
+
+
+def counting_model(text: str = "recorded answer"):
+    """构造记录调用次数的模型，支持普通请求和流式请求。"""
+    calls = []
+
+    def respond(messages, info: AgentInfo) -> ModelResponse:
+        calls.append("request")
+        return ModelResponse(parts=[TextPart(text)])
+
+    async def stream(messages, info: AgentInfo):
+        calls.append("stream")
+        for word in text.split(" "):
+            yield word + " "
+
+    model = FunctionModel(respond, stream_function=stream, model_name=MODEL_NAME)
+    return model, calls
+
+
+def offline_model(model_name: str = MODEL_NAME):
+    """任何调用都会失败的模型，用于确认 replay 完全离线。"""
+    def respond(messages, info):
+        raise AssertionError("model must not be called in replay mode")
+
+    async def stream(messages, info):
+        raise AssertionError("model must not be called in replay mode")
+        yield ""
+
+    return FunctionModel(respond, stream_function=stream, model_name=model_name)
+
+
+async def ask(model, prompt: str = "hello") -> str:
+    result = await Agent(model).run(prompt)
+    return result.output
+
+
+async def ask_streaming(model, prompt: str = "hello") -> str:
+    async with Agent(model).run_stream(prompt) as result:
+        return await result.get_output()
+
+
+class TestCachingModel:
+    async def test_record_mode_records_once_then_hits(self, tmp_path):
+        wrapped, calls = counting_model()
+        model = CachingModel(wrapped, directory=str(tmp_path), mode="record")
+
+        assert await ask(model) == "recorded answer"
+        assert await ask(model) == "recorded answer"
+
+        assert calls == ["request"]
+        assert model.stats.to_dict() == {"hits": 1, "misses": 1, "recorded": 1}
+        assert len(list(tmp_path.rglob("*.json"))) == 1
+
+    async def test_replay_mode_serves_recordings_offline(self, tmp_path):
+        wrapped, _ = counting_model()
+        await ask(CachingModel(wrapped, directory=str(tmp_path), mode="record"))
+
+        replay = CachingModel(offline_model(), directory=str(tmp_path), mode="replay")
+        assert await ask(replay) == "recorded answer"
+        assert replay.stats.hits == 1
+
+    async def test_replay_miss_raises(self, tmp_path):
+        replay = CachingModel(offline_model(), directory=str(tmp_path), mode="replay")
+        with pytest.raises(CacheMissError):
+            await ask(replay, "never recorded")
+
+    async def test_recordings_are_per_model(self, tmp_path):
+        wrapped, _ = counting_model()
+        await ask(CachingModel(wrapped, directory=str(tmp_path), mode="record"))
+
+        replay = CachingModel(offline_model("other-model"), directory=str(tmp_path), mode="replay")
+        with pytest.raises(CacheMissError):
+            await ask(replay)
+
+    async def test_different_prompts_do_not_share_recordings(self, tmp_path):
+        wrapped, calls = counting_model()
+        model = CachingModel(wrapped, directory=str(tmp_path), mode="record")
+        await ask(model, "first")
+        await ask(model, "second")
+        assert calls == ["request", "request"]
+
+    async def test_passthrough_neither_reads_nor_writes(self, tmp_path):
+        wrapped, calls = counting_model()
+        model = CachingModel(wrapped, directory=str(tmp_path), mode="passthrough")
+        await ask(model)
+        await ask(model)
+        assert calls == ["request", "request"]
+        assert list(tmp_path.rglob("*.json")) == []
+
+    async def test_streamed_responses_are_recorded_and_replayed(self, tmp_path):
+        wrapped, calls = counting_model("streamed answer")
+        recorded = await ask_streaming(CachingModel(wrapped, directory=str(tmp_path), mode="record"))
+
+        replay = CachingModel(offline_model(), directory=str(tmp_path), mode="replay")
+        assert await ask_streaming(replay) == recorded
+        assert recorded.strip() == "streamed answer"
+        assert calls == ["stream"]
+
+    def test_unknown_mode_rejected(self, tmp_path):
+        with pytest.raises(ValueError):
+            CachingModel(offline_model(), directory=str(tmp_path), mode="refresh")
@@ -0,0 +1,85 @@
+"""LLM 提供者/模型注册表和失效回调的行为测试"""
+
+import pytest
+
+from agents import providers
+from agents.model_cache import CachingModel
+from agents.providers import (
+    close_llm_clients,
+    get_llm_model,
+    get_llm_provider,
+    invalidate_llm_models,
+    on_llm_models_invalidated,
+)
+from agents.research_agent import get_research_agent
+from agents.settings import get_settings
+
+
+@pytest.fixture(autouse=True)
+async def fresh_registry(monkeypatch):
+    """每个测试使用空注册表，测试中注册的回调在结束后移除。"""
+    monkeypatch.setattr(providers, "_invalidation_hooks", list(providers._invalidation_hooks))
+    invalidate_llm_models()
+    yield
+    await close_llm_clients()
+
+
+class TestRegistry:
+    def test_providers_are_reused_per_endpoint_and_key(self):
+        provider = get_llm_provider("https://llm.example/v1", "key-1")
+        assert get_llm_provider("https://llm.example/v1", "key-1") is provider
+        assert get_llm_provider("https://llm.example/v1", "key-2") is not provider
+        assert get_llm_provider("https://other.example/v1", "key-1") is not provider
+
+    def test_providers_share_one_http_client(self):
+        first = get_llm_provider("https://llm.example/v1", "key-1")
+        second = get_llm_provider("https://other.example/v1", "key-2")
+        assert first.client._client is second.client._client is providers._llm_http_client
+
+    def test_models_are_reused_per_choice(self):
+        model = get_llm_model()
+        assert get_llm_model() is model
+        assert get_llm_model("gpt-4o-mini") is not model
+
+    def test_cache_mode_wraps_model(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(get_settings(), "llm_cache_mode", "record")
+        monkeypatch.setattr(get_settings(), "llm_cache_dir", str(tmp_path))
+        model = get_llm_model()
+        assert isinstance(model, CachingModel)
+        assert model.mode == "record"
+
+    def test_settings_change_creates_new_model(self, monkeypatch):
+        model = get_llm_model()
+        monkeypatch.setattr(get_settings(), "llm_base_url", "https://changed.example/v1")
+        assert get_llm_model() is not model
+
+
+class TestInvalidation:
+    def test_invalidate_rebuilds_models_and_calls_hooks(self):
+        model = get_llm_model()
+        calls = []
+        on_llm_models_invalidated(lambda: calls.append(1))
+
+        invalidate_llm_models()
+
+        assert calls == [1]
+        assert get_llm_model() is not model
+
+    async def test_close_rebuilds_client_and_providers(self):
+        provider = get_llm_provider("https://llm.example/v1", "key-1")
+        client = providers._llm_http_client
+
+        await close_llm_clients()
+
+        assert client.is_closed
+        rebuilt = get_llm_provider("https://llm.example/v1", "key-1")
+        assert rebuilt is not provider
+        assert rebuilt.client._client is not client
+
+    def test_research_agent_is_rebuilt_after_invalidation(self):
+        agent = get_research_agent()
+        assert get_research_agent() is agent
+        invalidate_llm_models()
+        rebuilt = get_research_agent()
+        assert rebuilt is not agent
+        assert rebuilt.model is get_llm_model()
@@ -0,0 +1,210 @@
+"""速率限制和 429/5xx 重试的测试
+
+通过本地桩服务器驱动 search_web_results 的完整请求路径（连接池 → 令牌桶 → 重试），
+另外单独测试 TokenBucket 的排队、失败模式和响应头自适应。
+"""
+
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from agents.http_client import HTTPClientPool
+from agents.rate_limit import RateLimitExceeded, RetryPolicy, TokenBucket, send_with_retry
+from agents.tools import SingleFlight, search_web_results
+
+FAST_RETRIES = RetryPolicy(max_retries=3, base_delay=0.001, max_delay=0.01)
+
+
+@pytest.fixture
+async def pool():
+    async with HTTPClientPool(http2=False, timeout=5.0) as pool:
+        yield pool
+
+
+async def search(server, pool, limiter=None, policy=FAST_RETRIES, **kwargs):
+    return await search_web_results(
+        api_key="test-key",
+        query="pydantic ai",
+        pool=pool,
+        use_cache=False,
+        limiter=limiter or TokenBucket(rate=1000.0, capacity=100.0),
+        retry_policy=policy,
+        base_url=server.url,
+        singleflight=SingleFlight(),
+        **kwargs
+    )
+
+
+class TestRetry:
+    """429/5xx 退避重试。"""
+
+    async def test_retries_429_then_succeeds(self, brave_server, pool):
+        brave_server.script(429, {"Retry-After": "0"})
+        results = await search(brave_server, pool)
+        assert len(results) == 2
+        assert len(brave_server.requests) == 2
+
+    @pytest.mark.parametrize("status", [500, 502, 503, 504])
+    async def test_retries_server_errors(self, brave_server, pool, status):
+        brave_server.script(status)
+        brave_server.script(status)
+        results = await search(brave_server, pool)
+        assert results.urls == ["https://example.com/0", "https://example.com/1"]
+        assert len(brave_server.requests) == 3
+
+    async def test_gives_up_after_max_retries(self, brave_server, pool):
+        for _ in range(FAST_RETRIES.max_retries + 1):
+            brave_server.script(429)
+        with pytest.raises(RateLimitExceeded):
+            await search(brave_server, pool)
+        assert len(brave_server.requests) == FAST_RETRIES.max_retries + 1
+
+    async def test_client_errors_are_not_retried(self, brave_server, pool):
+        brave_server.script(401)
+        with pytest.raises(Exception, match="Invalid Brave API key"):
+            await search(brave_server, pool)
+        assert len(brave_server.requests) == 1
+
+    async def test_retry_after_is_honoured(self, brave_server, pool):
+        brave_server.script(429, {"Retry-After": "0.2"})
+        start = time.monotonic()
+        await search(brave_server, pool)
+        assert time.monotonic() - start >= 0.2
+
+    async def test_429_pauses_shared_limiter(self, brave_server, pool):
+        limiter = TokenBucket(rate=1000.0, capacity=100.0, mode="fail")
+        brave_server.script(429, {"Retry-After": "0.2"})
+        responses = []
+
+        async def send():
+            response = await pool.get(brave_server.url)
+            responses.append(response.status_code)
+            return response
+
+        task = asyncio.create_task(send_with_retry(send, limiter=limiter, policy=FAST_RETRIES))
+        while not responses:
+            await asyncio.sleep(0.01)
+
+        # 退避期间共享同一限制器的其他请求也拿不到令牌
+        with pytest.raises(RateLimitExceeded):
+            await limiter.acquire()
+
+        response = await task
+        assert response.status_code == 200
+        assert responses == [429, 200]
+
+    async def test_transport_errors_are_retried(self):
+        errors = [httpx.ConnectError("refused"), httpx.ReadTimeout("slow")]
+
+        async def send():
+            if errors:
+                raise errors.pop(0)
+            return httpx.Response(200)
+
+        response = await send_with_retry(send, policy=FAST_RETRIES)
+        assert response.status_code == 200
+        assert errors == []
+
+    async def test_transport_errors_are_raised_after_max_retries(self):
+        attempts = []
+
+        async def send():
+            attempts.append(1)
+            raise httpx.ConnectTimeout("timed out")
+
+        with pytest.raises(httpx.ConnectTimeout):
+            await send_with_retry(send, policy=FAST_RETRIES)
+        assert len(attempts) == FAST_RETRIES.max_retries + 1
+
+    async def test_rate_limit_headers_update_bucket(self, brave_server, pool):
+        limiter = TokenBucket(rate=1000.0, capacity=100.0)
+        brave_server.script(200, {
+            "X-RateLimit-Limit": "5, 15000",
+            "X-RateLimit-Policy": "5;w=1, 15000;w=2592000",
+            "X-RateLimit-Remaining": "4, 14000",
+            "X-RateLimit-Reset": "1, 100000",
+        })
+        await search(brave_server, pool, limiter=limiter)
+        assert limiter.rate == 5.0
+        assert limiter.capacity == 5.0
+
+
+class TestTokenBucket:
+    """令牌桶本身的行为。"""
+
+    async def test_fail_mode_allows_burst_then_raises(self):
+        bucket = TokenBucket(rate=0.1, capacity=2.0, mode="fail")
+        await bucket.acquire()
+        await bucket.acquire()
+        with pytest.raises(RateLimitExceeded):
+            await bucket.acquire()
+
+    async def test_queue_mode_spaces_requests(self):
+        bucket = TokenBucket(rate=20.0, capacity=1.0)
+        start = time.monotonic()
+        for _ in range(3):
+            await bucket.acquire()
+        # 第一个令牌立即可用，之后每个等待 1/rate 秒
+        assert time.monotonic() - start >= 0.09
+
+    async def test_queue_mode_respects_max_wait(self):
+        bucket = TokenBucket(rate=0.1, capacity=1.0, max_wait=1.0)
+        await bucket.acquire()
+        with pytest.raises(RateLimitExceeded, match="exceeds max_wait"):
+            await bucket.acquire()
+
+    async def test_max_wait_counts_time_queued_behind_other_requests(self):
+        bucket = TokenBucket(rate=10.0, capacity=1.0, max_wait=0.25)
+        await bucket.acquire()
+        # 排队的请求依次等待约 0.1s、0.2s、0.3s、0.4s，后两个超过 max_wait
+        results = await asyncio.gather(*(bucket.acquire() for _ in range(4)), return_exceptions=True)
+        assert results[:2] == [None, None]
+        assert all(isinstance(result, RateLimitExceeded) for result in results[2:])
+
+    async def test_queued_requests_wait_concurrently(self):
+        bucket = TokenBucket(rate=20.0, capacity=1.0)
+        await bucket.acquire()
+        start = time.monotonic()
+        await asyncio.gather(*(bucket.acquire() for _ in range(3)))
+        # 第三个请求约 0.15s 后获得令牌，总耗时不是各自等待时间之和
+        assert 0.14 <= time.monotonic() - start < 0.28
+
+    async def test_cancelled_waiter_returns_its_reservation(self):
+        bucket = TokenBucket(rate=10.0, capacity=1.0)
+        await bucket.acquire()
+        waiter = asyncio.create_task(bucket.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        start = time.monotonic()
+        await bucket.acquire()
+        assert time.monotonic() - start < 0.15
+
+    async def test_pause_during_wait_is_honoured(self):
+        bucket = TokenBucket(rate=100.0, capacity=1.0)
+        await bucket.acquire()
+        start = time.monotonic()
+        waiter = asyncio.create_task(bucket.acquire())
+        await asyncio.sleep(0)
+        bucket.block_for(0.1)
+        await waiter
+        assert time.monotonic() - start >= 0.1
+
+    async def test_exhausted_window_blocks_until_reset(self):
+        bucket = TokenBucket(rate=100.0, capacity=10.0, mode="fail")
+        bucket.update_from_headers({
+            "X-RateLimit-Remaining": "0, 100",
+            "X-RateLimit-Reset": "0.1, 1000",
+        })
+        with pytest.raises(RateLimitExceeded):
+            await bucket.acquire()
+        time.sleep(0.12)
+        await bucket.acquire()
+
+    def test_unknown_mode_rejected(self):
+        with pytest.raises(ValueError):
+            TokenBucket(mode="drop")
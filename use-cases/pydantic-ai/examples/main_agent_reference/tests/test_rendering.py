@@ -0,0 +1,62 @@
+"""按帧率合并刷新的流式渲染器的行为测试"""
+
+import asyncio
+import io
+
+import pytest
+from rich.console import Console
+
+from agents.rendering import StreamRenderer
+
+
+@pytest.fixture
+def console():
+    return Console(file=io.StringIO(), force_terminal=False, width=200)
+
+
+def output(console: Console) -> str:
+    return console.file.getvalue()
+
+
+class TestStreamRenderer:
+    def test_output_is_buffered_until_flush(self, console):
+        renderer = StreamRenderer(console)
+        renderer.write("Hello")
+        renderer.write(", world")
+        renderer.print("[bold]done[/bold]")
+        assert output(console) == ""
+
+        renderer.flush()
+        assert output(console) == "Hello, worlddone\n"
+        assert (renderer.writes, renderer.flushes) == (3, 1)
+
+    def test_write_is_literal_and_print_parses_markup(self, console):
+        renderer = StreamRenderer(console)
+        renderer.write("[bold]x[/bold]")
+        renderer.print("[bold]y[/bold]", end="")
+        renderer.flush()
+        assert output(console) == "[bold]x[/bold]y"
+
+    def test_empty_writes_and_flushes_are_skipped(self, console):
+        renderer = StreamRenderer(console)
+        renderer.write("")
+        renderer.flush()
+        assert (renderer.writes, renderer.flushes) == (0, 0)
+
+    async def test_flushes_are_capped_by_frame_rate(self, console):
+        async with StreamRenderer(console, max_fps=20) as renderer:
+            for n in range(200):
+                renderer.write(f"{n} ")
+                await asyncio.sleep(0.001)
+        text = output(console)
+        assert text == "".join(f"{n} " for n in range(200))
+        # 约 0.2 秒以上的输出在 20 fps 下只刷新几次，而不是每个增量一次
+        assert 2 <= renderer.flushes <= 12
+        assert renderer.writes == 200
+
+    async def test_exit_flushes_remaining_output(self, console):
+        async with StreamRenderer(console, max_fps=1) as renderer:
+            renderer.write("pending")
+            assert output(console) == ""
+        assert output(console) == "pending"
+        assert renderer._ticker is None
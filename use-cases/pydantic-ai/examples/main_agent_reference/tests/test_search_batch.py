@@ -0,0 +1,78 @@
+"""多查询批量搜索（并发扇出、URL 去重和评分合并）的行为测试"""
+
+import json
+
+import pytest
+
+from agents.models import position_score
+from agents.tools import search_web_tool_batch
+
+RESULTS = {
+    "pydantic ai": ["https://a.example/0", "https://a.example/1", "https://Example.com/shared/"],
+    "agents": ["https://b.example/0", "https://b.example/1", "https://example.com/shared#intro"],
+    "llm": ["https://c.example/0"],
+}
+
+
+def body(urls):
+    results = [{"title": url, "url": url, "description": f"About {url}"} for url in urls]
+    return json.dumps({"web": {"results": results}}).encode("utf-8")
+
+
+@pytest.fixture
+def server(brave_server):
+    def respond(params):
+        if params["q"] == "broken":
+            return b"not json"
+        return body(RESULTS.get(params["q"].strip().lower(), []))
+
+    brave_server.respond = respond
+    return brave_server
+
+
+async def batch(search_kwargs, queries, **kwargs):
+    return await search_web_tool_batch(api_key="test-key", queries=queries, **kwargs, **search_kwargs)
+
+
+class TestSearchWebToolBatch:
+    async def test_duplicate_and_empty_queries_run_once(self, server, search_kwargs):
+        await batch(search_kwargs, ["pydantic ai", " Pydantic  AI ", "", "agents"])
+        assert sorted(params["q"] for params in server.queries()) == ["agents", "pydantic ai"]
+
+    async def test_urls_are_deduplicated_and_scores_combined(self, server, search_kwargs):
+        results = await batch(search_kwargs, ["pydantic ai", "agents"])
+
+        shared = [item for item in results if "shared" in item["url"]]
+        assert len(shared) == 1
+        assert shared[0]["queries"] == ["pydantic ai", "agents"]
+        # 两个查询都在第 3 位命中：1 - (1 - 0.9)²
+        expected = 1.0 - (1.0 - position_score(2)) ** 2
+        assert shared[0]["score"] == pytest.approx(expected)
+        assert len(results) == 5
+
+        scores = [item["score"] for item in results]
+        assert scores == sorted(scores, reverse=True)
+        # 被两个查询命中的结果排在各自第 2 位的结果之前
+        assert results.index(shared[0]) == 2
+
+    async def test_max_results(self, server, search_kwargs):
+        results = await batch(search_kwargs, ["pydantic ai", "agents", "llm"], max_results=2)
+        assert len(results) == 2
+
+    async def test_failed_query_does_not_abort_batch(self, server, search_kwargs):
+        results = await batch(search_kwargs, ["broken", "llm"])
+        assert [item["url"] for item in results] == ["https://c.example/0"]
+
+    async def test_all_queries_failing_raises(self, server, search_kwargs):
+        with pytest.raises(ValueError):
+            await batch(search_kwargs, ["broken"])
+
+    async def test_no_queries_raises(self, search_kwargs):
+        with pytest.raises(ValueError, match="non-empty query"):
+            await batch(search_kwargs, ["", "  "])
+
+    async def test_max_concurrency(self, server, search_kwargs):
+        server.delay = 0.05
+        await batch(search_kwargs, [f"query {i}" for i in range(5)], max_concurrency=2)
+        assert len(server.requests) == 5
+        assert server.max_in_flight == 2
@@ -0,0 +1,88 @@
+"""逐页惰性搜索结果生成器（预算、提前停止和预取）的行为测试"""
+
+import asyncio
+import json
+from contextlib import aclosing
+
+import pytest
+
+from agents.models import position_score
+from agents.tools import iter_search_results
+
+
+def page_body(offset: int, count: int, total: int) -> bytes:
+    start = offset * count
+    results = [
+        {"title": f"Result {i}", "url": f"https://example.com/{i}", "description": ""}
+        for i in range(start, min(start + count, total))
+    ]
+    return json.dumps({"web": {"results": results}}).encode("utf-8")
+
+
+@pytest.fixture
+def server(brave_server):
+    """共 7 条结果，按 offset（页号）和 count 分页返回。"""
+    brave_server.respond = lambda params: page_body(int(params["offset"]), int(params["count"]), 7)
+    return brave_server
+
+
+async def collect(search_kwargs, **kwargs):
+    async with aclosing(iter_search_results(api_key="test-key", query="ai", **kwargs, **search_kwargs)) as hits:
+        return [hit async for hit in hits]
+
+
+def offsets(server):
+    return [int(params["offset"]) for params in server.queries()]
+
+
+class TestIterSearchResults:
+    async def test_pages_until_results_run_out(self, server, search_kwargs):
+        hits = await collect(search_kwargs, page_size=3)
+        assert [hit.url for hit in hits] == [f"https://example.com/{i}" for i in range(7)]
+        # 第 3 页不满一页，不再请求第 4 页
+        assert offsets(server) == [0, 1, 2]
+
+    async def test_scores_follow_global_rank(self, server, search_kwargs):
+        hits = await collect(search_kwargs, page_size=3)
+        assert [hit.score for hit in hits] == [position_score(i) for i in range(7)]
+
+    async def test_budget_stops_paging(self, server, search_kwargs):
+        hits = await collect(search_kwargs, page_size=2, max_results=3)
+        assert len(hits) == 3
+        # 第 2 页已足够满足预算，不预取第 3 页
+        assert offsets(server) == [0, 1]
+
+    async def test_max_pages(self, server, search_kwargs):
+        hits = await collect(search_kwargs, page_size=2, max_pages=2)
+        assert len(hits) == 4
+        assert offsets(server) == [0, 1]
+
+    async def test_stop_when(self, server, search_kwargs):
+        hits = await collect(search_kwargs, page_size=2, prefetch=False, stop_when=lambda hit: hit.url.endswith("/2"))
+        assert [hit.url for hit in hits][-1] == "https://example.com/2"
+        assert offsets(server) == [0, 1]
+
+    async def test_next_page_is_prefetched_while_consuming(self, server, search_kwargs):
+        async with aclosing(iter_search_results(api_key="test-key", query="ai", page_size=3, **search_kwargs)) as hits:
+            await anext(hits)
+            await asyncio.sleep(0.05)
+            assert offsets(server) == [0, 1]
+
+    async def test_without_prefetch_pages_are_fetched_on_demand(self, server, search_kwargs):
+        async with aclosing(
+            iter_search_results(api_key="test-key", query="ai", page_size=3, prefetch=False, **search_kwargs)
+        ) as hits:
+            await anext(hits)
+            await asyncio.sleep(0.05)
+            assert offsets(server) == [0]
+
+    async def test_closing_early_cancels_prefetch(self, server, search_kwargs):
+        server.delay = 0.5
+        hits = iter_search_results(api_key="test-key", query="ai", page_size=3, **search_kwargs)
+        first = await anext(hits)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await hits.aclose()
+        assert first.url == "https://example.com/0"
+        # 不等待进行中的预取请求完成
+        assert loop.time() - start < 0.2
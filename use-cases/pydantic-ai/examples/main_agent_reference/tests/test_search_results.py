@@ -0,0 +1,75 @@
+"""列式搜索结果容器的行为测试"""
+
+import json
+
+import pytest
+from pydantic import ValidationError
+
+from agents.models import BraveSearchResult, SearchHit, SearchResults, position_score
+
+
+def response(*results) -> bytes:
+    return json.dumps({"web": {"results": list(results)}}).encode("utf-8")
+
+
+class TestFromBraveResponse:
+    def test_parses_columns_and_position_scores(self):
+        content = response(
+            {"title": "A", "url": "https://a", "description": "first", "extra": {"ignored": True}},
+            {"title": "B", "url": "https://b"},
+        )
+        results = SearchResults.from_brave_response(content)
+
+        assert results.titles == ["A", "B"]
+        assert results.urls == ["https://a", "https://b"]
+        assert results.descriptions == ["first", ""]
+        assert results.scores == [position_score(0), position_score(1)]
+
+    def test_accepts_text(self):
+        results = SearchResults.from_brave_response(response({"title": "A", "url": "https://a"}).decode())
+        assert len(results) == 1
+
+    @pytest.mark.parametrize("content", [b"{}", b'{"web": null}', b'{"web": {"results": null}}'])
+    def test_missing_results_are_empty(self, content):
+        assert len(SearchResults.from_brave_response(content)) == 0
+
+    def test_invalid_json_raises(self):
+        with pytest.raises(ValueError):
+            SearchResults.from_brave_response(b"not json")
+
+    def test_position_score_floor(self):
+        assert position_score(0) == 1.0
+        assert position_score(100) == 0.1
+
+
+class TestSearchResults:
+    def test_from_records_skips_incomplete_records(self):
+        results = SearchResults.from_records([
+            {"title": "A", "url": "https://a", "description": None, "score": 0.7},
+            {"title": "no url"},
+            {"url": "https://no-title"},
+            {"title": "B", "url": "https://b"},
+        ])
+        assert results.urls == ["https://a", "https://b"]
+        assert results.descriptions == ["", ""]
+        assert results.scores == [0.7, 0.0]
+
+    def test_views_and_conversions(self):
+        results = SearchResults.from_brave_response(
+            response({"title": "A", "url": "https://a", "description": "d"})
+        )
+        hit = results[0]
+        assert isinstance(hit, SearchHit)
+        assert list(results) == [hit]
+        assert results.to_dicts() == [{"title": "A", "url": "https://a", "description": "d", "score": 1.0}]
+        assert SearchResults.from_records(results.to_dicts()).to_dicts() == results.to_dicts()
+        assert results.to_models() == [BraveSearchResult(title="A", url="https://a", description="d", score=1.0)]
+
+    def test_validation_is_deferred_to_to_models(self):
+        results = SearchResults.from_records([{"title": "A", "url": "https://a", "score": 1.5}])
+        assert results[0].score == 1.5
+        with pytest.raises(ValidationError):
+            results.to_models()
+
+    def test_no_per_instance_dict(self):
+        assert not hasattr(SearchResults(), "__dict__")
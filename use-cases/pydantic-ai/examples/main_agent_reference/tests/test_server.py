@@ -0,0 +1,181 @@
+"""多会话 HTTP/SSE 服务器的行为测试
+
+服务器绑定随机端口，研究代理的模型由 FunctionModel 代替；
+模型可以被闸门挡住，以便在运行进行中观察 409/503。
+"""
+
+import asyncio
+from dataclasses import dataclass
+
+import httpx
+import pytest
+from pydantic_ai.messages import ModelResponse, TextPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+from agents.research_agent import get_research_agent
+from agents.server import ResearchServer
+from agents.session_store import SQLiteSessionStore
+from agents.sessions import SessionManager
+
+
+class GatedModel:
+    """流式返回固定文本的模型；gate 未打开时阻塞，started 记录已开始的运行数。"""
+
+    def __init__(self):
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.started = 0
+        self.model = FunctionModel(self.respond, stream_function=self.stream, model_name="test-model")
+
+    async def respond(self, messages, info: AgentInfo) -> ModelResponse:
+        return ModelResponse(parts=[TextPart("Hi there")])
+
+    async def stream(self, messages, info: AgentInfo):
+        self.started += 1
+        await self.gate.wait()
+        yield "Hi "
+        yield "there"
+
+
+@dataclass
+class RunningServer:
+    app: ResearchServer
+    client: httpx.AsyncClient
+    port: int
+
+
+@pytest.fixture
+def model():
+    return GatedModel()
+
+
+@pytest.fixture
+async def server(model, tmp_path):
+    """启动服务器；模型覆盖必须在服务器启动前生效，连接处理任务才会继承它。"""
+    store = SQLiteSessionStore(str(tmp_path / "sessions.db"))
+    sessions = SessionManager(store=store)
+    app = ResearchServer(
+        sessions=sessions,
+        max_concurrent_runs=1,
+        max_pending_runs=0,
+        max_request_bytes=2048
+    )
+    # 空的会话管理器也必须被使用，而不是换成默认管理器
+    assert app.sessions is sessions
+    with get_research_agent().override(model=model.model):
+        listener = await asyncio.start_server(app.handle_connection, "127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        async with listener:
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as client:
+                yield RunningServer(app, client, port)
+    store.close()
+
+
+async def create_session(server) -> str:
+    response = await server.client.post("/sessions", json={})
+    assert response.status_code == 201
+    return response.json()["session_id"]
+
+
+async def raw_request(server, data: bytes) -> bytes:
+    reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+    writer.write(data)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return response
+
+
+async def wait_for(predicate, timeout: float = 2.0) -> None:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not predicate():
+        assert loop.time() < deadline, "condition not reached"
+        await asyncio.sleep(0.01)
+
+
+class TestRoutes:
+    async def test_session_lifecycle(self, server):
+        session_id = await create_session(server)
+        assert (await server.client.get(f"/sessions/{session_id}")).json()["session_id"] == session_id
+        assert (await server.client.delete(f"/sessions/{session_id}")).status_code == 204
+        assert (await server.client.get(f"/sessions/{session_id}")).status_code == 404
+
+    async def test_message_streams_events_and_records_turn(self, server):
+        session_id = await create_session(server)
+        response = await server.client.post(f"/sessions/{session_id}/messages", json={"message": "hello"})
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert "event: text" in response.text
+        assert "event: done" in response.text
+
+        state = (await server.client.get(f"/sessions/{session_id}")).json()
+        assert [message["content"] for message in state["messages"]] == ["hello", "Hi there"]
+        assert len(server.app.sessions.store.load(session_id).turns) == 1
+
+    async def test_unknown_route_and_method(self, server):
+        assert (await server.client.get("/nothing")).status_code == 404
+        assert (await server.client.put("/sessions")).status_code == 405
+        assert (await server.client.get("/health")).json() == {"status": "ok"}
+
+
+class TestBadRequests:
+    @pytest.mark.parametrize("payload", [{}, {"message": "   "}, {"message": 42}])
+    async def test_message_must_be_non_empty_string(self, server, payload):
+        session_id = await create_session(server)
+        response = await server.client.post(f"/sessions/{session_id}/messages", json=payload)
+        assert response.status_code == 400
+
+    @pytest.mark.parametrize("body", [b"not json", b"[1, 2]"])
+    async def test_body_must_be_json_object(self, server, body):
+        response = await server.client.post("/sessions", content=body)
+        assert response.status_code == 400
+
+    @pytest.mark.parametrize("length", ["abc", "-1", "+5", "1_0"])
+    async def test_malformed_content_length(self, server, length):
+        response = await raw_request(
+            server, f"POST /sessions HTTP/1.1\r\nContent-Length: {length}\r\n\r\n".encode("latin-1")
+        )
+        assert response.startswith(b"HTTP/1.1 400 ")
+
+    async def test_oversized_body(self, server):
+        response = await server.client.post("/sessions", content=b"x" * 4096)
+        assert response.status_code == 413
+
+
+class TestBusySessions:
+    async def test_concurrent_message_and_delete_conflict(self, server, model):
+        session_id = await create_session(server)
+        model.gate.clear()
+        running = asyncio.create_task(
+            server.client.post(f"/sessions/{session_id}/messages", json={"message": "first"})
+        )
+        await wait_for(lambda: model.started == 1)
+
+        second = await server.client.post(f"/sessions/{session_id}/messages", json={"message": "second"})
+        assert second.status_code == 409
+        assert (await server.client.delete(f"/sessions/{session_id}")).status_code == 409
+
+        model.gate.set()
+        assert (await running).status_code == 200
+        assert (await server.client.delete(f"/sessions/{session_id}")).status_code == 204
+
+    async def test_run_beyond_capacity_is_rejected(self, server, model):
+        first_id = await create_session(server)
+        second_id = await create_session(server)
+        model.gate.clear()
+        running = asyncio.create_task(
+            server.client.post(f"/sessions/{first_id}/messages", json={"message": "first"})
+        )
+        await wait_for(lambda: model.started == 1)
+
+        rejected = await server.client.post(f"/sessions/{second_id}/messages", json={"message": "second"})
+        assert rejected.status_code == 503
+        assert rejected.headers["retry-after"] == "1"
+
+        model.gate.set()
+        assert (await running).status_code == 200
+        metrics = (await server.client.get("/metrics")).json()
+        assert metrics["runs"]["rejected"] == 1
+        assert metrics["runs"]["completed"] == 1
@@ -0,0 +1,127 @@
+"""会话存储（SQLite 和追加日志后端）的行为测试"""
+
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+from pydantic_ai.messages import ModelRequest, ModelResponse, TextPart, UserPromptPart
+
+from agents.models import ChatMessage, SessionState
+from agents.session_store import (
+    LogSessionStore,
+    SessionStore,
+    SessionStoreCorruptedError,
+    SQLiteSessionStore,
+)
+
+
+def turn(prompt: str, answer: str):
+    """构造一轮对话的聊天消息和代理消息。"""
+    chat = [ChatMessage(role="user", content=prompt), ChatMessage(role="assistant", content=answer)]
+    model = [
+        ModelRequest(parts=[UserPromptPart(content=prompt)]),
+        ModelResponse(parts=[TextPart(content=answer)]),
+    ]
+    return chat, model
+
+
+def add_turn(store: SessionStore, session_id: str, prompt: str, answer: str, at: datetime) -> int:
+    chat, model = turn(prompt, answer)
+    return store.append_turn(session_id, chat, model, at)
+
+
+@pytest.fixture(params=["sqlite", "log"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        store = SQLiteSessionStore(str(tmp_path / "sessions.db"))
+    else:
+        store = LogSessionStore(str(tmp_path / "sessions"))
+    yield store
+    store.close()
+
+
+class TestSessionStore:
+    def test_base_class_is_abstract(self):
+        with pytest.raises(TypeError):
+            SessionStore()
+
+    def test_round_trip(self, store):
+        created = datetime(2025, 1, 1, 12, 0)
+        store.create(SessionState(session_id="s1", user_id="u1", created_at=created, last_activity=created))
+        assert add_turn(store, "s1", "hello", "hi there", created + timedelta(minutes=1)) > 0
+        add_turn(store, "s1", "search ai", "found it", created + timedelta(minutes=2))
+
+        stored = store.load("s1")
+        assert stored.state.user_id == "u1"
+        assert stored.state.created_at == created
+        assert stored.state.last_activity == created + timedelta(minutes=2)
+        assert [m.content for m in stored.state.messages] == ["hello", "hi there", "search ai", "found it"]
+        assert len(stored.turns) == 2
+        assert stored.turns[1][1].parts[0].content == "found it"
+        assert "s1" in store
+        assert store.session_ids() == ["s1"]
+
+    def test_missing_session(self, store):
+        assert store.load("missing") is None
+        assert "missing" not in store
+        with pytest.raises(KeyError):
+            add_turn(store, "missing", "hello", "hi", datetime.now())
+
+    def test_delete(self, store):
+        store.create(SessionState(session_id="s1"))
+        store.delete("s1")
+        assert store.load("s1") is None
+        assert store.session_ids() == []
+        store.delete("s1")
+
+
+class TestLogSessionStore:
+    def test_partial_tail_is_ignored_and_truncated_before_append(self, tmp_path):
+        directory = str(tmp_path / "sessions")
+        store = LogSessionStore(directory)
+        store.create(SessionState(session_id="s1"))
+        add_turn(store, "s1", "one", "1", datetime.now())
+
+        # 模拟崩溃：长度前缀声明 100 字节，实际只写了 3 字节
+        path = tmp_path / "sessions" / "s1.log"
+        intact = path.stat().st_size
+        with open(path, "ab") as f:
+            f.write(LogSessionStore._LENGTH.pack(100) + b"abc")
+        assert len(store.load("s1").turns) == 1
+
+        # 新进程（新实例）第一次追加时截断半条记录，新记录紧接在完整记录之后
+        reopened = LogSessionStore(directory)
+        written = add_turn(reopened, "s1", "two", "2", datetime.now())
+        assert path.stat().st_size == intact + LogSessionStore._LENGTH.size + written
+
+        stored = reopened.load("s1")
+        assert [m.content for m in stored.state.messages] == ["one", "1", "two", "2"]
+
+    def test_undecodable_record_raises(self, tmp_path):
+        store = LogSessionStore(str(tmp_path / "sessions"))
+        store.create(SessionState(session_id="s1"))
+        payload = b"Xnot a record"
+        with open(tmp_path / "sessions" / "s1.log", "ab") as f:
+            f.write(LogSessionStore._LENGTH.pack(len(payload)) + payload)
+
+        with pytest.raises(SessionStoreCorruptedError):
+            store.load("s1")
+
+
+class TestSQLiteSessionStore:
+    def test_undecodable_record_raises(self, tmp_path):
+        path = str(tmp_path / "sessions.db")
+        store = SQLiteSessionStore(path)
+        store.create(SessionState(session_id="s1"))
+        add_turn(store, "s1", "one", "1", datetime.now())
+
+        conn = sqlite3.connect(path)
+        conn.execute("UPDATE session_turns SET payload = ?", (b"Jnot json",))
+        conn.commit()
+        conn.close()
+
+        try:
+            with pytest.raises(SessionStoreCorruptedError):
+                store.load("s1")
+        finally:
+            store.close()
@@ -0,0 +1,109 @@
+"""会话管理（空闲淘汰、常驻上限和字节上限）的行为测试"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from pydantic_ai.messages import ModelRequest, ModelResponse, TextPart, UserPromptPart
+
+from agents.session_store import SQLiteSessionStore
+from agents.sessions import SessionManager, SessionNotFoundError
+from agents.settings import get_settings
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / "sessions.db"))
+    yield store
+    store.close()
+
+
+def manager(store, **kwargs) -> SessionManager:
+    kwargs.setdefault("idle_seconds", 60)
+    return SessionManager(store=store, **kwargs)
+
+
+async def record(sessions: SessionManager, session, prompt: str, answer: str) -> None:
+    await sessions.record_turn(session, prompt, answer, [
+        ModelRequest(parts=[UserPromptPart(prompt)]),
+        ModelResponse(parts=[TextPart(answer)]),
+    ])
+
+
+class TestIdleEviction:
+    async def test_idle_sessions_are_evicted_and_reloaded(self, store):
+        sessions = manager(store)
+        idle = await sessions.create()
+        await record(sessions, idle, "hello", "hi")
+        active = await sessions.create()
+
+        now = datetime.now()
+        idle.state.last_activity = now - timedelta(seconds=120)
+        assert sessions.evict_idle(now) == 1
+        assert len(sessions) == 1
+        assert sessions.metrics()["idle_evictions"] == 1
+
+        restored = await sessions.get(idle.session_id)
+        assert restored is not idle
+        assert [m.content for m in restored.state.messages] == ["hello", "hi"]
+        assert restored.memory.turns == 1
+        assert sessions.loaded_sessions == 1
+        assert await sessions.get(active.session_id) is active
+
+    async def test_busy_sessions_are_not_evicted(self, store):
+        sessions = manager(store)
+        session = await sessions.create()
+        session.state.last_activity = datetime.now() - timedelta(hours=1)
+        async with session.lock:
+            assert sessions.evict_idle() == 0
+        assert sessions.evict_idle() == 1
+
+    async def test_without_store_nothing_is_evicted(self, monkeypatch):
+        monkeypatch.setattr(get_settings(), "session_store_backend", "none")
+        sessions = SessionManager(idle_seconds=1)
+        session = await sessions.create()
+        session.state.last_activity = datetime.now() - timedelta(hours=1)
+        assert sessions.evict_idle() == 0
+        assert await sessions.get(session.session_id) is session
+
+    async def test_concurrent_reloads_share_one_load(self, store):
+        sessions = manager(store)
+        session = await sessions.create()
+        session.state.last_activity = datetime.now() - timedelta(hours=1)
+        sessions.evict_idle()
+
+        first, second = await asyncio.gather(sessions.get(session.session_id), sessions.get(session.session_id))
+        assert first is second
+        assert sessions.loaded_sessions == 1
+
+    async def test_missing_session(self, store):
+        with pytest.raises(SessionNotFoundError):
+            await manager(store).get("0" * 32)
+
+
+class TestMemoryCaps:
+    async def test_least_recently_active_session_is_evicted(self, store):
+        sessions = manager(store, max_resident_sessions=2)
+        first = await sessions.create()
+        second = await sessions.create()
+        sessions.mark_active(first)
+        await sessions.create()
+
+        assert len(sessions) == 2
+        assert sessions.evicted_sessions == 1
+        assert second.session_id not in sessions._sessions
+        assert first.session_id in sessions._sessions
+
+    async def test_large_session_keeps_recent_chat_in_memory(self, store):
+        sessions = manager(store, max_session_bytes=1024, memory_max_tokens=10_000)
+        session = await sessions.create()
+        for n in range(4):
+            await record(sessions, session, f"question {n} " + "x" * 300, f"answer {n}")
+
+        assert session.trimmed_messages > 0
+        assert session.state.messages[-1].content == "answer 3"
+        assert len(session.state.messages) == 8 - session.trimmed_messages
+
+        full = await sessions.full_state(session)
+        assert len(full.messages) == 8
+        assert full.messages[0].content.startswith("question 0")
@@ -0,0 +1,86 @@
+"""请求合并（single-flight）的行为测试"""
+
+import asyncio
+
+import pytest
+
+from agents.tools import SingleFlight, search_web_results
+
+
+def upstream(result="value", delay: float = 0.02, error: Exception = None):
+    """构造记录调用次数的上游协程工厂。"""
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return result
+
+    return fn, calls
+
+
+class TestSingleFlight:
+    async def test_concurrent_calls_share_one_upstream_call(self):
+        flight = SingleFlight()
+        result = object()
+        fn, calls = upstream(result)
+
+        results = await asyncio.gather(*(flight.do("k", fn) for _ in range(5)))
+
+        assert len(calls) == 1
+        assert all(value is result for value in results)
+        assert flight.stats() == {"upstream_calls": 1, "coalesced_calls": 4, "in_flight": 0}
+
+    async def test_different_keys_are_not_coalesced(self):
+        flight = SingleFlight()
+        fn, calls = upstream()
+        await asyncio.gather(flight.do("a", fn), flight.do("b", fn))
+        assert len(calls) == 2
+
+    async def test_completed_calls_are_not_reused(self):
+        flight = SingleFlight()
+        fn, calls = upstream()
+        await flight.do("k", fn)
+        await flight.do("k", fn)
+        assert len(calls) == 2
+
+    async def test_errors_are_shared_then_forgotten(self):
+        flight = SingleFlight()
+        fn, calls = upstream(error=RuntimeError("boom"))
+
+        results = await asyncio.gather(*(flight.do("k", fn) for _ in range(3)), return_exceptions=True)
+        assert len(calls) == 1
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+        fn, calls = upstream("recovered")
+        assert await flight.do("k", fn) == "recovered"
+
+    async def test_cancelling_one_waiter_keeps_the_shared_call(self):
+        flight = SingleFlight()
+        fn, calls = upstream(delay=0.05)
+
+        first = asyncio.create_task(flight.do("k", fn))
+        second = asyncio.create_task(flight.do("k", fn))
+        await asyncio.sleep(0.01)
+        assert flight.in_flight == 1
+
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        assert await second == "value"
+        assert len(calls) == 1
+        assert flight.in_flight == 0
+
+
+class TestSearchCoalescing:
+    async def test_concurrent_identical_searches_hit_upstream_once(self, brave_server, search_kwargs):
+        brave_server.delay = 0.05
+        results = await asyncio.gather(*(
+            search_web_results(api_key="test-key", query=query, **search_kwargs)
+            for query in ("pydantic ai", "Pydantic AI", "pydantic ai")
+        ))
+        assert len(brave_server.requests) == 1
+        assert results[0] is results[1] is results[2]
+        assert search_kwargs["singleflight"].coalesced_calls == 2
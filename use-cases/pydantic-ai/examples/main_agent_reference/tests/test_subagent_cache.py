@@ -0,0 +1,129 @@
+"""子代理输出缓存（TTL、LRU 和并发合并）的行为测试"""
+
+import asyncio
+import time
+from dataclasses import dataclass
+
+import pytest
+from pydantic_ai import Agent
+from pydantic_ai.messages import ModelResponse, TextPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+from pydantic_ai.usage import Usage
+
+from agents.subagent_cache import SubAgentCache, make_subagent_key
+
+
+@dataclass
+class EmailDeps:
+    sender: str = "me@example.com"
+
+
+def counting_agent(delay: float = 0.0):
+    """构造记录运行次数的子代理，输出是带编号的草稿。"""
+    calls = []
+
+    async def respond(messages, info: AgentInfo) -> ModelResponse:
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return ModelResponse(parts=[TextPart(f"draft {len(calls)}")])
+
+    return Agent(FunctionModel(respond), name="email_agent"), calls
+
+
+class TestSubAgentKey:
+    def test_key_depends_on_name_prompt_and_deps(self):
+        key = make_subagent_key("email_agent", "prompt", EmailDeps())
+        assert make_subagent_key("email_agent", "prompt", EmailDeps()) == key
+        assert make_subagent_key("other_agent", "prompt", EmailDeps()) != key
+        assert make_subagent_key("email_agent", "prompt 2", EmailDeps()) != key
+        assert make_subagent_key("email_agent", "prompt", EmailDeps("you@example.com")) != key
+
+
+class TestSubAgentCache:
+    async def test_repeated_call_is_served_from_cache(self):
+        cache = SubAgentCache()
+        agent, calls = counting_agent()
+        parent_usage = Usage()
+
+        first = await cache.run(agent, "write", deps=EmailDeps(), usage=parent_usage)
+        second = await cache.run(agent, "write", deps=EmailDeps(), usage=parent_usage)
+
+        assert (first.output, first.cached) == ("draft 1", False)
+        assert (second.output, second.cached) == ("draft 1", True)
+        assert len(calls) == 1
+        # 父运行只计入实际运行的用量
+        assert parent_usage.requests == 1
+        assert cache.stats.hits == 1 and cache.stats.misses == 1
+        assert cache.stats.saved_requests == 1
+        assert cache.stats.saved_tokens == first.usage.total_tokens
+
+    async def test_entries_expire(self):
+        cache = SubAgentCache(ttl=0.05)
+        agent, calls = counting_agent()
+        await cache.run(agent, "write")
+        time.sleep(0.06)
+        result = await cache.run(agent, "write")
+        assert (result.output, result.cached) == ("draft 2", False)
+        assert len(calls) == 2
+
+    async def test_least_recently_used_entry_is_evicted(self):
+        cache = SubAgentCache(max_entries=2)
+        agent, calls = counting_agent()
+        await cache.run(agent, "a")
+        await cache.run(agent, "b")
+        await cache.run(agent, "a")
+        await cache.run(agent, "c")
+
+        assert len(cache) == 2
+        assert (await cache.run(agent, "a")).cached
+        assert not (await cache.run(agent, "b")).cached
+        assert len(calls) == 4
+
+    async def test_bypass_reruns_and_refreshes_entry(self):
+        cache = SubAgentCache()
+        agent, calls = counting_agent()
+        await cache.run(agent, "write")
+        refreshed = await cache.run(agent, "write", bypass=True)
+        assert (refreshed.output, refreshed.cached) == ("draft 2", False)
+        assert (await cache.run(agent, "write")).output == "draft 2"
+        assert cache.stats.bypassed == 1
+
+    async def test_concurrent_identical_calls_run_once(self):
+        cache = SubAgentCache()
+        agent, calls = counting_agent(delay=0.05)
+        first, second = await asyncio.gather(cache.run(agent, "write"), cache.run(agent, "write"))
+        assert len(calls) == 1
+        assert first.output == second.output == "draft 1"
+        assert [first.cached, second.cached].count(True) == 1
+        assert cache.stats.coalesced == 1
+
+    async def test_runner_replaces_agent_run(self):
+        cache = SubAgentCache()
+        agent, calls = counting_agent()
+
+        async def runner():
+            return "streamed draft", Usage(requests=1, request_tokens=10, response_tokens=5)
+
+        result = await cache.run(agent, "write", runner=runner)
+        assert result.output == "streamed draft"
+        assert calls == []
+        assert (await cache.run(agent, "write", runner=runner)).cached
+        assert cache.stats.saved_tokens == 15
+
+    async def test_failures_are_not_cached(self):
+        cache = SubAgentCache()
+        agent, _ = counting_agent()
+
+        async def failing():
+            raise RuntimeError("model down")
+
+        with pytest.raises(RuntimeError):
+            await cache.run(agent, "write", runner=failing)
+        assert len(cache) == 0
+
+    async def test_clear(self):
+        cache = SubAgentCache()
+        agent, _ = counting_agent()
+        await cache.run(agent, "write")
+        cache.clear()
+        assert len(cache) == 0
@@ -0,0 +1,126 @@
+"""工具执行模式和每次运行并发上限的行为测试
+
+模型由 FunctionModel 代替：第一次响应同时发出多个工具调用，第二次返回文本。
+"""
+
+import asyncio
+import gc
+from dataclasses import dataclass
+
+import pytest
+from pydantic_ai import Agent, RunContext
+from pydantic_ai.messages import ModelResponse, TextPart, ToolCallPart, ToolReturnPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+from agents.tool_execution import ToolConcurrencyLimiter
+
+
+@dataclass
+class Deps:
+    name: str = "run"
+
+
+def fan_out_model(calls: int) -> FunctionModel:
+    def respond(messages, info: AgentInfo) -> ModelResponse:
+        if len(messages) == 1:
+            return ModelResponse(parts=[
+                ToolCallPart("slow_tool", {"n": n}, tool_call_id=f"call-{n}") for n in range(calls)
+            ])
+        return ModelResponse(parts=[TextPart("finished")])
+
+    return FunctionModel(respond)
+
+
+def build_agent(limiter: ToolConcurrencyLimiter, deps_type=Deps, delays=None):
+    order = []
+
+    async def slow_tool(ctx: RunContext, n: int) -> str:
+        """Sleep briefly and echo n."""
+        await asyncio.sleep((delays or {}).get(n, 0.02))
+        order.append(n)
+        return f"done {n}"
+
+    agent = Agent(fan_out_model(6), deps_type=deps_type)
+    agent.tool(limiter.wrap(slow_tool))
+    return agent, order
+
+
+class TestToolConcurrencyLimiter:
+    async def test_parallel_calls_are_capped_per_run(self):
+        limiter = ToolConcurrencyLimiter("parallel", max_concurrency=2)
+        agent, order = build_agent(limiter)
+        result = await agent.run("go", deps=Deps())
+        assert result.output == "finished"
+        assert limiter.stats() == {"mode": "parallel", "limit": 2, "calls": 6, "active": 0, "peak": 2}
+        assert sorted(order) == list(range(6))
+
+    async def test_sequential_mode_runs_in_call_order(self):
+        limiter = ToolConcurrencyLimiter("sequential")
+        agent, order = build_agent(limiter)
+        await agent.run("go", deps=Deps())
+        assert limiter.peak == 1
+        assert order == list(range(6))
+
+    async def test_results_keep_call_order(self):
+        limiter = ToolConcurrencyLimiter("parallel", max_concurrency=6)
+        # 先调用的工具最慢，按完成顺序是倒序
+        agent, order = build_agent(limiter, delays={n: 0.05 - 0.008 * n for n in range(6)})
+        result = await agent.run("go", deps=Deps())
+        assert order == list(reversed(range(6)))
+        returns = [
+            part.tool_call_id for message in result.all_messages() for part in message.parts
+            if isinstance(part, ToolReturnPart)
+        ]
+        assert returns == [f"call-{n}" for n in range(6)]
+
+    async def test_runs_do_not_share_a_limit(self):
+        limiter = ToolConcurrencyLimiter("parallel", max_concurrency=2)
+        agent, _ = build_agent(limiter)
+        await asyncio.gather(agent.run("go", deps=Deps()), agent.run("go", deps=Deps()))
+        assert limiter.peak == 4
+
+    @pytest.mark.parametrize("deps", [None, "config"], ids=["none", "str"])
+    async def test_deps_without_weak_references(self, deps):
+        limiter = ToolConcurrencyLimiter("parallel", max_concurrency=2)
+        agent, _ = build_agent(limiter, deps_type=type(deps))
+        await asyncio.gather(agent.run("go", deps=deps), agent.run("go", deps=deps))
+        # 每次运行以各自的 usage 对象区分
+        assert limiter.peak == 4
+
+    async def test_semaphores_are_released_with_the_run(self):
+        limiter = ToolConcurrencyLimiter("parallel", max_concurrency=2)
+        agent, _ = build_agent(limiter)
+        await agent.run("go", deps=Deps())
+        gc.collect()
+        assert limiter._semaphores == {}
+
+    async def test_plain_tools_share_a_process_limit(self):
+        limiter = ToolConcurrencyLimiter("parallel", max_concurrency=1)
+        active = []
+
+        async def plain(n: int) -> int:
+            active.append(n)
+            await asyncio.sleep(0.01)
+            assert active == [n]
+            active.remove(n)
+            return n
+
+        wrapped = limiter.wrap(plain)
+        assert await asyncio.gather(*(wrapped(n) for n in range(3))) == [0, 1, 2]
+        assert limiter.peak == 1
+
+    async def test_sync_tools_run_in_a_thread(self):
+        limiter = ToolConcurrencyLimiter()
+
+        def add(a: int, b: int) -> int:
+            """Add two numbers."""
+            return a + b
+
+        wrapped = limiter.wrap(add)
+        assert wrapped.__doc__ == "Add two numbers."
+        assert await wrapped(2, 3) == 5
+
+    @pytest.mark.parametrize("kwargs", [{"mode": "burst"}, {"max_concurrency": 0}])
+    def test_invalid_configuration(self, kwargs):
+        with pytest.raises(ValueError):
+            ToolConcurrencyLimiter(**kwargs)
@@ -0,0 +1,114 @@
+"""
+代理工具的执行模式和并发上限。
+
+模型在一次响应中发出多个工具调用时，pydantic-ai 会为每个调用创建任务并
+按完成顺序产生 FunctionToolResultEvent，但写回消息历史时仍按调用顺序排列，
+因此结果顺序是确定的。ToolConcurrencyLimiter 为同一个代理的工具加上并发上限：
+
+- parallel：每次运行最多同时执行 max_concurrency 个工具调用
+- sequential：每次运行内按调用顺序逐个执行
+
+上限按运行计算（以运行的 deps 对象区分），多个会话共用同一个代理实例时
+互不等待；不接收 RunContext 的工具（tool_plain）退回进程级共享的上限。
+"""
+
+import asyncio
+import functools
+import inspect
+import logging
+import weakref
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from pydantic_ai import RunContext
+
+logger = logging.getLogger(__name__)
+
+TOOL_EXECUTION_MODES = ("parallel", "sequential")
+
+
+class ToolConcurrencyLimiter:
+    """同一个代理的工具使用的并发限制器，每次运行各自计数。"""
+
+    def __init__(self, mode: str = "parallel", max_concurrency: int = 4):
+        """
+        Args:
+            mode: "parallel" 或 "sequential"
+            max_concurrency: parallel 模式下每次运行同时执行的工具调用上限
+        """
+        if mode not in TOOL_EXECUTION_MODES:
+            raise ValueError(f"Unknown tool execution mode: {mode}")
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+
+        self.mode = mode
+        self.limit = 1 if mode == "sequential" else max_concurrency
+        # 运行标识（deps 对象的 id，None 表示进程级共享）-> (事件循环, 信号量)
+        self._semaphores: Dict[Optional[int], Tuple[asyncio.AbstractEventLoop, asyncio.Semaphore]] = {}
+        self.active = 0
+        self.peak = 0
+        self.calls = 0
+
+    @staticmethod
+    def _run_owner(args: Tuple[Any, ...]) -> Any:
+        """取出标识本次运行的对象：RunContext 的 deps，不支持弱引用时用本次运行的 usage。"""
+        if not args or not isinstance(args[0], RunContext):
+            return None
+        ctx = args[0]
+        try:
+            weakref.ref(ctx.deps)
+            return ctx.deps
+        except TypeError:
+            return ctx.usage
+
+    def _get_semaphore(self, owner: Any = None) -> asyncio.Semaphore:
+        """获取该运行绑定到当前事件循环的信号量，按 FIFO 顺序放行等待的调用。"""
+        loop = asyncio.get_running_loop()
+        key = None if owner is None else id(owner)
+        entry = self._semaphores.get(key)
+        if entry is None or entry[0] is not loop:
+            if entry is None and owner is not None:
+                # 运行结束、deps 被回收时丢弃它的信号量
+                weakref.finalize(owner, self._semaphores.pop, key, None)
+            entry = (loop, asyncio.Semaphore(self.limit))
+            self._semaphores[key] = entry
+        return entry[1]
+
+    def wrap(self, function: Callable[..., Any]) -> Callable[..., Any]:
+        """
+        包装工具函数，使其在执行前获取本次运行的执行槽位。
+
+        包装后的函数保留原函数的签名、类型注解和文档字符串，
+        pydantic-ai 据此生成的工具模式与原函数相同。同步函数在线程中执行。
+
+        Args:
+            function: 工具函数（同步或异步）
+
+        Returns:
+            异步的包装函数
+        """
+        is_async = inspect.iscoroutinefunction(function)
+
+        @functools.wraps(function)
+        async def limited(*args, **kwargs):
+            async with self._get_semaphore(self._run_owner(args)):
+                self.calls += 1
+                self.active += 1
+                self.peak = max(self.peak, self.active)
+                try:
+                    if is_async:
+                        return await function(*args, **kwargs)
+                    return await asyncio.to_thread(functools.partial(function, *args, **kwargs))
+                finally:
+                    self.active -= 1
+
+        return limited
+
+    def stats(self) -> Dict[str, Any]:
+        """返回执行模式和并发统计（跨所有运行累计）。"""
+        return {
+            "mode": self.mode,
+            "limit": self.limit,
+            "calls": self.calls,
+            "active": self.active,
+            "peak": self.peak,
+        }
@@ -3,27 +3,117 @@
 
 import os
 import base64
+import asyncio
 import logging
 import httpx
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator, Awaitable, Callable, TypeVar
 from datetime import datetime
+from urllib.parse import urlsplit, urlunsplit
 
-from agents.models import BraveSearchResult
+from agents.models import BraveSearchResult, SearchHit, SearchResults, position_score
+from agents.http_client import HTTPClientPool, get_http_pool
+from agents.cache import SearchCache, get_search_cache, make_search_key
+from agents.rate_limit import (
+    RateLimitExceeded,
+    RetryPolicy,
+    TokenBucket,
+    get_brave_rate_limiter,
+    get_brave_retry_policy,
+    send_with_retry,
+)
+from agents.settings import settings
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    合并并发的相同请求（single-flight）。
+
+    同一键的请求在进行中时，后续调用方不会再发起上游请求，
+    而是等待并共享第一个请求的结果或异常。
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, "asyncio.Future[Any]"] = {}
+        self.upstream_calls = 0
+        self.coalesced_calls = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        执行 fn，或等待同一键正在进行的调用。
+
+        Args:
+            key: 请求的去重键
+            fn: 发起上游请求的协程工厂
+
+        Returns:
+            上游请求的结果（所有等待者共享同一个对象）
+        """
+        task = self._inflight.get(key)
+
+        if task is not None and not task.done():
+            self.coalesced_calls += 1
+            logger.debug(f"Coalesced in-flight request: {key}")
+        else:
+            self.upstream_calls += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done, key=key: self._forget(key, done))
+
+        # shield 保证某个等待者被取消时不会取消其他等待者共享的请求
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: "asyncio.Future[Any]") -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 避免所有等待者都已取消时出现 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
+
+    @property
+    def in_flight(self) -> int:
+        """当前进行中的上游请求数。"""
+        return len(self._inflight)
+
+    def stats(self) -> Dict[str, int]:
+        """返回请求合并指标。"""
+        return {
+            "upstream_calls": self.upstream_calls,
+            "coalesced_calls": self.coalesced_calls,
+            "in_flight": self.in_flight
+        }
+
+
+# 进程级共享的搜索请求合并层
+_search_singleflight = SingleFlight()
+
+
+def get_search_singleflight() -> SingleFlight:
+    """获取所有代理运行共享的搜索请求合并层。"""
+    return _search_singleflight
+
 
 # Brave 搜索工具函数
-async def search_web_tool(
+async def search_web_results(
     api_key: str,
     query: str,
     count: int = 10,
     offset: int = 0,
     country: Optional[str] = None,
-    lang: Optional[str] = None
-) -> List[Dict[str, Any]]:
+    lang: Optional[str] = None,
+    pool: Optional[HTTPClientPool] = None,
+    cache: Optional[SearchCache] = None,
+    use_cache: bool = True,
+    limiter: Optional[TokenBucket] = None,
+    retry_policy: Optional[RetryPolicy] = None,
+    base_url: Optional[str] = None,
+    singleflight: Optional[SingleFlight] = None
+) -> SearchResults:
     """
-    使用 Brave 搜索 API 搜索网络的纯函数。
+    使用 Brave 搜索 API 搜索网络，返回紧凑的列式结果容器。
     
     Args:
         api_key: Brave 搜索 API 密钥
@@ -32,12 +122,20 @@ async def search_web_tool(
         offset: 分页偏移量
         country: 本地化结果的国家代码
         lang: 结果的语言代码
+        pool: 可选的 HTTP 连接池（默认使用进程级共享连接池）
+        cache: 可选的搜索结果缓存（默认使用根据设置创建的共享缓存）
+        use_cache: 为 False 时跳过缓存读取，强制请求 API
+        limiter: 可选的速率限制器（默认使用所有代理运行共享的限制器）
+        retry_policy: 可选的 429/5xx 重试策略（默认根据设置创建）
+        base_url: 可选的 API 地址覆盖（例如用于本地桩服务器测试）
+        singleflight: 可选的请求合并层（默认使用进程级共享实例）
         
     Returns:
-        搜索结果的字典列表
+        SearchResults 结果容器（可能来自缓存，应视为只读）
         
     Raises:
         ValueError: 如果查询为空或缺少 API 密钥
+        RateLimitExceeded: 如果重试后仍被限流
         Exception: 如果 API 请求失败
     """
     if not api_key or not api_key.strip():
@@ -65,54 +163,284 @@ async def search_web_tool(
     if lang:
         params["lang"] = lang
     
-    logger.info(f"Searching Brave for: {query}")
+    if cache is None:
+        cache = get_search_cache()
+    url = base_url or settings.brave_search_url
+    cache_key = make_search_key(query, count, offset, country, lang, endpoint=url, api_key=api_key)
     
-    async with httpx.AsyncClient() as client:
+    if cache is not None and use_cache:
+        cached = await cache.aget(cache_key)
+        if cached is not None:
+            logger.info(f"Search cache hit for query: {query}")
+            return cached
+    
+    pool = pool or get_http_pool()
+    limiter = limiter or get_brave_rate_limiter()
+    retry_policy = retry_policy or get_brave_retry_policy()
+    singleflight = singleflight or get_search_singleflight()
+
+    async def fetch() -> SearchResults:
+        logger.info(f"Searching Brave for: {query}")
+        
         try:
-            response = await client.get(
-                "https://api.search.brave.com/res/v1/web/search",
-                headers=headers,
-                params=params,
-                timeout=30.0
+            response = await send_with_retry(
+                lambda: pool.get(url, headers=headers, params=params),
+                limiter=limiter,
+                policy=retry_policy
             )
-            
-            # 处理速率限制
+        
+            # 处理重试后仍然存在的速率限制
             if response.status_code == 429:
-                raise Exception("Rate limit exceeded. Check your Brave API quota.")
-            
+                raise RateLimitExceeded("Rate limit exceeded. Check your Brave API quota.")
+        
             # 处理身份验证错误
             if response.status_code == 401:
                 raise Exception("Invalid Brave API key")
-            
+        
             # 处理其他错误
             if response.status_code != 200:
                 raise Exception(f"Brave API returned {response.status_code}: {response.text}")
-            
-            data = response.json()
-            
-            # 提取网络结果
-            web_results = data.get("web", {}).get("results", [])
-            
-            # 转换为我们的格式
-            results = []
-            for idx, result in enumerate(web_results):
-                # 基于位置计算简单的相关性评分
-                score = 1.0 - (idx * 0.05)  # 每个位置减少 0.05
-                score = max(score, 0.1)  # 最低评分为 0.1
-                
-                results.append({
-                    "title": result.get("title", ""),
-                    "url": result.get("url", ""),
-                    "description": result.get("description", ""),
-                    "score": score
-                })
-            
+        
+            # 直接从响应字节解析一次，不为每个结果构建字典
+            results = SearchResults.from_brave_response(response.content)
+        
             logger.info(f"Found {len(results)} results for query: {query}")
+        
+            if cache is not None:
+                await cache.aset(cache_key, results)
+        
             return results
-            
+        
         except httpx.RequestError as e:
             logger.error(f"Request error during Brave search: {e}")
             raise Exception(f"Request failed: {str(e)}")
         except Exception as e:
             logger.error(f"Error during Brave search: {e}")
             raise
+    
+    # 相同的并发请求共享同一个上游调用
+    return await singleflight.do(cache_key, fetch)
+
+
+async def search_web_tool(
+    api_key: str,
+    query: str,
+    count: int = 10,
+    offset: int = 0,
+    country: Optional[str] = None,
+    lang: Optional[str] = None,
+    **search_kwargs: Any
+) -> List[Dict[str, Any]]:
+    """
+    使用 Brave 搜索 API 搜索网络的纯函数。
+    
+    Args:
+        api_key: Brave 搜索 API 密钥
+        query: 搜索查询
+        count: 返回的结果数（1-20）
+        offset: 分页偏移量
+        country: 本地化结果的国家代码
+        lang: 结果的语言代码
+        **search_kwargs: 传递给 search_web_results 的其他参数
+        
+    Returns:
+        搜索结果的字典列表
+    """
+    results = await search_web_results(
+        api_key=api_key,
+        query=query,
+        count=count,
+        offset=offset,
+        country=country,
+        lang=lang,
+        **search_kwargs
+    )
+    return results.to_dicts()
+
+
+def _normalize_url(url: str) -> str:
+    """规范化 URL 以便去重：忽略协议/主机大小写、片段和末尾斜杠。"""
+    parts = urlsplit(url.strip())
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, parts.query, ""))
+
+
+async def search_web_tool_batch(
+    api_key: str,
+    queries: List[str],
+    count: int = 10,
+    country: Optional[str] = None,
+    lang: Optional[str] = None,
+    max_concurrency: Optional[int] = None,
+    max_results: Optional[int] = None,
+    **search_kwargs: Any
+) -> List[Dict[str, Any]]:
+    """
+    并发执行多个 Brave 搜索，并合并为按 URL 去重、重新评分的结果列表。
+    
+    同一 URL 出现在多个查询中时，评分按概率或（1 - ∏(1 - score)）合并，
+    因此被多个查询命中的结果排名更靠前。
+    
+    Args:
+        api_key: Brave 搜索 API 密钥
+        queries: 搜索查询列表（重复查询只执行一次）
+        count: 每个查询返回的结果数（1-20）
+        country: 本地化结果的国家代码
+        lang: 结果的语言代码
+        max_concurrency: 最大并发查询数（默认使用设置中的值）
+        max_results: 合并后返回的最大结果数
+        **search_kwargs: 传递给 search_web_results 的其他参数
+        
+    Returns:
+        合并后的搜索结果字典列表，每项包含命中的查询列表 "queries"
+        
+    Raises:
+        ValueError: 如果没有提供有效查询
+        Exception: 如果所有查询都失败
+    """
+    # 去除空查询和重复查询，保持原始顺序
+    unique_queries: List[str] = []
+    seen_queries = set()
+    for query in queries:
+        key = " ".join(query.split()).casefold() if query else ""
+        if key and key not in seen_queries:
+            seen_queries.add(key)
+            unique_queries.append(query)
+    
+    if not unique_queries:
+        raise ValueError("At least one non-empty query is required")
+    
+    semaphore = asyncio.Semaphore(max_concurrency or settings.search_batch_max_concurrency)
+    
+    async def run_query(query: str) -> SearchResults:
+        async with semaphore:
+            return await search_web_results(
+                api_key=api_key,
+                query=query,
+                count=count,
+                country=country,
+                lang=lang,
+                **search_kwargs
+            )
+    
+    outcomes = await asyncio.gather(
+        *(run_query(query) for query in unique_queries),
+        return_exceptions=True
+    )
+    
+    merged: Dict[str, Dict[str, Any]] = {}
+    errors = []
+    for query, outcome in zip(unique_queries, outcomes):
+        if isinstance(outcome, BaseException):
+            logger.error(f"Batch search failed for query '{query}': {outcome}")
+            errors.append(outcome)
+            continue
+        
+        for hit in outcome:
+            url_key = _normalize_url(hit.url)
+            existing = merged.get(url_key)
+            
+            if existing is None:
+                merged[url_key] = {**hit._asdict(), "queries": [query]}
+            else:
+                existing["score"] = 1.0 - (1.0 - existing["score"]) * (1.0 - hit.score)
+                existing["queries"].append(query)
+                if not existing["description"] and hit.description:
+                    existing["description"] = hit.description
+    
+    if errors and len(errors) == len(unique_queries):
+        raise errors[0]
+    
+    results = sorted(merged.values(), key=lambda item: item["score"], reverse=True)
+    if max_results is not None:
+        results = results[:max_results]
+    
+    logger.info(
+        f"Batch search merged {len(results)} unique results from {len(unique_queries)} queries"
+    )
+    return results
+
+
+# Brave 的 offset 以页为单位，最大值为 9
+BRAVE_MAX_PAGES = 10
+
+
+async def iter_search_results(
+    api_key: str,
+    query: str,
+    page_size: int = 20,
+    max_pages: int = BRAVE_MAX_PAGES,
+    max_results: Optional[int] = None,
+    stop_when: Optional[Callable[[SearchHit], bool]] = None,
+    prefetch: bool = True,
+    **search_kwargs: Any
+) -> AsyncIterator[SearchHit]:
+    """
+    逐页惰性获取 Brave 搜索结果的异步生成器。
+    
+    调用方消费当前页时会在后台预取下一页；达到 max_results 预算、
+    stop_when 返回 True 或结果耗尽时立即停止，不再请求后续页面。
+    提前 break 时请使用 contextlib.aclosing 包装，以便及时取消预取请求。
+    
+    Args:
+        api_key: Brave 搜索 API 密钥
+        query: 搜索查询
+        page_size: 每页结果数（1-20）
+        max_pages: 最多获取的页数（Brave 最多 10 页）
+        max_results: 最多产出的结果数
+        stop_when: 对每个结果调用的谓词，返回 True 时在产出该结果后停止
+        prefetch: 是否在消费当前页时预取下一页
+        **search_kwargs: 传递给 search_web_results 的其他参数
+        
+    Yields:
+        按全局排名重新评分的 SearchHit
+    """
+    page_size = min(max(page_size, 1), 20)
+    max_pages = min(max(max_pages, 1), BRAVE_MAX_PAGES)
+    
+    def fetch(page: int) -> "asyncio.Task[SearchResults]":
+        return asyncio.create_task(
+            search_web_results(
+                api_key=api_key,
+                query=query,
+                count=page_size,
+                offset=page,
+                **search_kwargs
+            )
+        )
+    
+    yielded = 0
+    next_task: Optional[asyncio.Task] = fetch(0)
+    
+    try:
+        for page in range(max_pages):
+            results = await next_task
+            next_task = None
+            
+            has_more = len(results) >= page_size and page + 1 < max_pages
+            within_budget = max_results is None or yielded + len(results) < max_results
+            if prefetch and has_more and within_budget:
+                next_task = fetch(page + 1)
+            
+            for hit in results:
+                # 按全局排名重新计算评分，使跨页评分保持单调
+                hit = hit._replace(score=position_score(yielded))
+                yield hit
+                yielded += 1
+                
+                if max_results is not None and yielded >= max_results:
+                    return
+                if stop_when is not None and stop_when(hit):
+                    return
+            
+            if not has_more:
+                return
+            if next_task is None:
+                next_task = fetch(page + 1)
+    finally:
+        if next_task is not None and not next_task.done():
+            next_task.cancel()
+            try:
+                await next_task
+            except (asyncio.CancelledError, Exception):
+                pass
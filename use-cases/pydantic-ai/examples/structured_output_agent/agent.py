@@ -7,18 +7,27 @@
 - 具有一致格式的专业报告生成
 """
 
+import asyncio
+import atexit
+import itertools
 import logging
-from dataclasses import dataclass
-from typing import Optional, List
+import os
+import threading
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, List, Tuple, Union, TYPE_CHECKING
 from pydantic_settings import BaseSettings
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from pydantic_ai import Agent, RunContext
-from pydantic_ai.providers.openai import OpenAIProvider
-from pydantic_ai.models.openai import OpenAIModel
 from dotenv import load_dotenv
 
-# 加载环境变量
-load_dotenv()
+from numeric_stats import format_summary, summarize
+from online_stats import OnlineStats
+from data_ingest import DataIngestError, format_profile, profile_file
+from report_validation import cached_type_adapter, repair_insight, validate_with_repair
+
+if TYPE_CHECKING:
+    from pydantic_ai.models.openai import OpenAIModel
 
 logger = logging.getLogger(__name__)
 
@@ -37,8 +46,14 @@ class Settings(BaseSettings):
         case_sensitive = False
 
 
-def get_llm_model() -> OpenAIModel:
+def get_llm_model() -> "OpenAIModel":
     """从环境设置获取配置的 LLM 模型。"""
+    # 延迟导入 OpenAI SDK 并加载环境变量，只有真正构建代理时才付出这部分开销
+    from pydantic_ai.providers.openai import OpenAIProvider
+    from pydantic_ai.models.openai import OpenAIModel
+    
+    load_dotenv()
+    
     try:
         settings = Settings()
         provider = OpenAIProvider(
@@ -48,7 +63,6 @@ def get_llm_model() -> OpenAIModel:
         return OpenAIModel(settings.llm_model, provider=provider)
     except Exception:
         # 用于在没有环境变量的情况下测试
-        import os
         os.environ.setdefault("LLM_API_KEY", "test-key")
         settings = Settings()
         provider = OpenAIProvider(
@@ -64,6 +78,10 @@ class AnalysisDependencies:
     report_format: str = "business"  # business, technical, academic
     include_recommendations: bool = True
     session_id: Optional[str] = None
+    # 数据文件工具只能读取该目录下的文件；为 None 时限制在当前工作目录
+    data_root: Optional[str] = None
+    # 分块追加的数值流：stream_id -> (数据描述, 增量聚合器)
+    numeric_streams: Dict[str, Tuple[str, OnlineStats]] = field(default_factory=dict)
 
 
 class DataInsight(BaseModel):
@@ -72,6 +90,12 @@ class DataInsight(BaseModel):
     confidence: float = Field(ge=0.0, le=1.0, description="对此洞察的置信度")
     data_points: List[str] = Field(description="支持的数据点")
 
+    @model_validator(mode="before")
+    @classmethod
+    def _repair_near_misses(cls, data: Any) -> Any:
+        """校验前在本地修正越界置信度等格式偏差（单独校验洞察时使用）。"""
+        return repair_insight(data)[0]
+
 
 class DataAnalysisReport(BaseModel):
     """带验证的数据分析结构化输出。"""
@@ -108,6 +132,28 @@ class DataAnalysisReport(BaseModel):
     analysis_type: str = Field(description="执行的分析类型")
     data_sources: List[str] = Field(description="分析的数据源")
 
+    @model_validator(mode="wrap")
+    @classmethod
+    def _repair_near_misses(cls, data: Any, handler):
+        """校验前在本地修正常见格式偏差，避免为此让模型重试（见 report_validation）。"""
+        return validate_with_repair(data, handler)
+
+
+def parse_report(data: Union[str, bytes, Dict[str, Any]]) -> DataAnalysisReport:
+    """
+    在本地校验模型原始输出或已保存的报告，复用缓存的校验器并应用同样的修复。
+    
+    Args:
+        data: JSON 文本或字典
+    
+    Returns:
+        校验后的 DataAnalysisReport
+    """
+    adapter = cached_type_adapter(DataAnalysisReport)
+    if isinstance(data, (str, bytes)):
+        return adapter.validate_json(data)
+    return adapter.validate_python(data)
+
 
 SYSTEM_PROMPT = """
 您是一位专业的数据分析师，专门从各种数据源中提取结构化洞察。
@@ -128,27 +174,21 @@ SYSTEM_PROMPT = """
 """
 
 
-# 创建结构化输出代理 - 注意：为数据验证指定了 result_type
-structured_agent = Agent(
-    get_llm_model(),
-    deps_type=AnalysisDependencies,
-    result_type=DataAnalysisReport,  # 这是我们确实需要结构化输出的时候
-    system_prompt=SYSTEM_PROMPT
-)
-
-
-@structured_agent.tool
 def analyze_numerical_data(
     ctx: RunContext[AnalysisDependencies],
     data_description: str,
-    numbers: List[float]
+    numbers: List[float],
+    window: Optional[int] = None,
+    outlier_method: str = "iqr"
 ) -> str:
     """
-    分析数值数据并提供统计洞察。
+    分析数值数据并提供统计洞察：百分位数、回归趋势、滚动均值和离群值。
     
     Args:
         data_description: 数字代表什么的描述
-        numbers: 要分析的数值列表
+        numbers: 要分析的数值列表（按时间或顺序排列）
+        window: 滚动均值的窗口大小，默认为数据点数的十分之一
+        outlier_method: 离群值检测方法，"iqr" 或 "zscore"
     
     Returns:
         统计分析摘要
@@ -157,41 +197,180 @@ def analyze_numerical_data(
         if not numbers:
             return "未提供数值数据进行分析。"
         
-        # 基本统计计算
-        count = len(numbers)
-        total = sum(numbers)
-        average = total / count
-        minimum = min(numbers)
-        maximum = max(numbers)
-        
-        # 计算方差和标准差
-        variance = sum((x - average) ** 2 for x in numbers) / count
-        std_dev = variance ** 0.5
+        # 一次计算所有统计量；有 NumPy 时向量化，否则使用纯 Python 后端
+        summary = summarize(numbers, window=window, outlier_method=outlier_method)
         
-        # 简单趋势分析
-        if count > 1:
-            trend = "递增" if numbers[-1] > numbers[0] else "递减"
-        else:
-            trend = "数据不足"
-        
-        analysis = f"""
-{data_description} 的统计分析：
-- 计数：{count} 个数据点
-- 平均值：{average:.2f}
-- 范围：{minimum:.2f} 到 {maximum:.2f}  
-- 标准差：{std_dev:.2f}
-- 整体趋势：{trend}
-- 数据质量：{'良好' if std_dev < average * 0.5 else '变化较大'}
-"""
-        
-        logger.info(f"已分析 {count} 个数据点，用于：{data_description}")
-        return analysis.strip()
+        logger.info(f"已分析 {summary.count} 个数据点（{summary.backend}），用于：{data_description}")
+        return format_summary(data_description, summary)
         
     except Exception as e:
         logger.error(f"数值分析错误：{e}")
         return f"分析数值数据时出错：{str(e)}"
 
 
+_stream_ids = itertools.count(1)
+
+
+def start_numeric_stream(
+    ctx: RunContext[AnalysisDependencies],
+    data_description: str,
+    window: Optional[int] = None
+) -> str:
+    """
+    开始一个分块数值流，用于数据太多、无法放进一次工具调用的情况。
+    之后用 append_numbers 分批追加数值，最后用 finish_numeric_stream 获取统计分析。
+    
+    Args:
+        data_description: 数字代表什么的描述
+        window: 滚动均值的窗口大小，省略时不计算滚动均值
+    
+    Returns:
+        数值流的 ID
+    """
+    stream_id = f"stream-{next(_stream_ids)}"
+    ctx.deps.numeric_streams[stream_id] = (data_description, OnlineStats(window=window))
+    return stream_id
+
+
+def append_numbers(
+    ctx: RunContext[AnalysisDependencies],
+    stream_id: str,
+    numbers: List[float]
+) -> str:
+    """
+    向分块数值流追加一批数值（按原始顺序）。
+    
+    Args:
+        stream_id: start_numeric_stream 返回的 ID
+        numbers: 本批数值
+    
+    Returns:
+        已接收数量的确认
+    """
+    stream = ctx.deps.numeric_streams.get(stream_id)
+    if stream is None:
+        return f"未知的数值流：{stream_id}"
+    _, stats = stream
+    stats.update_many(numbers)
+    return f"已接收 {len(numbers)} 个数值，累计 {stats.count} 个。"
+
+
+def finish_numeric_stream(
+    ctx: RunContext[AnalysisDependencies],
+    stream_id: str,
+    outlier_method: str = "iqr"
+) -> str:
+    """
+    结束分块数值流并返回统计分析（百分位数为近似值）。
+    
+    Args:
+        stream_id: start_numeric_stream 返回的 ID
+        outlier_method: 离群值检测方法，"iqr" 或 "zscore"
+    
+    Returns:
+        统计分析摘要
+    """
+    stream = ctx.deps.numeric_streams.pop(stream_id, None)
+    if stream is None:
+        return f"未知的数值流：{stream_id}"
+    data_description, stats = stream
+    try:
+        summary = stats.summary(outlier_method=outlier_method)
+        logger.info(f"已流式分析 {summary.count} 个数据点，用于：{data_description}")
+        return format_summary(data_description, summary)
+    except Exception as e:
+        logger.error(f"数值分析错误：{e}")
+        return f"分析数值数据时出错：{str(e)}"
+
+
+def resolve_data_path(path: str, data_root: Optional[str]) -> Path:
+    """
+    解析数据文件路径，拒绝数据目录之外的路径。
+    
+    analyze_data_file 由模型调用，不能让它读取机器上的任意文件（列的常见值会进入提示），
+    因此没有设置 data_root 时限制在当前工作目录。
+    """
+    root = Path(data_root if data_root is not None else os.getcwd()).expanduser().resolve()
+    resolved = (root / path).resolve()
+    if resolved != root and root not in resolved.parents:
+        raise DataIngestError(f"Path is outside the data directory: {path}")
+    return resolved
+
+
+def analyze_data_file(
+    ctx: RunContext[AnalysisDependencies],
+    path: str,
+    columns: Optional[List[str]] = None,
+    detail_column: Optional[str] = None
+) -> str:
+    """
+    在本地读取 CSV / JSONL / Parquet 数据文件并返回每列的紧凑统计画像，
+    原始数据不会进入对话。需要某个数值列的完整统计时指定 detail_column。
+    
+    Args:
+        path: 数据文件路径
+        columns: 只分析这些列，默认全部
+        detail_column: 额外返回该数值列的详细统计（百分位数、趋势、滚动均值、离群值）
+    
+    Returns:
+        数据文件画像摘要
+    """
+    try:
+        resolved = resolve_data_path(path, ctx.deps.data_root)
+        profile = profile_file(resolved, columns=columns)
+        logger.info(f"已在本地分析 {profile.rows} 行数据：{resolved.name}")
+        
+        text = format_profile(profile)
+        if detail_column:
+            column = profile.columns.get(detail_column)
+            if column is None or not column.is_numeric:
+                text += f"\n\n列 {detail_column} 不存在或不是数值列。"
+            else:
+                text += "\n\n" + format_summary(detail_column, column.numeric.summary())
+        return text
+        
+    except DataIngestError as e:
+        return f"无法读取数据文件：{e}"
+    except Exception as e:
+        logger.error(f"数据文件分析错误：{e}")
+        return f"分析数据文件时出错：{str(e)}"
+
+
+_structured_agent: Optional[Agent] = None
+
+
+def get_structured_agent() -> Agent:
+    """
+    获取结构化输出代理，首次使用时才构建（包括加载设置和创建模型），之后复用。
+    
+    Returns:
+        输出 DataAnalysisReport 的代理
+    """
+    global _structured_agent
+    if _structured_agent is None:
+        # 创建结构化输出代理 - 注意：为数据验证指定了 result_type
+        agent = Agent(
+            get_llm_model(),
+            deps_type=AnalysisDependencies,
+            result_type=DataAnalysisReport,  # 这是我们确实需要结构化输出的时候
+            system_prompt=SYSTEM_PROMPT
+        )
+        agent.tool(analyze_numerical_data)
+        agent.tool(start_numeric_stream)
+        agent.tool(append_numbers)
+        agent.tool(finish_numeric_stream)
+        agent.tool(analyze_data_file)
+        _structured_agent = agent
+    return _structured_agent
+
+
+def __getattr__(name: str):
+    """保持 `from agent import structured_agent` 可用，同时延迟构建代理。"""
+    if name == "structured_agent":
+        return get_structured_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 async def analyze_data(
     data_input: str,
     dependencies: Optional[AnalysisDependencies] = None
@@ -209,10 +388,64 @@ async def analyze_data(
     if dependencies is None:
         dependencies = AnalysisDependencies()
     
-    result = await structured_agent.run(data_input, deps=dependencies)
+    result = await get_structured_agent().run(data_input, deps=dependencies)
     return result.data
 
 
+async def analyze_file(
+    path: str,
+    dependencies: Optional[AnalysisDependencies] = None,
+    instructions: Optional[str] = None
+) -> DataAnalysisReport:
+    """
+    分析本地数据文件并返回结构化报告。
+    
+    文件在本地分块读取并汇总，提示中只包含固定大小的列画像，
+    提示长度不随文件大小增长；模型需要某列的详细统计时可以调用 analyze_data_file 工具。
+    
+    Args:
+        path: CSV / JSONL / Parquet 文件路径
+        dependencies: 可选的分析配置
+        instructions: 附加的分析要求
+    
+    Returns:
+        带验证的结构化 DataAnalysisReport
+    """
+    if dependencies is None:
+        dependencies = AnalysisDependencies()
+    
+    resolved = resolve_data_path(path, dependencies.data_root)
+    # 读取和聚合是阻塞的 CPU/IO 工作，放到线程中执行
+    profile = await asyncio.to_thread(profile_file, resolved)
+    prompt = (
+        f"分析数据文件 {path}。以下是在本地计算的列画像（原始数据未包含在内）：\n\n"
+        f"{format_profile(profile)}"
+    )
+    if instructions:
+        prompt += f"\n\n分析要求：{instructions}"
+    
+    result = await get_structured_agent().run(prompt, deps=dependencies)
+    return result.data
+
+
+_sync_state = threading.local()
+
+
+def _sync_runner() -> asyncio.Runner:
+    """
+    获取当前线程复用的事件循环运行器。
+    
+    asyncio.run 每次调用都会新建并关闭事件循环，模型客户端的连接池绑定在旧循环上无法复用；
+    这里每个线程只创建一个 Runner，进程退出时关闭。
+    """
+    runner = getattr(_sync_state, "runner", None)
+    if runner is None:
+        runner = asyncio.Runner()
+        _sync_state.runner = runner
+        atexit.register(runner.close)
+    return runner
+
+
 def analyze_data_sync(
     data_input: str,
     dependencies: Optional[AnalysisDependencies] = None
@@ -227,14 +460,11 @@ def analyze_data_sync(
     Returns:
         带验证的结构化 DataAnalysisReport
     """
-    import asyncio
-    return asyncio.run(analyze_data(data_input, dependencies))
+    return _sync_runner().run(analyze_data(data_input, dependencies))
 
 
 # 示例使用和演示
 if __name__ == "__main__":
-    import asyncio
-    
     async def demo_structured_output():
         """演示结构化输出验证。"""
         print("=== 结构化输出代理演示 ===\n")
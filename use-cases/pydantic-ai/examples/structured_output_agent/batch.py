@@ -0,0 +1,372 @@
+"""结构化分析的批量执行
+
+analyze_data / analyze_data_sync 每次只处理一个输入，逐个调用时每个报告都要
+等前一个完成。这里在同一个事件循环里用固定数量的工作协程并发处理一批输入：
+
+- 所有请求共享同一个代理和模型客户端（连接池），不重复创建
+- 输入按需从迭代器读取，结果按完成顺序流式产出，内存占用只取决于并发数
+- 每个输入单独重试（带抖动的指数退避），失败不会影响其他输入
+- 结果逐行追加写入 JSONL，中断后可以用 --resume 跳过已成功的输入
+
+命令行用法：
+    python batch.py inputs.jsonl -o reports.jsonl --concurrency 16 [--retries 2] [--resume]
+
+输入文件每行是一个 JSON 对象，如 {"id": "q4-sales", "input": "..."}，
+或 {"id": "orders", "path": "data/orders.csv", "instructions": "..."}；
+也可以直接是一个 JSON 字符串。
+"""
+
+import argparse
+import asyncio
+import dataclasses
+import json
+import logging
+import random
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, IO, Iterable, Optional, Set, Union
+
+from pydantic_ai.exceptions import ModelHTTPError, UserError
+
+from agent import AnalysisDependencies, DataAnalysisReport, analyze_data, analyze_file
+from data_ingest import DataIngestError
+from report_validation import get_validation_stats
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_RETRIES = 2
+# 值得重试的模型 HTTP 状态码（限流和服务端错误）
+RETRY_STATUSES = (408, 409, 429, 500, 502, 503, 504)
+
+
+@dataclass
+class BatchItem:
+    """批量分析中的单个输入：原始数据文本（input）或本地数据文件（path）二选一。"""
+    id: str
+    input: Optional[str] = None
+    path: Optional[str] = None
+    instructions: Optional[str] = None
+
+    def __post_init__(self):
+        if (self.input is None) == (self.path is None):
+            raise ValueError(f"Batch item {self.id!r} needs exactly one of 'input' or 'path'")
+
+
+@dataclass
+class BatchResult:
+    """单个输入的分析结果；失败时 report 为 None，error 为最后一次的错误。index 是本次输入中的序号。"""
+    index: int
+    id: str
+    report: Optional[DataAnalysisReport] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.report is not None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "index": self.index,
+            "ok": self.ok,
+            "attempts": self.attempts,
+            "elapsed": round(self.elapsed, 3),
+            "report": self.report.model_dump(mode="json") if self.report is not None else None,
+            "error": self.error
+        }
+
+
+@dataclass
+class InvalidInput:
+    """无法解析的输入行，记为失败结果而不是中止整个批次。"""
+    id: str
+    error: str
+
+
+def item_id(index: int, value: Any) -> str:
+    """输入的 id：显式给出的 id，否则为序号。"""
+    if isinstance(value, (BatchItem, InvalidInput)):
+        return value.id
+    if isinstance(value, dict) and "id" in value:
+        return str(value["id"])
+    return str(index)
+
+
+def as_batch_item(index: int, value: Union[str, Dict[str, Any], BatchItem]) -> BatchItem:
+    """
+    把字符串、字典或 BatchItem 统一为 BatchItem；缺少 id 时使用序号。
+
+    Raises:
+        ValueError: 输入缺少字段、字段无效或是 InvalidInput
+        TypeError: 不支持的输入类型
+    """
+    if isinstance(value, BatchItem):
+        return value
+    if isinstance(value, InvalidInput):
+        raise ValueError(value.error)
+    if isinstance(value, str):
+        return BatchItem(id=str(index), input=value)
+    if isinstance(value, dict):
+        fields = dict(value)
+        fields["id"] = str(fields.get("id", index))
+        try:
+            return BatchItem(**fields)
+        except TypeError as e:
+            raise ValueError(f"Invalid batch item {fields['id']!r}: {e}") from e
+    raise TypeError(f"Unsupported batch item type: {type(value).__name__}")
+
+
+def is_retryable(error: BaseException) -> bool:
+    """判断错误是否值得重试：输入本身的问题（路径、格式、配置）重试也不会成功。"""
+    # 超时和连接错误是 OSError 的子类，但属于暂时性故障，必须先于 OSError 判断
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    if isinstance(error, (DataIngestError, ValueError, OSError, UserError)):
+        return False
+    if isinstance(error, ModelHTTPError):
+        return error.status_code in RETRY_STATUSES
+    return True
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """第 attempt 次重试前的等待时间（full jitter）。"""
+    return random.uniform(0.0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+async def _analyze_item(
+    index: int,
+    item: BatchItem,
+    dependencies: AnalysisDependencies,
+    retries: int,
+    timeout: Optional[float],
+    base_delay: float,
+    max_delay: float
+) -> BatchResult:
+    """分析单个输入，失败时按退避策略单独重试。"""
+    result = BatchResult(index=index, id=item.id)
+    start = time.perf_counter()
+    while True:
+        result.attempts += 1
+        # 每次尝试使用独立的数值流表，避免并发运行之间共享可变状态
+        deps = dataclasses.replace(dependencies, numeric_streams={})
+        if item.path is not None:
+            call = analyze_file(item.path, deps, item.instructions)
+        else:
+            data = item.input if item.instructions is None else f"{item.input}\n\n分析要求：{item.instructions}"
+            call = analyze_data(data, deps)
+        try:
+            result.report = await asyncio.wait_for(call, timeout)
+            result.error = None
+            break
+        except Exception as e:
+            result.error = f"{type(e).__name__}: {e}"
+            if result.attempts > retries or not is_retryable(e):
+                logger.warning(f"Batch item {item.id} failed after {result.attempts} attempt(s): {result.error}")
+                break
+            delay = backoff_delay(result.attempts - 1, base_delay, max_delay)
+            logger.info(f"Batch item {item.id} failed ({result.error}), retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+async def analyze_data_batch(
+    inputs: Iterable[Union[str, Dict[str, Any], BatchItem]],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    dependencies: Optional[AnalysisDependencies] = None,
+    retries: int = DEFAULT_RETRIES,
+    timeout: Optional[float] = None,
+    base_delay: float = 0.5,
+    max_delay: float = 8.0
+) -> AsyncIterator[BatchResult]:
+    """
+    并发分析一批输入，按完成顺序产出结果。
+
+    最多同时运行 concurrency 个分析，输入按需从迭代器读取；消费方处理得慢时
+    工作协程会暂停，不会在内存中堆积结果。需要提前退出迭代时用 contextlib.aclosing
+    包装，退出时会立即取消尚未完成的分析。
+
+    Args:
+        inputs: 字符串、字典（id/input/path/instructions）或 BatchItem 的可迭代对象
+        concurrency: 同时进行的分析数
+        dependencies: 所有输入共用的分析配置
+        retries: 每个输入失败后的最大重试次数
+        timeout: 单次尝试的超时时间（秒），None 表示不限制
+        base_delay: 退避的基础等待时间（秒）
+        max_delay: 退避的最长等待时间（秒）
+
+    Yields:
+        每个输入的 BatchResult（成功或最终失败）
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+    if dependencies is None:
+        dependencies = AnalysisDependencies()
+
+    items = enumerate(inputs)
+    done = object()
+    results: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+
+    async def worker():
+        # 所有工作协程共享同一个输入迭代器，next() 是同步的，不会被并发打断
+        for index, value in items:
+            try:
+                item = as_batch_item(index, value)
+            except (ValueError, TypeError) as e:
+                # 格式错误的输入只记为该输入失败，不影响批次中的其他输入
+                result = BatchResult(index=index, id=item_id(index, value), error=f"{type(e).__name__}: {e}")
+                logger.warning(f"Invalid batch item {result.id}: {e}")
+            else:
+                result = await _analyze_item(
+                    index, item, dependencies, retries, timeout, base_delay, max_delay
+                )
+            await results.put(result)
+
+    async def supervise():
+        try:
+            await asyncio.gather(*workers)
+        except Exception as e:
+            # 输入迭代器本身出错等无法按单个输入处理的问题，交给消费方抛出
+            await results.put(e)
+        else:
+            await results.put(done)
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    supervisor = asyncio.create_task(supervise())
+    try:
+        while True:
+            result = await results.get()
+            if result is done:
+                break
+            if isinstance(result, Exception):
+                raise result
+            yield result
+    finally:
+        for task in (*workers, supervisor):
+            task.cancel()
+        await asyncio.gather(*workers, supervisor, return_exceptions=True)
+
+
+class JsonlWriter:
+    """逐行追加写入批量结果，每行写完立即刷新，进程中断时已完成的结果不会丢失。"""
+
+    def __init__(self, stream: IO[str]):
+        self.stream = stream
+        self.written = 0
+
+    def write(self, result: BatchResult) -> None:
+        self.stream.write(json.dumps(result.to_dict(), ensure_ascii=False) + "\n")
+        self.stream.flush()
+        self.written += 1
+
+
+def read_batch_inputs(path: Union[str, Path]) -> Iterable[Union[str, Dict[str, Any], InvalidInput]]:
+    """按行读取 JSONL 输入文件，跳过空行；无法解析的行产出 InvalidInput。"""
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                yield InvalidInput(id=f"line-{line_number}", error=f"Invalid JSON on line {line_number}: {e}")
+
+
+def _pin_id(index: int, value: Any) -> Union[BatchItem, Dict[str, Any], InvalidInput]:
+    """按输入文件中的序号固定 id，--resume 过滤后序号变化也不影响 id。"""
+    if isinstance(value, str):
+        return BatchItem(id=str(index), input=value)
+    if isinstance(value, dict):
+        return {**value, "id": item_id(index, value)}
+    if isinstance(value, (BatchItem, InvalidInput)):
+        return value
+    return InvalidInput(id=str(index), error=f"Unsupported batch item type: {type(value).__name__}")
+
+
+def completed_ids(path: Union[str, Path]) -> Set[str]:
+    """已有输出文件中成功完成的输入 id（用于 --resume）。"""
+    ids: Set[str] = set()
+    if not Path(path).exists():
+        return ids
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # 中断时可能留下不完整的最后一行
+                continue
+            if record.get("ok"):
+                ids.add(str(record["id"]))
+    return ids
+
+
+async def run_batch(args: argparse.Namespace) -> int:
+    """命令行入口：读取输入、并发分析并逐行写出结果，返回失败数。"""
+    skip = completed_ids(args.output) if args.resume else set()
+    inputs = (
+        value for value in (
+            _pin_id(index, value) for index, value in enumerate(read_batch_inputs(args.inputs))
+        )
+        if item_id(0, value) not in skip
+    )
+    dependencies = AnalysisDependencies(
+        report_format=args.report_format,
+        data_root=args.data_root
+    )
+
+    succeeded = failed = 0
+    start = time.perf_counter()
+    with open(args.output, "a" if args.resume else "w", encoding="utf-8") as f:
+        writer = JsonlWriter(f)
+        async for result in analyze_data_batch(
+            inputs,
+            concurrency=args.concurrency,
+            dependencies=dependencies,
+            retries=args.retries,
+            timeout=args.timeout
+        ):
+            writer.write(result)
+            if result.ok:
+                succeeded += 1
+                status = "✓"
+            else:
+                failed += 1
+                status = f"✗ {result.error}"
+            print(f"[{succeeded + failed}] {result.id} {status} ({result.attempts} 次尝试，{result.elapsed:.1f}s)")
+
+    elapsed = time.perf_counter() - start
+    skipped = f"，跳过 {len(skip)} 个已完成" if skip else ""
+    print(f"\n完成：成功 {succeeded}，失败 {failed}{skipped}，耗时 {elapsed:.1f}s → {args.output}")
+    stats = get_validation_stats()
+    if stats.retries_avoided:
+        print(f"本地修复避免了 {stats.retries_avoided} 次模型重试：{dict(stats.repairs)}")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量结构化数据分析")
+    parser.add_argument("inputs", help="输入 JSONL 文件")
+    parser.add_argument("-o", "--output", default="reports.jsonl", help="输出 JSONL 文件")
+    parser.add_argument("-c", "--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="同时进行的分析数")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES, help="每个输入失败后的最大重试次数")
+    parser.add_argument("--timeout", type=float, default=None, help="单次尝试的超时时间（秒）")
+    parser.add_argument("--report-format", default="business", help="报告格式（business、technical、academic）")
+    parser.add_argument("--data-root", default=None, help="文件输入只能位于该目录下（默认为当前工作目录）")
+    parser.add_argument("--resume", action="store_true", help="追加到已有输出并跳过已成功的输入")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    try:
+        failed = asyncio.run(run_batch(args))
+    except KeyboardInterrupt:
+        sys.exit(130)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
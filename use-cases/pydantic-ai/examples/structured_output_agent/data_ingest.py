@@ -0,0 +1,373 @@
+"""本地数据文件的分块读取与列画像
+
+analyze_data 把原始数据整段放进提示，令牌数和延迟随数据量线性增长。
+这里在本地按块读取 CSV / JSONL / Parquet 文件，用 OnlineStats 为数值列、
+用有界的频次表为其他列计算聚合，只把固定大小的列画像交给模型：
+
+- CSV：带缓冲的分块读取，每块按列转置后批量解析
+- JSONL：内存映射文件，按行切分解析，不把整个文件读进内存
+- Parquet：通过 pyarrow（可选依赖）按行组批次读取
+
+文件多大，内存占用和提示长度都只取决于列数和画像参数。
+"""
+
+import csv
+import json
+import math
+import mmap
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from itertools import compress, filterfalse, islice, zip_longest
+from operator import not_
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from online_stats import OnlineStats
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # orjson 是可选的快速解析器
+    _json_loads = json.loads
+
+# pyarrow 是可选的 Parquet 读取器，它会连带加载 numpy，读取 Parquet 文件时才导入
+
+SUPPORTED_FORMATS = ("csv", "jsonl", "parquet")
+FORMAT_BY_SUFFIX = {
+    ".csv": "csv",
+    ".tsv": "csv",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+}
+DEFAULT_CHUNK_ROWS = 50000
+# 非数值列的频次表大小和精确计数的不同值上限
+TOP_VALUES_CAPACITY = 64
+DISTINCT_LIMIT = 10000
+# 非空值中至少有这个比例可以解析为数字时，列按数值列展示
+NUMERIC_RATIO = 0.9
+
+
+class DataIngestError(Exception):
+    """数据文件无法读取或格式不受支持。"""
+
+
+@dataclass
+class ColumnProfile:
+    """单列的聚合画像。"""
+    name: str
+    nulls: int = 0
+    numeric: OnlineStats = field(default_factory=OnlineStats)
+    # 无法解析为数字的值：有界频次表（超出容量时修剪低频项）和不同值计数
+    text_count: int = 0
+    top_values: Counter = field(default_factory=Counter)
+    distinct: set = field(default_factory=set)
+    distinct_overflow: bool = False
+
+    @property
+    def non_null(self) -> int:
+        return self.numeric.count + self.numeric.dropped + self.text_count
+
+    @property
+    def is_numeric(self) -> bool:
+        """可解析为数字的值是否占非空值的绝大多数。"""
+        return self.non_null > 0 and self.numeric.count >= self.non_null * NUMERIC_RATIO
+
+    def add_numbers(self, values: List[float]) -> None:
+        # NaN 表示缺失而不是数值，计入 nulls；inf 仍由 OnlineStats 计为 dropped
+        nans = sum(map(math.isnan, values))
+        if nans:
+            self.nulls += nans
+            values = list(filterfalse(math.isnan, values))
+        self.numeric.update_many(values)
+
+    def add_text(self, values: Sequence[str]) -> None:
+        if not values:
+            return
+        self.text_count += len(values)
+        self.top_values.update(values)
+        if len(self.top_values) > TOP_VALUES_CAPACITY * 4:
+            # 只保留高频项，内存与行数无关（计数是近似的下界）
+            self.top_values = Counter(dict(self.top_values.most_common(TOP_VALUES_CAPACITY)))
+        if not self.distinct_overflow:
+            self.distinct.update(values)
+            if len(self.distinct) > DISTINCT_LIMIT:
+                self.distinct_overflow = True
+                self.distinct = set()
+
+    def add_strings(self, values: Sequence[str]) -> None:
+        """
+        加入一批字符串值（CSV 字段）：空白和 NA、N/A、null、None、NaN 等占位符计为缺失，
+        其余尽量解析为数字。
+        """
+        try:
+            # 快速路径：整列都是数字（"nan" 也能解析，由 add_numbers 计为缺失），转换在 C 层完成
+            self.add_numbers(list(map(float, values)))
+            return
+        except ValueError:
+            pass
+        # 占位符同样用正则在 C 层识别，不计入文本频次，也不影响数值列的判定
+        missing = list(map(_NULL_PATTERN.fullmatch, values))
+        present = list(compress(values, map(not_, missing)))
+        self.nulls += len(values) - len(present)
+        try:
+            self.add_numbers(list(map(float, present)))
+            return
+        except ValueError:
+            pass
+        # 混合列：用正则在 C 层划分数字和文本，避免逐个值触发异常
+        matches = list(map(_NUMBER_PATTERN.fullmatch, present))
+        self.add_numbers(list(map(float, compress(present, matches))))
+        self.add_text(list(compress(present, map(not_, matches))))
+
+    def add_raw(self, values: Sequence[Any]) -> None:
+        """加入一批已解析的值（JSON、Parquet）：None、NaN 和占位符字符串计为缺失，数字和数字字符串按数值统计。"""
+        try:
+            # 快速路径：整列都是数字（布尔值按 0/1，均值即为真值比例）
+            self.add_numbers(list(map(float, values)))
+            return
+        except (TypeError, ValueError):
+            pass
+
+        numbers: List[float] = []
+        strings: List[str] = []
+        others: List[str] = []
+        for value in values:
+            if value is None:
+                self.nulls += 1
+            elif isinstance(value, (int, float)):
+                numbers.append(float(value))
+            elif isinstance(value, str):
+                strings.append(value)
+            else:
+                # 嵌套对象按紧凑 JSON 计入频次表
+                others.append(json.dumps(value, ensure_ascii=False, sort_keys=True, default=str))
+        self.add_numbers(numbers)
+        if strings:
+            self.add_strings(strings)
+        self.add_text(others)
+
+
+_NUMBER_PATTERN = re.compile(
+    r"\s*[-+]?(?:(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?|inf(?:inity)?|nan)\s*",
+    re.IGNORECASE
+)
+# 表示缺失的占位符（不区分大小写，允许前后空白）；NaN 可以解析为数字，由 add_numbers 处理
+_NULL_PATTERN = re.compile(r"\s*(?:|n/?a|#n/?a|<na>|null|none|nil)\s*", re.IGNORECASE)
+
+
+@dataclass
+class DatasetProfile:
+    """整个数据文件的画像。"""
+    path: str
+    format: str
+    size_bytes: int
+    rows: int = 0
+    columns: Dict[str, ColumnProfile] = field(default_factory=dict)
+
+    def column(self, name: str) -> ColumnProfile:
+        profile = self.columns.get(name)
+        if profile is None:
+            profile = self.columns[name] = ColumnProfile(name)
+            # 后出现的列（JSONL 中的新键）之前的行都算缺失
+            profile.nulls = self.rows
+        return profile
+
+
+def detect_format(path: Union[str, Path]) -> str:
+    """根据扩展名判断文件格式。"""
+    suffix = Path(path).suffix.lower()
+    data_format = FORMAT_BY_SUFFIX.get(suffix)
+    if data_format is None:
+        raise DataIngestError(f"Unsupported data file extension: {suffix or '(none)'}")
+    return data_format
+
+
+def _csv_chunks(path: Path, chunk_rows: int) -> Iterator[Tuple[List[str], List[List[str]]]]:
+    delimiter = "\t" if path.suffix.lower() == ".tsv" else ","
+    with open(path, "r", encoding="utf-8", newline="") as handle:
+        reader = csv.reader(handle, delimiter=delimiter)
+        header = next(reader, None)
+        if header is None:
+            return
+        while True:
+            rows = list(islice(reader, chunk_rows))
+            if not rows:
+                return
+            yield header, rows
+
+
+def _jsonl_chunks(path: Path, chunk_rows: int) -> Iterator[List[Dict[str, Any]]]:
+    if path.stat().st_size == 0:
+        return
+    with open(path, "rb") as handle, mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        lines = iter(mapped.readline, b"")
+        while True:
+            block = list(islice(lines, chunk_rows))
+            if not block:
+                return
+            records = []
+            for line in block:
+                if line.strip():
+                    try:
+                        record = _json_loads(line)
+                    except ValueError as e:
+                        raise DataIngestError(f"Invalid JSON line: {e}") from e
+                    records.append(record if isinstance(record, dict) else {"value": record})
+            yield records
+
+
+def profile_file(
+    path: Union[str, Path],
+    data_format: Optional[str] = None,
+    columns: Optional[Sequence[str]] = None,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    max_rows: Optional[int] = None
+) -> DatasetProfile:
+    """
+    分块读取数据文件并计算每列的画像。
+
+    Args:
+        path: 本地文件路径
+        data_format: "csv"、"jsonl" 或 "parquet"，默认按扩展名判断
+        columns: 只分析这些列，默认全部
+        chunk_rows: 每块的行数
+        max_rows: 最多读取的行数，默认读完整个文件
+
+    Returns:
+        DatasetProfile
+
+    Raises:
+        DataIngestError: 文件不存在、格式不受支持或内容无法解析
+    """
+    path = Path(path)
+    if not path.is_file():
+        raise DataIngestError(f"Data file not found: {path}")
+    data_format = data_format or detect_format(path)
+    if data_format not in SUPPORTED_FORMATS:
+        raise DataIngestError(f"Unsupported data format: {data_format}")
+
+    profile = DatasetProfile(path=str(path), format=data_format, size_bytes=path.stat().st_size)
+    wanted = set(columns) if columns else None
+    remaining = max_rows if max_rows is not None else math.inf
+
+    if data_format == "csv":
+        for header, rows in _csv_chunks(path, chunk_rows):
+            if len(rows) > remaining:
+                rows = rows[:int(remaining)]
+            # 按列转置在 C 层完成；短行缺失的字段补为空字符串（计为缺失）
+            for name, values in zip(header, zip_longest(*rows, fillvalue="")):
+                if wanted is None or name in wanted:
+                    profile.column(name).add_strings(values)
+            profile.rows += len(rows)
+            remaining -= len(rows)
+            if remaining <= 0:
+                break
+
+    elif data_format == "jsonl":
+        for records in _jsonl_chunks(path, chunk_rows):
+            if len(records) > remaining:
+                records = records[:int(remaining)]
+            keys = {key for record in records for key in record}
+            if wanted is not None:
+                keys &= wanted
+            for key in keys:
+                # 先登记新列，使它之前的行计为缺失
+                profile.column(key).add_raw([record.get(key) for record in records])
+            for name, column in profile.columns.items():
+                if name not in keys:
+                    column.nulls += len(records)
+            profile.rows += len(records)
+            remaining -= len(records)
+            if remaining <= 0:
+                break
+
+    else:
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise DataIngestError("Reading Parquet files requires pyarrow (pip install pyarrow)") from None
+        parquet = pq.ParquetFile(path)
+        names = [name for name in parquet.schema_arrow.names if wanted is None or name in wanted]
+        for batch in parquet.iter_batches(batch_size=chunk_rows, columns=names):
+            if batch.num_rows > remaining:
+                batch = batch.slice(0, int(remaining))
+            for name, array in zip(batch.schema.names, batch.columns):
+                column = profile.column(name)
+                column.nulls += array.null_count
+                column.add_raw(array.drop_null().to_pylist())
+            profile.rows += batch.num_rows
+            remaining -= batch.num_rows
+            if remaining <= 0:
+                break
+
+    return profile
+
+
+def _format_number(value: float) -> str:
+    if value == 0 or 1e-3 <= abs(value) < 1e9:
+        return f"{value:,.4g}" if abs(value) < 1e4 else f"{value:,.0f}"
+    return f"{value:.3e}"
+
+
+def format_profile(profile: DatasetProfile, max_columns: int = 30, top_values: int = 5) -> str:
+    """
+    把数据文件画像渲染为固定大小的紧凑文本，每列一行。
+
+    Args:
+        profile: profile_file() 的结果
+        max_columns: 最多展示的列数，其余列只给出数量
+        top_values: 非数值列展示的最常见值个数
+
+    Returns:
+        多行摘要
+    """
+    size_mb = profile.size_bytes / (1024 * 1024)
+    lines = [
+        f"文件：{os.path.basename(profile.path)}（{profile.format}，{size_mb:.1f} MB，"
+        f"{profile.rows:,} 行，{len(profile.columns)} 列）"
+    ]
+    shown = list(profile.columns.values())[:max_columns]
+    numeric = [column for column in shown if column.is_numeric]
+    other = [column for column in shown if not column.is_numeric]
+
+    if numeric:
+        lines.append("数值列：")
+        for column in numeric:
+            summary = column.numeric.summary()
+            p = summary.percentiles
+            line = (
+                f"- {column.name}：n={summary.count:,}，缺失 {column.nulls:,}，"
+                f"均值 {_format_number(summary.mean)}，标准差 {_format_number(summary.std_dev)}，"
+                f"范围 {_format_number(summary.minimum)} 到 {_format_number(summary.maximum)}，"
+                f"P5/P50/P95={_format_number(p[5.0])}/{_format_number(p[50.0])}/{_format_number(p[95.0])}，"
+                f"趋势 {summary.trend}，离群值 {summary.outlier_count:,}"
+            )
+            if column.text_count:
+                line += f"，非数值 {column.text_count:,}"
+            lines.append(line)
+
+    if other:
+        lines.append("其他列：")
+        for column in other:
+            distinct = f">{DISTINCT_LIMIT:,}" if column.distinct_overflow else f"{len(column.distinct):,}"
+            common = "、".join(
+                f"{_truncate(str(value), 30)}({count:,})"
+                for value, count in column.top_values.most_common(top_values)
+            )
+            lines.append(
+                f"- {column.name}：非空 {column.non_null:,}，缺失 {column.nulls:,}，不同值 {distinct}"
+                + (f"，最常见 {common}" if common else "")
+            )
+
+    omitted = len(profile.columns) - len(shown)
+    if omitted > 0:
+        lines.append(f"（另有 {omitted} 列未展示）")
+    return "\n".join(lines)
+
+
+def _truncate(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[:limit - 3] + "..."
@@ -0,0 +1,418 @@
+"""数值序列的统计引擎
+
+为 analyze_numerical_data 计算汇总统计：
+- 计数、总和、均值、方差、标准差、最小值、最大值
+- 百分位数（线性插值，与 numpy.percentile 默认方法一致）
+- 以下标为自变量的线性回归趋势（斜率、截距、R²）
+- 滚动窗口均值
+- 基于 IQR 或 z 分数围栏的离群值检测
+
+输入只转换一次：有 NumPy 时转成 float64 数组做向量化计算；没有时退回纯 Python
+后端，排序一次后所有百分位数、极值和离群值计数都从同一份排序结果得到，
+其余各遍用 sum/map/itertools 在 C 层迭代，避免逐元素的 Python 字节码循环。
+"""
+
+import importlib.util
+import math
+from bisect import bisect_left, bisect_right
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from heapq import merge
+from itertools import accumulate, compress, count, islice, repeat
+from operator import mul, sub
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# NumPy 是可选的向量化后端；这里只检查是否安装，第一次走 NumPy 路径时才真正导入，
+# 避免导入本模块（以及结构化代理）时就付出 NumPy 的加载开销
+NUMPY_AVAILABLE = importlib.util.find_spec("numpy") is not None
+BACKENDS = ("numpy", "python")
+OUTLIER_METHODS = ("iqr", "zscore")
+
+DEFAULT_PERCENTILES: Tuple[float, ...] = (5.0, 25.0, 50.0, 75.0, 95.0)
+# 各方法的默认围栏系数：IQR 的 1.5 倍，或 3 个标准差
+DEFAULT_OUTLIER_THRESHOLDS = {"iqr": 1.5, "zscore": 3.0}
+# 回归直线解释的方差低于该比例时认为没有明显趋势
+TREND_MIN_R_SQUARED = 0.05
+
+
+@dataclass
+class NumericSummary:
+    """数值序列的汇总统计。"""
+    count: int
+    total: float = 0.0
+    mean: float = 0.0
+    variance: float = 0.0
+    std_dev: float = 0.0
+    minimum: float = 0.0
+    maximum: float = 0.0
+    percentiles: Dict[float, float] = field(default_factory=dict)
+
+    # 线性回归趋势（自变量为数据点的下标）
+    slope: float = 0.0
+    intercept: float = 0.0
+    r_squared: float = 0.0
+    trend: str = "数据不足"
+
+    # 滚动窗口均值的概况
+    window: int = 0
+    rolling_first: Optional[float] = None
+    rolling_last: Optional[float] = None
+    rolling_min: Optional[float] = None
+    rolling_max: Optional[float] = None
+
+    # 离群值：总数和按下标排列的前若干个 (下标, 值)
+    outlier_method: str = "iqr"
+    outlier_count: int = 0
+    outliers: List[Tuple[int, float]] = field(default_factory=list)
+
+    # 被丢弃的非有限值（NaN、inf）数量
+    dropped: int = 0
+    backend: str = "python"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """以字典形式返回统计结果。"""
+        return asdict(self)
+
+
+def _resolve_backend(backend: Optional[str]) -> str:
+    if backend is None:
+        return "numpy" if NUMPY_AVAILABLE else "python"
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown statistics backend: {backend}")
+    if backend == "numpy" and not NUMPY_AVAILABLE:
+        raise ValueError("NumPy backend requested but numpy is not installed")
+    return backend
+
+
+@lru_cache(maxsize=None)
+def _numpy():
+    """首次使用 NumPy 后端时导入 numpy 并缓存模块。"""
+    import numpy
+
+    return numpy
+
+
+def default_window(count: int) -> int:
+    """默认滚动窗口：数据点数的十分之一，至少 2 个点。"""
+    return max(2, count // 10)
+
+
+def classify_trend(slope: float, r_squared: float, count: int) -> str:
+    """根据回归斜率和拟合优度给出趋势描述。"""
+    if count < 2:
+        return "数据不足"
+    if slope == 0 or r_squared < TREND_MIN_R_SQUARED:
+        return "平稳"
+    return "递增" if slope > 0 else "递减"
+
+
+def _percentile_sorted(ordered: Sequence[float], p: float) -> float:
+    """对已排序的序列做线性插值百分位。"""
+    rank = (len(ordered) - 1) * p / 100.0
+    low = math.floor(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def _regression(count: int, mean: float, sxy: float, syy: float) -> Tuple[float, float, float]:
+    """
+    以下标 0..n-1 为自变量的最小二乘直线。
+
+    下标的均值和离差平方和有闭式解；中心化数据之和为 0，
+    所以下标与中心化数据的乘积和就是协离差 sxy。
+    """
+    if count < 2:
+        return 0.0, mean, 0.0
+    index_mean = (count - 1) / 2.0
+    sxx = count * (count * count - 1) / 12.0
+    slope = sxy / sxx
+    intercept = mean - slope * index_mean
+    r_squared = (sxy * sxy) / (sxx * syy) if syy > 0 else 0.0
+    return slope, intercept, min(r_squared, 1.0)
+
+
+def _fences(
+    method: str,
+    threshold: float,
+    mean: float,
+    std_dev: float,
+    percentiles: Dict[float, float]
+) -> Tuple[float, float]:
+    if method == "iqr":
+        q1, q3 = percentiles[25.0], percentiles[75.0]
+        spread = (q3 - q1) * threshold
+        return q1 - spread, q3 + spread
+    spread = std_dev * threshold
+    return mean - spread, mean + spread
+
+
+def rolling_mean(values: Sequence[float], window: int) -> List[float]:
+    """
+    计算滚动窗口均值。
+
+    Args:
+        values: 数值序列
+        window: 窗口大小
+
+    Returns:
+        长度为 len(values) - window + 1 的均值列表；数据不足一个窗口时为空
+    """
+    if window < 1:
+        raise ValueError("window must be at least 1")
+    if len(values) < window:
+        return []
+    if NUMPY_AVAILABLE:
+        np = _numpy()
+        return _rolling_mean_numpy(np.asarray(values, dtype=np.float64), window).tolist()
+    return _rolling_mean_python(values, window)
+
+
+def _rolling_mean_python(values: Sequence[float], window: int) -> List[float]:
+    # 前缀和相减：每个窗口 O(1)，先减去首个值以减小前缀和的量级
+    shift = values[0]
+    prefix = list(accumulate(map(sub, values, repeat(shift)), initial=0.0))
+    sums = map(sub, islice(prefix, window, None), prefix)
+    return [total / window + shift for total in sums]
+
+
+def _rolling_mean_numpy(array: "numpy.ndarray", window: int) -> "numpy.ndarray":
+    np = _numpy()
+    shift = array[0]
+    prefix = np.concatenate(([0.0], np.cumsum(array - shift)))
+    return (prefix[window:] - prefix[:-window]) / window + shift
+
+
+def summarize(
+    values: Iterable[float],
+    percentiles: Sequence[float] = DEFAULT_PERCENTILES,
+    window: Optional[int] = None,
+    outlier_method: str = "iqr",
+    outlier_threshold: Optional[float] = None,
+    max_outliers: int = 10,
+    backend: Optional[str] = None
+) -> NumericSummary:
+    """
+    计算数值序列的汇总统计。
+
+    Args:
+        values: 数值序列，非有限值（NaN、inf）会被丢弃并计入 dropped
+        percentiles: 要计算的百分位（0-100）
+        window: 滚动窗口大小（至少为 1），默认为数据点数的十分之一
+        outlier_method: "iqr" 或 "zscore"
+        outlier_threshold: 围栏系数，默认 IQR 为 1.5、z 分数为 3.0
+        max_outliers: 结果中最多列出的离群值数量（计数不受影响）
+        backend: "numpy"、"python"，默认有 NumPy 时使用 NumPy
+
+    Returns:
+        NumericSummary；没有有效数据时只有 count=0 和 dropped
+
+    Raises:
+        ValueError: 离群值方法、百分位、窗口大小或后端无效
+    """
+    if outlier_method not in OUTLIER_METHODS:
+        raise ValueError(f"Unknown outlier method: {outlier_method}")
+    if window is not None and window < 1:
+        raise ValueError("window must be at least 1")
+    backend = _resolve_backend(backend)
+    threshold = (
+        outlier_threshold if outlier_threshold is not None
+        else DEFAULT_OUTLIER_THRESHOLDS[outlier_method]
+    )
+    # IQR 围栏总是需要四分位数
+    wanted = sorted(set(float(p) for p in percentiles) | {25.0, 50.0, 75.0})
+    for p in wanted:
+        if not 0.0 <= p <= 100.0:
+            raise ValueError(f"Percentile out of range: {p}")
+
+    if backend == "numpy":
+        summary = _summarize_numpy(values, wanted, window, outlier_method, threshold, max_outliers)
+    else:
+        summary = _summarize_python(values, wanted, window, outlier_method, threshold, max_outliers)
+    summary.outlier_method = outlier_method
+    summary.backend = backend
+    return summary
+
+
+def _summarize_python(
+    values: Iterable[float],
+    wanted: List[float],
+    window: Optional[int],
+    method: str,
+    threshold: float,
+    max_outliers: int
+) -> NumericSummary:
+    raw = values if isinstance(values, list) else list(values)
+    # 总和有限说明没有 NaN/inf（它们会传播到总和），可以跳过逐元素过滤；
+    # 只有总和非有限（含溢出）时才过滤并重新求和
+    total = float(sum(raw))
+    if math.isfinite(total):
+        data = raw
+    else:
+        data = list(filter(math.isfinite, map(float, raw)))
+        total = float(sum(data))
+    n = len(data)
+    dropped = len(raw) - n
+    if n == 0:
+        return NumericSummary(count=0, dropped=dropped)
+
+    mean = total / n
+    # 中心化后再求平方和，避免大均值下的灾难性抵消
+    centered = list(map(sub, data, repeat(mean)))
+    syy = sum(map(mul, centered, centered))
+    variance = syy / n
+    sxy = sum(map(mul, range(n), centered))
+    slope, intercept, r_squared = _regression(n, mean, sxy, syy)
+
+    ordered = sorted(data)
+    percentile_values = {p: _percentile_sorted(ordered, p) for p in wanted}
+    std_dev = math.sqrt(variance)
+
+    low, high = _fences(method, threshold, mean, std_dev, percentile_values)
+    outlier_count = bisect_left(ordered, low) + n - bisect_right(ordered, high)
+    outliers: List[Tuple[int, float]] = []
+    if outlier_count and max_outliers > 0:
+        # low.__gt__(x) 即 x < low，比较在 C 层完成
+        below = compress(count(), map(low.__gt__, data))
+        above = compress(count(), map(high.__lt__, data))
+        outliers = [(i, data[i]) for i in islice(merge(below, above), max_outliers)]
+
+    summary = NumericSummary(
+        count=n,
+        total=total,
+        mean=mean,
+        variance=variance,
+        std_dev=std_dev,
+        minimum=ordered[0],
+        maximum=ordered[-1],
+        percentiles=percentile_values,
+        slope=slope,
+        intercept=intercept,
+        r_squared=r_squared,
+        trend=classify_trend(slope, r_squared, n),
+        outlier_count=outlier_count,
+        outliers=outliers,
+        dropped=dropped,
+    )
+
+    size = window if window is not None else default_window(n)
+    if n >= size:
+        # 摘要只需要滚动均值的首尾和极值：在中心化数据的前缀和上求窗口和，
+        # 只对这四个数做缩放
+        prefix = list(accumulate(centered, initial=0.0))
+        sums = list(map(sub, islice(prefix, size, None), prefix))
+        summary.window = size
+        summary.rolling_first, summary.rolling_last, summary.rolling_min, summary.rolling_max = (
+            value / size + mean for value in (sums[0], sums[-1], min(sums), max(sums))
+        )
+    return summary
+
+
+def _summarize_numpy(
+    values: Iterable[float],
+    wanted: List[float],
+    window: Optional[int],
+    method: str,
+    threshold: float,
+    max_outliers: int
+) -> NumericSummary:
+    np = _numpy()
+    if not isinstance(values, (list, tuple, np.ndarray)):
+        values = list(values)
+    array = np.asarray(values, dtype=np.float64)
+    finite = np.isfinite(array)
+    dropped = int(array.size - np.count_nonzero(finite))
+    if dropped:
+        array = array[finite]
+    n = int(array.size)
+    if n == 0:
+        return NumericSummary(count=0, dropped=dropped)
+
+    total = float(array.sum())
+    mean = total / n
+    centered = array - mean
+    syy = float(np.dot(centered, centered))
+    variance = syy / n
+    index = np.arange(n, dtype=np.float64)
+    sxy = float(np.dot(index, centered))
+    slope, intercept, r_squared = _regression(n, mean, sxy, syy)
+
+    # np.percentile 内部用 partition，不需要完整排序
+    percentile_values = dict(zip(wanted, np.percentile(array, wanted).tolist()))
+    std_dev = math.sqrt(variance)
+
+    low, high = _fences(method, threshold, mean, std_dev, percentile_values)
+    mask = (array < low) | (array > high)
+    outlier_count = int(np.count_nonzero(mask))
+    outliers: List[Tuple[int, float]] = []
+    if outlier_count and max_outliers > 0:
+        positions = np.flatnonzero(mask)[:max_outliers]
+        outliers = list(zip(positions.tolist(), array[positions].tolist()))
+
+    summary = NumericSummary(
+        count=n,
+        total=total,
+        mean=mean,
+        variance=variance,
+        std_dev=std_dev,
+        minimum=float(array.min()),
+        maximum=float(array.max()),
+        percentiles=percentile_values,
+        slope=slope,
+        intercept=intercept,
+        r_squared=r_squared,
+        trend=classify_trend(slope, r_squared, n),
+        outlier_count=outlier_count,
+        outliers=outliers,
+        dropped=dropped,
+    )
+
+    size = window if window is not None else default_window(n)
+    if n >= size:
+        rolling = _rolling_mean_numpy(array, size)
+        summary.window = size
+        summary.rolling_first, summary.rolling_last = float(rolling[0]), float(rolling[-1])
+        summary.rolling_min, summary.rolling_max = float(rolling.min()), float(rolling.max())
+    return summary
+
+
+def format_summary(data_description: str, summary: NumericSummary) -> str:
+    """
+    把汇总统计渲染为提供给模型的简短文本。
+
+    Args:
+        data_description: 数字代表什么的描述
+        summary: summarize() 的结果
+
+    Returns:
+        多行统计分析摘要
+    """
+    if summary.count == 0:
+        return "未提供数值数据进行分析。"
+
+    percentiles = "，".join(
+        f"P{p:g}={value:.2f}" for p, value in sorted(summary.percentiles.items())
+    )
+    lines = [
+        f"{data_description} 的统计分析：",
+        f"- 计数：{summary.count} 个数据点",
+        f"- 平均值：{summary.mean:.2f}",
+        f"- 范围：{summary.minimum:.2f} 到 {summary.maximum:.2f}",
+        f"- 标准差：{summary.std_dev:.2f}",
+        f"- 百分位数：{percentiles}",
+        f"- 整体趋势：{summary.trend}（斜率 {summary.slope:.4g}/点，R²={summary.r_squared:.2f}）",
+    ]
+    if summary.window:
+        lines.append(
+            f"- 滚动均值（窗口 {summary.window}）：{summary.rolling_first:.2f} → {summary.rolling_last:.2f}，"
+            f"区间 {summary.rolling_min:.2f} 到 {summary.rolling_max:.2f}"
+        )
+    if summary.outlier_count:
+        examples = "，".join(f"#{index}={value:.2f}" for index, value in summary.outliers)
+        lines.append(f"- 离群值（{summary.outlier_method}）：{summary.outlier_count} 个，例如 {examples}")
+    else:
+        lines.append(f"- 离群值（{summary.outlier_method}）：无")
+    if summary.dropped:
+        lines.append(f"- 已忽略 {summary.dropped} 个非有限值")
+    quality = "良好" if summary.std_dev < abs(summary.mean) * 0.5 else "变化较大"
+    lines.append(f"- 数据质量：{quality}")
+    return "\n".join(lines)
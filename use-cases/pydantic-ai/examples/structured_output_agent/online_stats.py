@@ -0,0 +1,495 @@
+"""无界数值输入的在线统计
+
+numeric_stats.summarize 需要把整个序列放进内存。OnlineStats 按块增量地
+接收数值，只保留常数大小的状态，最后生成与 summarize 相同的 NumericSummary，
+可以直接交给 format_summary：
+
+- 计数、均值、方差：每块先算块内矩，再用 Chan 的并行合并公式（Welford 的分块形式）并入
+- 回归趋势：下标与数值的协离差同样按块合并，下标的离差平方和有闭式解
+- 百分位数：合并式 t-digest（缓冲后排序合并，排序在 C 层完成）
+- 滚动均值：只保留最后 window - 1 个值
+- 离群值：从 t-digest 的 CDF 估计围栏外的数量，示例取自跟踪的最大/最小值
+- 样本：Algorithm L 蓄水池抽样，只在被选中的位置产生随机数
+
+数据可以来自任意可迭代对象、文本文件，或分多次工具调用追加。
+"""
+
+import heapq
+import math
+import random
+from bisect import bisect_right
+from itertools import accumulate, compress, count, islice, repeat
+from operator import mul, sub
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from numeric_stats import (
+    DEFAULT_OUTLIER_THRESHOLDS,
+    DEFAULT_PERCENTILES,
+    NUMPY_AVAILABLE,
+    OUTLIER_METHODS,
+    NumericSummary,
+    _fences,
+    _numpy,
+    _regression,
+    classify_trend,
+)
+
+DEFAULT_CHUNK_SIZE = 65536
+
+
+class TDigest:
+    """
+    合并式 t-digest 分位数草图。
+
+    新值先进入缓冲区，缓冲区满时与已有质心一起排序，再按 k1 尺度函数
+    的单位区间合并为最多约 compression / 2 个质心。内存与输入长度无关。
+    """
+
+    def __init__(self, compression: float = 200.0, buffer_size: Optional[int] = None):
+        """
+        Args:
+            compression: 压缩参数 δ，越大越精确，质心数不超过约 δ/2
+            buffer_size: 触发合并的缓冲区大小，默认 10δ
+        """
+        self.compression = compression
+        self.buffer_size = buffer_size or int(compression * 10)
+        self._means: List[float] = []
+        self._weights: List[float] = []
+        self._buffer: List[float] = []
+        self.count = 0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+
+    def update_many(self, values: Sequence[float]) -> None:
+        """加入一批有限值。"""
+        if not values:
+            return
+        self.count += len(values)
+        self.minimum = min(self.minimum, min(values))
+        self.maximum = max(self.maximum, max(values))
+        self._buffer.extend(values)
+        if len(self._buffer) >= self.buffer_size:
+            self._compress()
+
+    def _compress(self) -> None:
+        if not self._buffer:
+            return
+        # 新值排序后与已有的少量质心按均值归并，切片拼接在 C 层完成
+        buffer = sorted(self._buffer)
+        self._buffer = []
+        means: List[float] = []
+        weights: List[float] = []
+        previous = 0
+        for mean, weight in zip(self._means, self._weights):
+            position = bisect_right(buffer, mean, previous)
+            means += buffer[previous:position]
+            weights.extend(repeat(1.0, position - previous))
+            means.append(mean)
+            weights.append(weight)
+            previous = position
+        means += buffer[previous:]
+        weights.extend(repeat(1.0, len(buffer) - previous))
+
+        # k1 尺度函数 k(q) = δ/(2π)·asin(2q-1) 的每个单位区间合并为一个质心：
+        # 用累计权重二分查找区间边界，按前缀和求区间的加权均值，
+        # 只需要约 δ/2 次二分，而不是逐点循环
+        shift = means[0]
+        cumulative_weights = list(accumulate(weights, initial=0.0))
+        cumulative_moments = list(accumulate(
+            map(mul, map(sub, means, repeat(shift)), weights), initial=0.0
+        ))
+        total = cumulative_weights[-1]
+        half_range = self.compression / 4.0
+        new_means: List[float] = []
+        new_weights: List[float] = []
+        previous = 0
+        k = 1.0 - half_range
+        while previous < len(means):
+            if k >= half_range:
+                boundary = len(means)
+            else:
+                q = (math.sin(2.0 * math.pi * k / self.compression) + 1.0) / 2.0
+                boundary = bisect_right(cumulative_weights, q * total) - 1
+            if boundary > previous:
+                weight = cumulative_weights[boundary] - cumulative_weights[previous]
+                moment = cumulative_moments[boundary] - cumulative_moments[previous]
+                new_means.append(moment / weight + shift)
+                new_weights.append(weight)
+                previous = boundary
+            k += 1.0
+        self._means, self._weights = new_means, new_weights
+
+    def quantile(self, q: float) -> float:
+        """
+        估计分位数。
+
+        Args:
+            q: 0 到 1 之间的分位
+
+        Returns:
+            估计值；没有数据时为 NaN
+        """
+        self._compress()
+        if not self._means:
+            return math.nan
+        if q <= 0.0:
+            return self.minimum
+        if q >= 1.0:
+            return self.maximum
+
+        # 与 numpy.percentile 的线性插值一致：第 k 个点（从 0 计）位于秩 k，
+        # 权重为 w 的质心覆盖秩区间 [累计, 累计 + w - 1]，中心在两端的中点
+        target = q * (self.count - 1)
+        previous_center, previous_mean = 0.0, self.minimum
+        cumulative = 0.0
+        for mean, weight in zip(self._means, self._weights):
+            center = cumulative + (weight - 1.0) / 2.0
+            if target <= center:
+                if center == previous_center:
+                    return mean
+                fraction = (target - previous_center) / (center - previous_center)
+                return previous_mean + (mean - previous_mean) * fraction
+            previous_center, previous_mean = center, mean
+            cumulative += weight
+        last = self.count - 1.0
+        if last == previous_center:
+            return self.maximum
+        fraction = (target - previous_center) / (last - previous_center)
+        return previous_mean + (self.maximum - previous_mean) * fraction
+
+    def cdf(self, x: float) -> float:
+        """估计不大于 x 的值所占的比例。"""
+        self._compress()
+        if not self._means or x < self.minimum:
+            return 0.0
+        if x >= self.maximum:
+            return 1.0
+        # 每个质心的一半权重在均值左侧、一半在右侧，相邻中心之间线性插值
+        means, weights = self._means, self._weights
+        position = bisect_right(means, x)
+        if position == 0:
+            span = means[0] - self.minimum
+            below = weights[0] / 2.0 * ((x - self.minimum) / span if span > 0 else 1.0)
+        elif position == len(means):
+            span = self.maximum - means[-1]
+            above = weights[-1] / 2.0 * ((self.maximum - x) / span if span > 0 else 0.0)
+            below = self.count - above
+        else:
+            left, right = means[position - 1], means[position]
+            below = math.fsum(islice(weights, position - 1)) + weights[position - 1] / 2.0
+            below += (weights[position - 1] + weights[position]) / 2.0 * (x - left) / (right - left)
+        return min(below / self.count, 1.0)
+
+    @property
+    def centroid_count(self) -> int:
+        """合并后的质心数。"""
+        self._compress()
+        return len(self._means)
+
+
+class ReservoirSample:
+    """
+    固定大小的均匀蓄水池样本（Algorithm L）。
+
+    填满后按几何分布直接跳到下一个被替换的位置，随机数只在被选中时产生，
+    按块处理时未被选中的值不需要逐个访问。
+    """
+
+    def __init__(self, size: int = 1000, seed: Optional[int] = None):
+        """
+        Args:
+            size: 样本大小
+            seed: 随机种子，便于复现
+        """
+        self.size = size
+        self.items: List[float] = []
+        self._random = random.Random(seed)
+        self._seen = 0
+        # 下一个被替换值的下标；填满后从最后一个已放入的下标 size - 1 开始跳，
+        # 第一个候选位置才是 size
+        self._next = size - 1
+        self._w = 1.0
+
+    def _advance(self) -> None:
+        self._w *= math.exp(math.log(self._random.random()) / self.size)
+        skip = math.floor(math.log(self._random.random()) / math.log1p(-self._w))
+        self._next += skip + 1
+
+    def update_many(self, values: Sequence[float]) -> None:
+        """加入一批值。"""
+        start = self._seen
+        end = start + len(values)
+        if len(self.items) < self.size:
+            take = min(self.size - len(self.items), len(values))
+            self.items.extend(values[:take])
+            if len(self.items) == self.size:
+                self._advance()
+        while self._next < end:
+            self.items[self._random.randrange(self.size)] = values[self._next - start]
+            self._advance()
+        self._seen = end
+
+
+def _chunk_moments(values: Sequence[float]) -> Tuple[float, float, float, float]:
+    """返回块内的 (总和, 均值, 离差平方和, 与块内下标的协离差)。"""
+    n = len(values)
+    if NUMPY_AVAILABLE:
+        np = _numpy()
+        array = np.asarray(values, dtype=np.float64)
+        total = float(array.sum())
+        mean = total / n
+        centered = array - mean
+        m2 = float(np.dot(centered, centered))
+        cxy = float(np.dot(np.arange(n, dtype=np.float64), centered))
+        return total, mean, m2, cxy
+    total = float(sum(values))
+    mean = total / n
+    centered = list(map(sub, values, repeat(mean)))
+    m2 = sum(map(mul, centered, centered))
+    cxy = sum(map(mul, range(n), centered))
+    return total, mean, m2, cxy
+
+
+def _finite_floats(values: Iterable[float]) -> Tuple[List[float], int]:
+    """转换为浮点列表并丢弃非有限值，返回 (有效值, 丢弃数量)。"""
+    raw = values if isinstance(values, list) else list(values)
+    total = float(sum(raw)) if raw else 0.0
+    if math.isfinite(total):
+        return raw, 0
+    data = list(filter(math.isfinite, map(float, raw)))
+    return data, len(raw) - len(data)
+
+
+def _chunks(values: Iterable[float], chunk_size: int) -> Iterator[List[float]]:
+    iterator = iter(values)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class OnlineStats:
+    """
+    常数内存的增量统计聚合器。
+
+    用法：
+
+        stats = OnlineStats(window=100)
+        for chunk in chunks:
+            stats.update_many(chunk)
+        summary = stats.summary()
+    """
+
+    def __init__(
+        self,
+        window: Optional[int] = None,
+        compression: float = 200.0,
+        track_extremes: int = 10,
+        reservoir_size: int = 1000,
+        seed: Optional[int] = None
+    ):
+        """
+        Args:
+            window: 滚动均值窗口；流式输入的长度事先未知，为 None 时不计算滚动均值
+            compression: t-digest 的压缩参数
+            track_extremes: 为离群值示例跟踪的最大值和最小值个数
+            reservoir_size: 蓄水池样本大小
+            seed: 蓄水池抽样的随机种子
+        """
+        if window is not None and window < 1:
+            raise ValueError("window must be at least 1")
+        self.window = window
+        self.track_extremes = track_extremes
+        self.digest = TDigest(compression)
+        self.reservoir = ReservoirSample(reservoir_size, seed=seed)
+
+        self.count = 0
+        self.dropped = 0
+        self.total = 0.0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self._cxy = 0.0
+
+        # 跟踪的最大和最小的若干个 (值, 下标)
+        self._largest: List[Tuple[float, int]] = []
+        self._smallest: List[Tuple[float, int]] = []
+
+        self._tail: List[float] = []
+        self.rolling_first: Optional[float] = None
+        self.rolling_last: Optional[float] = None
+        self.rolling_min = math.inf
+        self.rolling_max = -math.inf
+
+    def update(self, value: float) -> None:
+        """加入单个值；大量数据应使用 update_many。"""
+        self.update_many([value])
+
+    def update_many(self, values: Iterable[float]) -> None:
+        """
+        加入一块数值。
+
+        Args:
+            values: 数值块，非有限值会被丢弃并计入 dropped
+        """
+        data, dropped = _finite_floats(values)
+        self.dropped += dropped
+        m = len(data)
+        if m == 0:
+            return
+
+        start = self.count
+        chunk_total, chunk_mean, chunk_m2, chunk_cxy = _chunk_moments(data)
+
+        # Chan 合并：两组的离差平方和及协离差加上组均值差的修正项
+        # 已有部分的下标均值为 (start-1)/2，新块为 start+(m-1)/2，两者相差 n/2
+        n = start + m
+        delta = chunk_mean - self.mean
+        correction = start * m / n
+        self._m2 += chunk_m2 + delta * delta * correction
+        self._cxy += chunk_cxy + delta * (n / 2.0) * correction
+        self.count = n
+        self.total += chunk_total
+        self.mean += delta * m / n
+
+        self.digest.update_many(data)
+        self.reservoir.update_many(data)
+        self._track_extremes(data, start)
+        if self.window is not None:
+            self._update_rolling(data)
+
+    def _track_extremes(self, data: List[float], start: int) -> None:
+        k = self.track_extremes
+        if k <= 0:
+            return
+        # 门槛取本块第 k 名与已跟踪第 k 名中更严格的一个，
+        # 候选只有 k 个左右，筛选比较在 C 层完成
+        threshold = heapq.nlargest(k, data)[-1]
+        if len(self._largest) == k:
+            threshold = max(threshold, self._largest[-1][0])
+        candidates = [(data[i - start], i) for i in compress(count(start), map(threshold.__le__, data))]
+        self._largest = heapq.nlargest(k, self._largest + candidates)
+
+        threshold = heapq.nsmallest(k, data)[-1]
+        if len(self._smallest) == k:
+            threshold = min(threshold, self._smallest[-1][0])
+        candidates = [(data[i - start], i) for i in compress(count(start), map(threshold.__ge__, data))]
+        self._smallest = heapq.nsmallest(k, self._smallest + candidates)
+
+    def _update_rolling(self, data: List[float]) -> None:
+        window = self.window
+        values = self._tail + data
+        if len(values) >= window:
+            shift = values[0]
+            prefix = list(accumulate(map(sub, values, repeat(shift)), initial=0.0))
+            sums = list(map(sub, islice(prefix, window, None), prefix))
+            if self.rolling_first is None:
+                self.rolling_first = sums[0] / window + shift
+            self.rolling_last = sums[-1] / window + shift
+            self.rolling_min = min(self.rolling_min, min(sums) / window + shift)
+            self.rolling_max = max(self.rolling_max, max(sums) / window + shift)
+        self._tail = values[-(window - 1):] if window > 1 else []
+
+    def ingest(self, values: Iterable[float], chunk_size: int = DEFAULT_CHUNK_SIZE) -> "OnlineStats":
+        """按块消费任意可迭代对象（包括生成器），返回自身。"""
+        for chunk in _chunks(values, chunk_size):
+            self.update_many(chunk)
+        return self
+
+    def ingest_file(self, path: Union[str, Path], chunk_size: int = DEFAULT_CHUNK_SIZE) -> "OnlineStats":
+        """
+        从文本文件读取数值，每行可以有多个以空白或逗号分隔的数字。
+
+        无法解析为数字的记录（例如表头）会被跳过并计入 dropped。
+        """
+        with open(path, "r", encoding="utf-8") as handle:
+            chunk: List[float] = []
+            for line in handle:
+                tokens = line.replace(",", " ").split()
+                try:
+                    chunk.extend(map(float, tokens))
+                except ValueError:
+                    # 少见的慢路径：逐个解析，跳过无法解析的记录
+                    for token in tokens:
+                        try:
+                            chunk.append(float(token))
+                        except ValueError:
+                            self.dropped += 1
+                if len(chunk) >= chunk_size:
+                    self.update_many(chunk)
+                    chunk = []
+            if chunk:
+                self.update_many(chunk)
+        return self
+
+    @property
+    def variance(self) -> float:
+        """总体方差。"""
+        return self._m2 / self.count if self.count else 0.0
+
+    def summary(
+        self,
+        percentiles: Sequence[float] = DEFAULT_PERCENTILES,
+        outlier_method: str = "iqr",
+        outlier_threshold: Optional[float] = None,
+        max_outliers: int = 10
+    ) -> NumericSummary:
+        """
+        生成与 numeric_stats.summarize 相同结构的汇总。
+
+        矩、极值、趋势和滚动均值是精确的；百分位数和离群值数量是 t-digest 的估计值，
+        离群值示例来自跟踪的极值，因此最多 2 × track_extremes 个。
+        """
+        if outlier_method not in OUTLIER_METHODS:
+            raise ValueError(f"Unknown outlier method: {outlier_method}")
+        n = self.count
+        if n == 0:
+            return NumericSummary(count=0, dropped=self.dropped, backend="online")
+
+        threshold = (
+            outlier_threshold if outlier_threshold is not None
+            else DEFAULT_OUTLIER_THRESHOLDS[outlier_method]
+        )
+        wanted = sorted(set(float(p) for p in percentiles) | {25.0, 50.0, 75.0})
+        percentile_values = {p: self.digest.quantile(p / 100.0) for p in wanted}
+        variance = self.variance
+        std_dev = math.sqrt(variance)
+        slope, intercept, r_squared = _regression(n, self.mean, self._cxy, self._m2)
+
+        low, high = _fences(outlier_method, threshold, self.mean, std_dev, percentile_values)
+        candidates = [(index, value) for value, index in self._largest if value > high]
+        candidates += [(index, value) for value, index in self._smallest if value < low]
+        # 草图估计的数量不少于实际观察到的围栏外极值
+        estimated = round(self.digest.cdf(math.nextafter(low, -math.inf)) * n + (1.0 - self.digest.cdf(high)) * n)
+        outlier_count = max(estimated, len(candidates))
+
+        summary = NumericSummary(
+            count=n,
+            total=self.total,
+            mean=self.mean,
+            variance=variance,
+            std_dev=std_dev,
+            minimum=float(self.digest.minimum),
+            maximum=float(self.digest.maximum),
+            percentiles=percentile_values,
+            slope=slope,
+            intercept=intercept,
+            r_squared=r_squared,
+            trend=classify_trend(slope, r_squared, n),
+            outlier_method=outlier_method,
+            outlier_count=outlier_count,
+            outliers=sorted(candidates)[:max_outliers],
+            dropped=self.dropped,
+            backend="online",
+        )
+        if self.rolling_first is not None:
+            summary.window = self.window
+            summary.rolling_first, summary.rolling_last = self.rolling_first, self.rolling_last
+            summary.rolling_min, summary.rolling_max = self.rolling_min, self.rolling_max
+        return summary
+
+    @property
+    def sample(self) -> List[float]:
+        """当前的均匀随机样本。"""
+        return list(self.reservoir.items)
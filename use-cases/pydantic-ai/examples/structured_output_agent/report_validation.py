@@ -0,0 +1,220 @@
+"""结构化报告的本地修复与校验缓存
+
+模型输出没有通过 DataAnalysisReport 校验时，pydantic-ai 会把错误发回模型重新生成，
+每次重试都是一个完整的 LLM 往返。很多失败只是格式上的小偏差，可以在本地确定地修正：
+
+- data_quality 的大小写、空白或常见同义词（"Good"、"high"、"良好"）
+- 超出 [0, 1] 的置信度：百分数（85、"85%"）换算为小数，略超过 1 或为负的值截断到边界
+- 列表字段给成了单个字符串，key_insights 超过上限时保留前 10 条
+
+修复在模型的 wrap 校验器中、正式校验之前执行，修复后仍然无效的输出照常交给模型重试。
+ValidationStats 记录修复次数和避免的重试次数。
+
+另外提供按类型缓存的 TypeAdapter 和 JSON schema，本地校验已保存的报告时不重复构建。
+"""
+
+import functools
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Tuple
+
+from pydantic import TypeAdapter, ValidationError
+
+DATA_QUALITY_LEVELS = ("excellent", "good", "fair", "poor")
+# 模型常用的近义表达 -> 规范等级
+DATA_QUALITY_ALIASES = {
+    "very good": "excellent",
+    "great": "excellent",
+    "high": "good",
+    "medium": "fair",
+    "moderate": "fair",
+    "average": "fair",
+    "acceptable": "fair",
+    "low": "poor",
+    "bad": "poor",
+    "优秀": "excellent",
+    "良好": "good",
+    "好": "good",
+    "一般": "fair",
+    "中等": "fair",
+    "较差": "poor",
+    "差": "poor",
+}
+MAX_KEY_INSIGHTS = 10
+# 超过该值的置信度按 0-100 刻度理解（85 -> 0.85），1 到该值之间按溢出截断为 1.0
+PERCENT_SCALE_THRESHOLD = 1.5
+# 单个字符串可以包装成列表的字段
+REPORT_LIST_FIELDS = ("recommendations", "limitations", "data_sources")
+INSIGHT_LIST_FIELDS = ("data_points",)
+
+_PERCENT_PATTERN = re.compile(r"^\s*([-+]?\d+(?:\.\d+)?)\s*%\s*$")
+
+
+@dataclass
+class ValidationStats:
+    """报告校验次数、本地修复次数和避免的模型重试次数。"""
+    validations: int = 0
+    failures: int = 0
+    retries_avoided: int = 0
+    repairs: Dict[str, int] = field(default_factory=Counter)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """以字典形式返回统计信息，便于记录或展示。"""
+        return {
+            "validations": self.validations,
+            "failures": self.failures,
+            "retries_avoided": self.retries_avoided,
+            "repairs": dict(self.repairs)
+        }
+
+
+_stats = ValidationStats()
+
+
+def get_validation_stats() -> ValidationStats:
+    """获取进程内共享的校验统计。"""
+    return _stats
+
+
+def reset_validation_stats() -> None:
+    """清零校验统计（例如每个批次开始时）。"""
+    global _stats
+    _stats = ValidationStats()
+
+
+def _repair_data_quality(value: Any) -> Any:
+    """把大小写、空白或同义词不规范的数据质量等级映射到规范等级，无法识别时原样返回。"""
+    if not isinstance(value, str):
+        return value
+    normalized = " ".join(value.strip().lower().replace("_", " ").replace("-", " ").split())
+    if normalized in DATA_QUALITY_LEVELS:
+        return normalized
+    return DATA_QUALITY_ALIASES.get(normalized, value)
+
+
+def _repair_confidence(value: Any) -> Any:
+    """
+    把百分数换算为 [0, 1] 的小数，其余越界值截断到边界；无法识别时原样返回。
+
+    只有显式的百分数字符串（"85%"）和明显是 0-100 刻度的数值（大于
+    PERCENT_SCALE_THRESHOLD）才除以 100；略超过 1 的值（如 1.2）视为溢出，截断为 1.0。
+    """
+    if isinstance(value, str):
+        match = _PERCENT_PATTERN.match(value)
+        if match is None:
+            return value
+        value = float(match.group(1)) / 100.0
+    elif isinstance(value, bool) or not isinstance(value, (int, float)) or value != value:
+        return value
+    elif PERCENT_SCALE_THRESHOLD < value <= 100.0:
+        value = value / 100.0
+    return min(1.0, max(0.0, float(value)))
+
+
+def _repair_fields(
+    data: Dict[str, Any],
+    prefix: str,
+    confidence_field: str,
+    list_fields: Tuple[str, ...],
+    repairs: List[str]
+) -> None:
+    """就地修复置信度和列表字段，修复过的字段名追加到 repairs。"""
+    confidence = data.get(confidence_field)
+    if confidence is not None and not (
+        type(confidence) in (int, float) and 0.0 <= confidence <= 1.0
+    ):
+        repaired = _repair_confidence(confidence)
+        if repaired != confidence:
+            data[confidence_field] = repaired
+            repairs.append(f"{prefix}{confidence_field}")
+    for name in list_fields:
+        if isinstance(data.get(name), str):
+            data[name] = [data[name]]
+            repairs.append(f"{prefix}{name}")
+
+
+def repair_insight(data: Any) -> Tuple[Any, List[str]]:
+    """
+    修复单个 DataInsight 输入中常见的格式偏差。
+
+    Returns:
+        (修复后的数据, 修复过的字段名列表)；不需要修复时返回原对象
+    """
+    repairs: List[str] = []
+    if not isinstance(data, dict):
+        return data, repairs
+    repaired = dict(data)
+    _repair_fields(repaired, "", "confidence", INSIGHT_LIST_FIELDS, repairs)
+    return (repaired if repairs else data), repairs
+
+
+def repair_report(data: Any) -> Tuple[Any, List[str]]:
+    """
+    修复 DataAnalysisReport 输入（包括其中的洞察）中常见的格式偏差。
+
+    Returns:
+        (修复后的数据, 修复过的字段名列表)；不需要修复时返回原对象
+    """
+    repairs: List[str] = []
+    if not isinstance(data, dict):
+        return data, repairs
+    repaired = dict(data)
+
+    quality = repaired.get("data_quality")
+    if quality is not None and quality not in DATA_QUALITY_LEVELS:
+        fixed = _repair_data_quality(quality)
+        if fixed != quality:
+            repaired["data_quality"] = fixed
+            repairs.append("data_quality")
+
+    _repair_fields(repaired, "", "confidence_score", REPORT_LIST_FIELDS, repairs)
+
+    insights = repaired.get("key_insights")
+    if isinstance(insights, dict):
+        insights = [insights]
+        repairs.append("key_insights")
+    if isinstance(insights, list):
+        if len(insights) > MAX_KEY_INSIGHTS:
+            insights = insights[:MAX_KEY_INSIGHTS]
+            repairs.append("key_insights")
+        fixed_insights = []
+        for insight in insights:
+            fixed, insight_repairs = repair_insight(insight)
+            fixed_insights.append(fixed)
+            repairs.extend(f"key_insights.{name}" for name in insight_repairs)
+        repaired["key_insights"] = fixed_insights
+
+    return (repaired if repairs else data), repairs
+
+
+def validate_with_repair(data: Any, handler: Callable[[Any], Any]) -> Any:
+    """
+    供 DataAnalysisReport 的 wrap 校验器调用：先在本地修复，再执行正式校验并记录统计。
+
+    修复后校验通过的输出计为一次避免的模型重试；仍然失败的照常抛出 ValidationError，
+    由 pydantic-ai 发回模型重试。
+    """
+    repaired, repairs = repair_report(data)
+    _stats.validations += 1
+    try:
+        result = handler(repaired)
+    except ValidationError:
+        _stats.failures += 1
+        raise
+    if repairs:
+        _stats.retries_avoided += 1
+        _stats.repairs.update(repairs)
+    return result
+
+
+@functools.lru_cache(maxsize=None)
+def cached_type_adapter(tp: Any) -> TypeAdapter:
+    """按类型缓存的 TypeAdapter（构建核心校验器的开销只付一次）。"""
+    return TypeAdapter(tp)
+
+
+@functools.lru_cache(maxsize=None)
+def cached_json_schema(tp: Any) -> Dict[str, Any]:
+    """按类型缓存的 JSON schema。返回的是共享对象，调用方不应修改。"""
+    return cached_type_adapter(tp).json_schema()
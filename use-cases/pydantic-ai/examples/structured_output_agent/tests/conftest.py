@@ -0,0 +1,13 @@
+"""structured_output_agent 测试的公共设置
+
+示例模块之间按顶层模块互相导入（例如 `from numeric_stats import ...`），
+这里把示例目录加入 sys.path。
+"""
+
+import sys
+from pathlib import Path
+
+EXAMPLE_DIR = Path(__file__).resolve().parent.parent
+
+if str(EXAMPLE_DIR) not in sys.path:
+    sys.path.insert(0, str(EXAMPLE_DIR))
@@ -0,0 +1,47 @@
+"""结构化输出代理延迟构建的行为测试
+
+导入开销需要在全新的解释器中测量，因此在子进程中导入模块。
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import agent as agent_module
+from agent import get_structured_agent
+
+EXAMPLE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, sys
+sys.path.insert(0, sys.argv[1])
+import agent
+state = {
+    "openai_on_import": "openai" in sys.modules,
+    "agent_on_import": agent._structured_agent is not None,
+}
+agent.get_structured_agent()
+state["openai_after_build"] = "openai" in sys.modules
+print(json.dumps(state))
+"""
+
+
+def test_import_does_not_build_agent_or_load_openai(tmp_path):
+    completed = subprocess.run(
+        [sys.executable, "-c", PROBE, EXAMPLE_DIR],
+        cwd=tmp_path,
+        env={**os.environ, "LLM_API_KEY": "test-key"},
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    assert json.loads(completed.stdout.strip().splitlines()[-1]) == {
+        "openai_on_import": False,
+        "agent_on_import": False,
+        "openai_after_build": True,
+    }
+
+
+def test_module_attribute_builds_agent_once():
+    assert agent_module.structured_agent is get_structured_agent()
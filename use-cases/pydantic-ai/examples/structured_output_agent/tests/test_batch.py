@@ -0,0 +1,178 @@
+"""批量分析的重试分类和输入容错测试
+
+模型由 FunctionModel 代替，可以按调用次数返回报告或抛出模型 HTTP 错误。
+"""
+
+import argparse
+import asyncio
+import json
+from collections import Counter
+
+import pytest
+from pydantic_ai.exceptions import ModelHTTPError, UserError
+from pydantic_ai.messages import ModelResponse, ToolCallPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+from agent import get_structured_agent
+from batch import (
+    BatchItem,
+    InvalidInput,
+    analyze_data_batch,
+    as_batch_item,
+    is_retryable,
+    read_batch_inputs,
+    run_batch,
+)
+from data_ingest import DataIngestError
+
+REPORT = {
+    "summary": "Values increase.",
+    "key_insights": [{"insight": "Upward trend", "confidence": 0.9, "data_points": ["1, 2, 3"]}],
+    "confidence_score": 0.8,
+    "data_quality": "good",
+    "analysis_type": "trend",
+    "data_sources": ["inline"],
+}
+
+
+def scripted_model(failures=None):
+    """
+    构造按输入脚本化的模型：failures 把提示中出现的标记映射为依次抛出的错误列表，
+    错误用完后返回固定报告。
+    """
+    failures = {marker: list(errors) for marker, errors in (failures or {}).items()}
+    calls = Counter()
+
+    def respond(messages, info: AgentInfo) -> ModelResponse:
+        prompt = messages[0].parts[-1].content
+        for marker, errors in failures.items():
+            if marker in prompt:
+                calls[marker] += 1
+                if errors:
+                    raise errors.pop(0)
+        return ModelResponse(parts=[ToolCallPart(info.output_tools[0].name, REPORT)])
+
+    model = FunctionModel(respond)
+    model.calls = calls
+    return model
+
+
+async def collect(inputs, model, **kwargs):
+    kwargs.setdefault("base_delay", 0.001)
+    kwargs.setdefault("max_delay", 0.01)
+    with get_structured_agent().override(model=model):
+        return {result.id: result async for result in analyze_data_batch(inputs, **kwargs)}
+
+
+class TestIsRetryable:
+    @pytest.mark.parametrize("error", [
+        TimeoutError(),
+        asyncio.TimeoutError(),
+        ConnectionError(),
+        ConnectionResetError(),
+        ModelHTTPError(429, "gpt-4"),
+        ModelHTTPError(503, "gpt-4"),
+        RuntimeError("transient"),
+    ])
+    def test_transient_errors_are_retried(self, error):
+        assert is_retryable(error)
+
+    @pytest.mark.parametrize("error", [
+        FileNotFoundError("missing.csv"),
+        PermissionError("denied"),
+        ValueError("bad input"),
+        DataIngestError("unsupported format"),
+        UserError("misconfigured"),
+        ModelHTTPError(400, "gpt-4"),
+        ModelHTTPError(401, "gpt-4"),
+    ])
+    def test_permanent_errors_are_not_retried(self, error):
+        assert not is_retryable(error)
+
+
+class TestInputs:
+    def test_as_batch_item(self):
+        assert as_batch_item(3, "1, 2, 3") == BatchItem(id="3", input="1, 2, 3")
+        assert as_batch_item(0, {"id": 7, "path": "a.csv"}) == BatchItem(id="7", path="a.csv")
+
+    @pytest.mark.parametrize("value", [
+        {"id": "x"},
+        {"input": "1", "path": "a.csv"},
+        {"input": "1", "unknown": True},
+        InvalidInput(id="line-2", error="Invalid JSON"),
+    ])
+    def test_invalid_items_raise_value_error(self, value):
+        with pytest.raises(ValueError):
+            as_batch_item(0, value)
+
+    def test_unsupported_type_raises_type_error(self):
+        with pytest.raises(TypeError):
+            as_batch_item(0, 42)
+
+    def test_malformed_lines_become_invalid_inputs(self, tmp_path):
+        path = tmp_path / "inputs.jsonl"
+        path.write_text('{"id": "a", "input": "1, 2"}\n{not json\n\n"3, 4"\n', encoding="utf-8")
+        values = list(read_batch_inputs(path))
+        assert values[0] == {"id": "a", "input": "1, 2"}
+        assert isinstance(values[1], InvalidInput) and values[1].id == "line-2"
+        assert values[2] == "3, 4"
+
+
+class TestAnalyzeDataBatch:
+    async def test_malformed_rows_fail_without_aborting_batch(self):
+        inputs = [
+            "1, 2, 3",
+            {"id": "no-data"},
+            InvalidInput(id="line-3", error="Invalid JSON on line 3"),
+            42,
+            {"id": "ok", "input": "4, 5, 6"},
+        ]
+        results = await collect(inputs, scripted_model(), concurrency=2)
+
+        assert set(results) == {"0", "no-data", "line-3", "3", "ok"}
+        assert results["0"].ok and results["ok"].ok
+        for bad in ("no-data", "line-3", "3"):
+            assert not results[bad].ok
+            assert results[bad].attempts == 0
+        assert results["3"].error.startswith("TypeError")
+        assert "Invalid JSON" in results["line-3"].error
+
+    async def test_transient_errors_are_retried(self):
+        model = scripted_model({
+            "flaky": [ModelHTTPError(503, "test"), ModelHTTPError(429, "test")],
+            "timeout": [TimeoutError()],
+        })
+        results = await collect(["flaky 1, 2", "timeout 3, 4"], model, retries=2)
+        assert results["0"].ok and results["0"].attempts == 3
+        assert results["1"].ok and results["1"].attempts == 2
+
+    async def test_permanent_errors_are_not_retried(self):
+        model = scripted_model({"bad": [ModelHTTPError(400, "test")]})
+        results = await collect(["bad 1, 2"], model, retries=3)
+        assert not results["0"].ok
+        assert results["0"].attempts == 1
+        assert "ModelHTTPError" in results["0"].error
+
+    async def test_retries_are_bounded(self):
+        model = scripted_model({"down": [ModelHTTPError(503, "test")] * 5})
+        results = await collect(["down 1, 2"], model, retries=2)
+        assert not results["0"].ok
+        assert results["0"].attempts == 3
+        assert model.calls["down"] == 3
+
+    async def test_run_batch_records_malformed_lines(self, tmp_path):
+        inputs = tmp_path / "inputs.jsonl"
+        output = tmp_path / "results.jsonl"
+        inputs.write_text('"1, 2, 3"\n{broken\n{"id": "named", "input": "4, 5"}\n', encoding="utf-8")
+        args = argparse.Namespace(
+            inputs=str(inputs), output=str(output), resume=False, concurrency=2,
+            retries=0, timeout=None, report_format="technical", data_root=str(tmp_path)
+        )
+
+        with get_structured_agent().override(model=scripted_model()):
+            failed = await run_batch(args)
+
+        records = {record["id"]: record for record in map(json.loads, output.read_text().splitlines())}
+        assert failed == 1
+        assert records["0"]["ok"] and records["named"]["ok"]
+        assert not records["line-2"]["ok"]
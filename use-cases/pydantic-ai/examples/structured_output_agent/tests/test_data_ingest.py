@@ -0,0 +1,117 @@
+"""数据文件分块读取和列画像的行为测试"""
+
+import json
+import math
+
+import pytest
+
+from data_ingest import ColumnProfile, DataIngestError, detect_format, format_profile, profile_file
+
+
+def write_csv(path, header, rows):
+    path.write_text("\n".join([",".join(header)] + [",".join(row) for row in rows]) + "\n", encoding="utf-8")
+    return path
+
+
+class TestCsv:
+    def test_numeric_and_text_columns(self, tmp_path):
+        path = write_csv(tmp_path / "sales.csv", ["day", "amount", "region"], [
+            [str(i), str(10 + i), "north" if i % 3 else "south"] for i in range(30)
+        ])
+        profile = profile_file(path, chunk_rows=7)
+
+        assert profile.rows == 30
+        amount = profile.columns["amount"]
+        assert amount.is_numeric
+        assert amount.numeric.count == 30
+        assert amount.numeric.mean == pytest.approx(24.5)
+        region = profile.columns["region"]
+        assert not region.is_numeric
+        assert region.top_values == {"north": 20, "south": 10}
+
+    @pytest.mark.parametrize("filler", ["", "NA", "N/A", "n/a", "null", "NULL", "None", "NaN", "nan", " na ", "#N/A"])
+    def test_missing_value_fillers_do_not_break_numeric_columns(self, tmp_path, filler):
+        # 三分之一的值是占位符，如果按文本计数，这一列会被判为非数值列
+        rows = [[str(i), filler if i % 3 == 0 else str(i * 1.5)] for i in range(30)]
+        profile = profile_file(write_csv(tmp_path / "data.csv", ["id", "value"], rows))
+
+        value = profile.columns["value"]
+        assert value.nulls == 10
+        assert value.numeric.count == 20
+        assert (value.text_count, value.numeric.dropped) == (0, 0)
+        assert value.is_numeric
+        assert "value：n=20，缺失 10" in format_profile(profile)
+
+    def test_fillers_are_not_counted_as_text_values(self, tmp_path):
+        rows = [["a"], ["NA"], ["b"], ["null"], ["a"], [""]]
+        profile = profile_file(write_csv(tmp_path / "data.csv", ["label"], rows))
+
+        label = profile.columns["label"]
+        assert label.nulls == 3
+        assert label.top_values == {"a": 2, "b": 1}
+        assert len(label.distinct) == 2
+
+    def test_words_containing_fillers_are_text(self, tmp_path):
+        rows = [["nancy"], ["nullable"], ["NAB"], ["none of them"]]
+        label = profile_file(write_csv(tmp_path / "data.csv", ["label"], rows)).columns["label"]
+        assert (label.nulls, label.text_count) == (0, 4)
+
+    def test_short_rows_and_max_rows(self, tmp_path):
+        path = tmp_path / "data.csv"
+        path.write_text("a,b\n1,2\n3\n5,6\n7,8\n", encoding="utf-8")
+        profile = profile_file(path, max_rows=3, chunk_rows=2)
+        assert profile.rows == 3
+        assert profile.columns["b"].nulls == 1
+        assert profile.columns["b"].numeric.count == 2
+
+    def test_selected_columns(self, tmp_path):
+        path = write_csv(tmp_path / "data.csv", ["a", "b"], [["1", "x"]])
+        assert list(profile_file(path, columns=["a"]).columns) == ["a"]
+
+
+class TestJsonl:
+    def test_records_with_missing_and_filler_values(self, tmp_path):
+        path = tmp_path / "events.jsonl"
+        records = [{"n": 1, "kind": "click"}, {"n": "NA", "kind": None}, {"n": None}, {"n": "4", "extra": True}]
+        path.write_text("\n".join(map(json.dumps, records)) + "\n\n", encoding="utf-8")
+        profile = profile_file(path)
+
+        assert profile.rows == 4
+        n = profile.columns["n"]
+        assert (n.numeric.count, n.nulls) == (2, 2)
+        assert n.is_numeric
+        assert profile.columns["kind"].nulls == 3
+        # 后出现的列之前的行计为缺失
+        assert profile.columns["extra"].nulls == 3
+
+    def test_nan_values_are_missing(self):
+        # orjson 不接受 NaN 字面量，直接传入已解析的值（Parquet 的浮点列同样会走这里）
+        column = ColumnProfile("x")
+        column.add_raw([1.0, math.nan, 3.0, math.inf])
+        assert (column.numeric.count, column.nulls, column.numeric.dropped) == (2, 1, 1)
+
+    def test_invalid_line_raises(self, tmp_path):
+        path = tmp_path / "bad.jsonl"
+        path.write_text('{"x": 1}\n{broken\n', encoding="utf-8")
+        with pytest.raises(DataIngestError):
+            profile_file(path)
+
+    def test_empty_file(self, tmp_path):
+        path = tmp_path / "empty.jsonl"
+        path.write_bytes(b"")
+        assert profile_file(path).rows == 0
+
+
+class TestErrors:
+    def test_missing_file(self, tmp_path):
+        with pytest.raises(DataIngestError):
+            profile_file(tmp_path / "missing.csv")
+
+    def test_unsupported_extension(self, tmp_path):
+        with pytest.raises(DataIngestError):
+            detect_format(tmp_path / "data.xlsx")
+
+    def test_unsupported_format(self, tmp_path):
+        path = write_csv(tmp_path / "data.csv", ["a"], [["1"]])
+        with pytest.raises(DataIngestError):
+            profile_file(path, data_format="xml")
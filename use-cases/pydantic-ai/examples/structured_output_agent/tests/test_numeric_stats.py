@@ -0,0 +1,144 @@
+"""统计引擎（NumPy 和纯 Python 后端）的行为测试"""
+
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+
+import pytest
+
+from numeric_stats import (
+    NUMPY_AVAILABLE,
+    classify_trend,
+    format_summary,
+    rolling_mean,
+    summarize,
+)
+
+BACKENDS = ["numpy", "python"] if NUMPY_AVAILABLE else ["python"]
+EXAMPLE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def series(n: int, seed: int = 3):
+    rng = random.Random(seed)
+    return [100.0 + 0.2 * i + rng.gauss(0, 5) for i in range(n)]
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request):
+    return request.param
+
+
+class TestSummarize:
+    def test_known_values(self, backend):
+        summary = summarize([1.0, 2.0, 3.0, 4.0, 5.0], window=2, backend=backend)
+        assert summary.count == 5
+        assert summary.total == 15.0
+        assert summary.mean == 3.0
+        assert summary.variance == 2.0
+        assert (summary.minimum, summary.maximum) == (1.0, 5.0)
+        assert summary.percentiles[50.0] == 3.0
+        assert summary.percentiles[25.0] == 2.0
+        assert summary.slope == pytest.approx(1.0)
+        assert summary.intercept == pytest.approx(1.0)
+        assert summary.r_squared == pytest.approx(1.0)
+        assert summary.trend == "递增"
+        assert (summary.window, summary.rolling_first, summary.rolling_last) == (2, 1.5, 4.5)
+        assert summary.backend == backend
+
+    @pytest.mark.skipif(not NUMPY_AVAILABLE, reason="numpy is not installed")
+    @pytest.mark.parametrize("method", ["iqr", "zscore"])
+    def test_backends_agree(self, method):
+        values = series(2_000) + [10_000.0, -10_000.0]
+        fast = summarize(values, outlier_method=method, backend="numpy")
+        slow = summarize(values, outlier_method=method, backend="python")
+
+        for name in ("total", "mean", "variance", "slope", "intercept", "r_squared",
+                     "rolling_first", "rolling_last", "rolling_min", "rolling_max"):
+            assert getattr(fast, name) == pytest.approx(getattr(slow, name), rel=1e-9), name
+        assert fast.percentiles == pytest.approx(slow.percentiles)
+        assert (fast.window, fast.outlier_count, fast.outliers) == (slow.window, slow.outlier_count, slow.outliers)
+        assert fast.outlier_count >= 2
+
+    def test_non_finite_values_are_dropped(self, backend):
+        summary = summarize([1.0, math.nan, 3.0, math.inf, -math.inf], backend=backend)
+        assert (summary.count, summary.dropped, summary.mean) == (2, 3, 2.0)
+
+    def test_empty_input(self, backend):
+        summary = summarize([math.nan], backend=backend)
+        assert (summary.count, summary.dropped) == (0, 1)
+        assert format_summary("nothing", summary) == "未提供数值数据进行分析。"
+
+    def test_window_larger_than_data_skips_rolling_mean(self, backend):
+        summary = summarize([1.0, 2.0, 3.0], window=5, backend=backend)
+        assert summary.window == 0
+        assert summary.rolling_first is None
+
+    def test_window_of_one(self, backend):
+        summary = summarize([4.0, 1.0, 7.0], window=1, backend=backend)
+        assert (summary.window, summary.rolling_min, summary.rolling_max) == (1, 1.0, 7.0)
+
+    @pytest.mark.parametrize("window", [0, -1, -10])
+    def test_invalid_window_is_rejected(self, backend, window):
+        with pytest.raises(ValueError, match="window"):
+            summarize([1.0, 2.0, 3.0], window=window, backend=backend)
+
+    @pytest.mark.parametrize("kwargs", [
+        {"outlier_method": "mad"},
+        {"percentiles": [101.0]},
+        {"backend": "fortran"},
+    ])
+    def test_invalid_arguments_are_rejected(self, kwargs):
+        with pytest.raises(ValueError):
+            summarize([1.0, 2.0], **kwargs)
+
+
+class TestHelpers:
+    def test_rolling_mean(self):
+        assert rolling_mean([1.0, 2.0, 3.0, 4.0], 2) == pytest.approx([1.5, 2.5, 3.5])
+        assert rolling_mean([1.0], 2) == []
+        with pytest.raises(ValueError):
+            rolling_mean([1.0, 2.0], 0)
+
+    @pytest.mark.parametrize("slope, r_squared, count, expected", [
+        (1.0, 0.9, 1, "数据不足"),
+        (0.0, 0.9, 10, "平稳"),
+        (1.0, 0.01, 10, "平稳"),
+        (1.0, 0.9, 10, "递增"),
+        (-1.0, 0.9, 10, "递减"),
+    ])
+    def test_classify_trend(self, slope, r_squared, count, expected):
+        assert classify_trend(slope, r_squared, count) == expected
+
+    def test_format_summary_mentions_outliers(self):
+        text = format_summary("sales", summarize([1.0, 1.1, 0.9, 1.0, 50.0], backend="python"))
+        assert text.startswith("sales 的统计分析：")
+        assert "#4=50.00" in text
+
+
+PROBE = """
+import json, sys
+sys.path.insert(0, sys.argv[1])
+import numeric_stats
+state = {"numpy_on_import": "numpy" in sys.modules}
+if numeric_stats.NUMPY_AVAILABLE:
+    numeric_stats.summarize([1.0, 2.0, 3.0], backend="numpy")
+state["numpy_after_use"] = "numpy" in sys.modules
+print(json.dumps(state))
+"""
+
+
+def test_numpy_is_imported_on_first_use(tmp_path):
+    completed = subprocess.run(
+        [sys.executable, "-c", PROBE, EXAMPLE_DIR],
+        cwd=tmp_path,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    assert json.loads(completed.stdout.strip().splitlines()[-1]) == {
+        "numpy_on_import": False,
+        "numpy_after_use": NUMPY_AVAILABLE,
+    }
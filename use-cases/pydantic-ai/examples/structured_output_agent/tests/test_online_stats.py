@@ -0,0 +1,105 @@
+"""流式统计（分块合并和蓄水池抽样）的行为测试"""
+
+import math
+import random
+
+import pytest
+
+import online_stats
+from numeric_stats import NUMPY_AVAILABLE, summarize
+from online_stats import OnlineStats, ReservoirSample
+
+BACKENDS = [True, False] if NUMPY_AVAILABLE else [False]
+
+
+@pytest.fixture(params=BACKENDS, ids=lambda numpy: "numpy" if numpy else "python")
+def chunk_backend(request, monkeypatch):
+    """分别用 NumPy 和纯 Python 计算块内矩。"""
+    monkeypatch.setattr(online_stats, "NUMPY_AVAILABLE", request.param)
+
+
+def series(n: int, seed: int = 7):
+    rng = random.Random(seed)
+    # 较大的偏移量检验合并时的数值稳定性
+    return [1e6 + 0.5 * i + rng.gauss(0, 10) for i in range(n)]
+
+
+class TestChunkMerge:
+    @pytest.mark.parametrize("chunk_size", [1, 7, 100, 10_000])
+    def test_chunked_moments_match_exact(self, chunk_backend, chunk_size):
+        values = series(2_500)
+        exact = summarize(values, backend="python")
+        online = OnlineStats().ingest(values, chunk_size=chunk_size).summary()
+
+        assert online.count == exact.count
+        assert online.total == pytest.approx(exact.total, rel=1e-12)
+        assert online.mean == pytest.approx(exact.mean, rel=1e-12)
+        assert online.variance == pytest.approx(exact.variance, rel=1e-9)
+        assert online.slope == pytest.approx(exact.slope, rel=1e-9)
+        assert online.intercept == pytest.approx(exact.intercept, rel=1e-9)
+        assert online.r_squared == pytest.approx(exact.r_squared, rel=1e-9)
+        assert online.minimum == exact.minimum
+        assert online.maximum == exact.maximum
+
+    def test_uneven_chunks(self, chunk_backend):
+        values = series(1_000)
+        stats = OnlineStats()
+        for start, stop in [(0, 1), (1, 4), (4, 500), (500, 501), (501, 1_000)]:
+            stats.update_many(values[start:stop])
+        exact = summarize(values, backend="python")
+        assert stats.mean == pytest.approx(exact.mean, rel=1e-12)
+        assert stats.variance == pytest.approx(exact.variance, rel=1e-9)
+
+    def test_rolling_mean_across_chunks(self, chunk_backend):
+        values = series(300)
+        exact = summarize(values, window=10, backend="python")
+        online = OnlineStats(window=10).ingest(values, chunk_size=7).summary()
+        assert online.rolling_first == pytest.approx(exact.rolling_first)
+        assert online.rolling_last == pytest.approx(exact.rolling_last)
+        assert online.rolling_min == pytest.approx(exact.rolling_min)
+        assert online.rolling_max == pytest.approx(exact.rolling_max)
+
+    def test_non_finite_values_are_dropped(self, chunk_backend):
+        stats = OnlineStats().ingest([1.0, math.nan, 2.0, math.inf, 3.0])
+        assert stats.count == 3
+        assert stats.dropped == 2
+        assert stats.mean == 2.0
+
+    def test_percentiles_are_close(self):
+        values = series(20_000)
+        exact = summarize(values, backend="python")
+        online = OnlineStats().ingest(values, chunk_size=1_000).summary()
+        spread = exact.maximum - exact.minimum
+        for p, value in exact.percentiles.items():
+            assert online.percentiles[p] == pytest.approx(value, abs=0.01 * spread)
+
+
+class TestReservoirSample:
+    def test_keeps_everything_until_full(self):
+        sample = ReservoirSample(size=10, seed=1)
+        sample.update_many([1.0, 2.0, 3.0])
+        sample.update_many([4.0])
+        assert sample.items == [1.0, 2.0, 3.0, 4.0]
+
+    def test_size_is_bounded(self):
+        sample = ReservoirSample(size=10, seed=1)
+        for start in range(0, 1_000, 33):
+            sample.update_many([float(i) for i in range(start, min(start + 33, 1_000))])
+        assert len(sample.items) == 10
+        assert len(set(sample.items)) == 10
+
+    @pytest.mark.parametrize("chunk_size", [1, 3, 10])
+    def test_every_position_is_equally_likely(self, chunk_size):
+        size, n, trials = 5, 10, 4_000
+        hits = [0] * n
+        for seed in range(trials):
+            sample = ReservoirSample(size=size, seed=seed)
+            for start in range(0, n, chunk_size):
+                sample.update_many(list(range(start, min(start + chunk_size, n))))
+            for value in sample.items:
+                hits[value] += 1
+
+        expected = size / n
+        for index, count in enumerate(hits):
+            # 包括填满后紧接着的第一个元素（下标 size）
+            assert abs(count / trials - expected) < 0.05, f"index {index}: {count / trials:.3f}"
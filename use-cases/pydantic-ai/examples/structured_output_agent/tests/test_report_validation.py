@@ -0,0 +1,113 @@
+"""结构化报告本地修复的行为测试"""
+
+import math
+
+import pytest
+from pydantic import ValidationError
+
+from agent import DataAnalysisReport, DataInsight
+from report_validation import (
+    MAX_KEY_INSIGHTS,
+    _repair_confidence,
+    get_validation_stats,
+    repair_report,
+    reset_validation_stats,
+)
+
+
+def report_data(**overrides):
+    data = {
+        "summary": "Sales grew steadily.",
+        "key_insights": [{"insight": "Upward trend", "confidence": 0.9, "data_points": ["slope 0.5"]}],
+        "confidence_score": 0.8,
+        "data_quality": "good",
+        "analysis_type": "trend",
+        "data_sources": ["sales.csv"],
+    }
+    data.update(overrides)
+    return data
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats():
+    reset_validation_stats()
+    yield
+    reset_validation_stats()
+
+
+class TestRepairConfidence:
+    @pytest.mark.parametrize("value, expected", [
+        (1.2, 1.0),
+        (1.5, 1.0),
+        (1.51, 0.0151),
+        (85, 0.85),
+        (100, 1.0),
+        (250, 1.0),
+        (-0.1, 0.0),
+        ("85%", 0.85),
+        (" 42.5 % ", 0.425),
+        ("120%", 1.0),
+    ])
+    def test_repairs(self, value, expected):
+        assert _repair_confidence(value) == pytest.approx(expected)
+
+    @pytest.mark.parametrize("value", ["high", "0.8", True, None])
+    def test_unrecognized_values_are_returned_unchanged(self, value):
+        assert _repair_confidence(value) is value
+
+    def test_nan_is_returned_unchanged(self):
+        assert math.isnan(_repair_confidence(math.nan))
+
+
+class TestRepairReport:
+    def test_valid_report_is_untouched(self):
+        data = report_data()
+        repaired, repairs = repair_report(data)
+        assert repaired is data
+        assert repairs == []
+
+    def test_near_misses_are_repaired(self):
+        insights = [{"insight": f"i{n}", "confidence": 1.2, "data_points": "one point"} for n in range(12)]
+        data = report_data(
+            data_quality=" Good ",
+            confidence_score="85%",
+            recommendations="Keep going",
+            key_insights=insights,
+        )
+        repaired, repairs = repair_report(data)
+
+        assert repaired["data_quality"] == "good"
+        assert repaired["confidence_score"] == pytest.approx(0.85)
+        assert repaired["recommendations"] == ["Keep going"]
+        assert len(repaired["key_insights"]) == MAX_KEY_INSIGHTS
+        assert repaired["key_insights"][0] == {"insight": "i0", "confidence": 1.0, "data_points": ["one point"]}
+        assert {"data_quality", "confidence_score", "recommendations", "key_insights"} <= set(repairs)
+        # 原始输入不被修改
+        assert data["confidence_score"] == "85%"
+
+    @pytest.mark.parametrize("alias, level", [("High", "good"), ("良好", "good"), ("very-good", "excellent"), ("LOW", "poor")])
+    def test_data_quality_aliases(self, alias, level):
+        repaired, _ = repair_report(report_data(data_quality=alias))
+        assert repaired["data_quality"] == level
+
+
+class TestModelValidation:
+    def test_repaired_report_counts_as_avoided_retry(self):
+        report = DataAnalysisReport.model_validate(report_data(confidence_score=1.2, data_quality="Excellent"))
+        assert report.confidence_score == 1.0
+        assert report.data_quality == "excellent"
+
+        stats = get_validation_stats()
+        assert (stats.validations, stats.failures, stats.retries_avoided) == (1, 0, 1)
+        assert stats.repairs["confidence_score"] == 1
+
+    def test_unrepairable_report_still_fails(self):
+        with pytest.raises(ValidationError):
+            DataAnalysisReport.model_validate(report_data(data_quality="unknown"))
+        stats = get_validation_stats()
+        assert (stats.failures, stats.retries_avoided) == (1, 0)
+
+    def test_insight_repaired_on_its_own(self):
+        insight = DataInsight.model_validate({"insight": "x", "confidence": "90%", "data_points": "p"})
+        assert insight.confidence == pytest.approx(0.9)
+        assert insight.data_points == ["p"]
@@ -13,19 +13,19 @@ import logging
 import math
 import json
 import asyncio
+import functools
+import weakref
 from dataclasses import dataclass
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, TYPE_CHECKING
 from datetime import datetime
 import aiohttp
 from pydantic_settings import BaseSettings
 from pydantic import Field
 from pydantic_ai import Agent, RunContext
-from pydantic_ai.providers.openai import OpenAIProvider
-from pydantic_ai.models.openai import OpenAIModel
 from dotenv import load_dotenv
 
-# 加载环境变量
-load_dotenv()
+if TYPE_CHECKING:
+    from pydantic_ai.models.openai import OpenAIModel
 
 logger = logging.getLogger(__name__)
 
@@ -39,13 +39,23 @@ class Settings(BaseSettings):
     llm_model: str = Field(default="gpt-4")
     llm_base_url: str = Field(default="https://api.openai.com/v1")
     
+    # 工具执行配置：一次响应中的多个工具调用并发（parallel）或逐个（sequential）执行
+    tool_execution_mode: str = Field(default="parallel")
+    tool_max_concurrency: int = Field(default=4, ge=1)
+    
     class Config:
         env_file = ".env"
         case_sensitive = False
 
 
-def get_llm_model() -> OpenAIModel:
+def get_llm_model() -> "OpenAIModel":
     """从环境设置获取配置的 LLM 模型。"""
+    # 延迟导入 OpenAI SDK 并加载环境变量，只有真正构建代理时才付出这部分开销
+    from pydantic_ai.providers.openai import OpenAIProvider
+    from pydantic_ai.models.openai import OpenAIModel
+    
+    load_dotenv()
+    
     try:
         settings = Settings()
         provider = OpenAIProvider(
@@ -93,15 +103,6 @@ SYSTEM_PROMPT = """
 """
 
 
-# 创建工具启用代理 - 注意：没有 result_type，默认为字符串
-tool_agent = Agent(
-    get_llm_model(),
-    deps_type=ToolDependencies,
-    system_prompt=SYSTEM_PROMPT
-)
-
-
-@tool_agent.tool
 async def web_search(
     ctx: RunContext[ToolDependencies], 
     query: str,
@@ -182,7 +183,6 @@ async def web_search(
         return f"搜索错误：{str(e)}"
 
 
-@tool_agent.tool
 def calculate(
     ctx: RunContext[ToolDependencies],
     expression: str,
@@ -228,7 +228,6 @@ def calculate(
         return f"计算错误：{str(e)}\n表达式：{expression}"
 
 
-@tool_agent.tool
 def format_data(
     ctx: RunContext[ToolDependencies],
     data: str,
@@ -286,7 +285,6 @@ def format_data(
         return f"格式化错误：{str(e)}"
 
 
-@tool_agent.tool
 def get_current_time(ctx: RunContext[ToolDependencies]) -> str:
     """
     获取当前日期和时间。
@@ -298,6 +296,100 @@ def get_current_time(ctx: RunContext[ToolDependencies]) -> str:
     return now.strftime("%Y-%m-%d %H:%M:%S UTC")
 
 
+def limit_tool_concurrency(tools, mode: str = "parallel", max_concurrency: int = 4) -> list:
+    """
+    为一组工具加上每次运行的并发上限。
+
+    pydantic-ai 会并发执行同一响应中的多个工具调用，并按调用顺序写回结果；
+    这里为每次运行（以 deps 对象区分，deps 不支持弱引用时以本次运行的 usage 区分）
+    分配一个信号量，限制同时执行的数量，
+    sequential 模式下按调用顺序逐个执行。多次运行共用同一个代理实例时互不等待。
+
+    Args:
+        tools: 工具函数列表（第一个参数为 RunContext）
+        mode: "parallel" 或 "sequential"
+        max_concurrency: parallel 模式下每次运行的并发上限
+
+    Returns:
+        保留原签名和文档字符串的异步包装函数列表
+    """
+    if mode not in ("parallel", "sequential"):
+        raise ValueError(f"Unknown tool execution mode: {mode}")
+    limit = 1 if mode == "sequential" else max_concurrency
+    # 运行标识的 id -> (事件循环, 信号量)；信号量绑定事件循环，事件循环变化时重新创建
+    semaphores: Dict[int, Any] = {}
+
+    def run_owner(ctx: RunContext) -> Any:
+        # deps 为 None 或不支持弱引用（例如字符串、元组）时，用本次运行独有的 usage 对象标识运行
+        try:
+            weakref.ref(ctx.deps)
+            return ctx.deps
+        except TypeError:
+            return ctx.usage
+
+    def semaphore_for(ctx: RunContext) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        owner = run_owner(ctx)
+        key = id(owner)
+        entry = semaphores.get(key)
+        if entry is None or entry[0] is not loop:
+            if entry is None:
+                # 运行结束、标识对象被回收时丢弃它的信号量
+                weakref.finalize(owner, semaphores.pop, key, None)
+            entry = semaphores[key] = (loop, asyncio.Semaphore(limit))
+        return entry[1]
+
+    def wrap(function):
+        is_async = asyncio.iscoroutinefunction(function)
+
+        @functools.wraps(function)
+        async def limited(ctx: RunContext, *args, **kwargs):
+            async with semaphore_for(ctx):
+                if is_async:
+                    return await function(ctx, *args, **kwargs)
+                return await asyncio.to_thread(functools.partial(function, ctx, *args, **kwargs))
+
+        return limited
+
+    return [wrap(tool) for tool in tools]
+
+
+_tool_agent: Optional[Agent] = None
+
+
+def get_tool_agent() -> Agent:
+    """
+    获取工具启用代理，首次使用时才构建（包括加载设置和创建模型），之后复用。
+    
+    Returns:
+        注册了所有工具的代理
+    """
+    global _tool_agent
+    if _tool_agent is None:
+        # 创建工具启用代理 - 注意：没有 result_type，默认为字符串
+        agent = Agent(
+            get_llm_model(),
+            deps_type=ToolDependencies,
+            system_prompt=SYSTEM_PROMPT
+        )
+        settings = Settings()
+        for tool in limit_tool_concurrency(
+            (web_search, calculate, format_data, get_current_time),
+            mode=settings.tool_execution_mode,
+            max_concurrency=settings.tool_max_concurrency
+        ):
+            agent.tool(tool)
+        _tool_agent = agent
+    return _tool_agent
+
+
+def __getattr__(name: str):
+    """保持 `from agent import tool_agent` 可用，同时延迟构建代理。"""
+    if name == "tool_agent":
+        return get_tool_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 async def ask_agent(
     question: str, 
     dependencies: Optional[ToolDependencies] = None
@@ -318,7 +410,7 @@ async def ask_agent(
         dependencies = ToolDependencies(session=session)
     
     try:
-        result = await tool_agent.run(question, deps=dependencies)
+        result = await get_tool_agent().run(question, deps=dependencies)
         return result.data
     finally:
         # 如果是我们创建的会话，则清理它
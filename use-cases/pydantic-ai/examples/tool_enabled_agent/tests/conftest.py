@@ -0,0 +1,14 @@
+"""tool_enabled_agent 测试的公共设置
+
+structured_output_agent 同样有顶层模块 `agent`，两组测试在同一进程中运行时会冲突，
+因此这里把 examples 目录加入 sys.path，测试以 `tool_enabled_agent.agent`
+（命名空间包）的形式导入示例模块。
+"""
+
+import sys
+from pathlib import Path
+
+EXAMPLES_DIR = Path(__file__).resolve().parent.parent.parent
+
+if str(EXAMPLES_DIR) not in sys.path:
+    sys.path.append(str(EXAMPLES_DIR))
@@ -0,0 +1,93 @@
+"""每次运行的工具并发上限的行为测试
+
+模型由 FunctionModel 代替：第一次响应同时发出多个工具调用，第二次返回文本。
+"""
+
+import asyncio
+
+import pytest
+from pydantic_ai import Agent, RunContext
+from pydantic_ai.messages import ModelResponse, TextPart, ToolCallPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+from tool_enabled_agent.agent import ToolDependencies, limit_tool_concurrency
+
+
+class Probe:
+    """记录同时执行的工具调用数。"""
+
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+        self.order = []
+
+    async def slow_tool(self, ctx: RunContext, n: int) -> str:
+        """Sleep briefly and echo n."""
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(0.02)
+            self.order.append(n)
+            return f"done {n}"
+        finally:
+            self.active -= 1
+
+
+def fan_out_model(calls: int) -> FunctionModel:
+    def respond(messages, info: AgentInfo) -> ModelResponse:
+        if len(messages) == 1:
+            return ModelResponse(parts=[
+                ToolCallPart("slow_tool", {"n": n}, tool_call_id=f"call-{n}") for n in range(calls)
+            ])
+        return ModelResponse(parts=[TextPart("finished")])
+
+    return FunctionModel(respond)
+
+
+def build_agent(probe: Probe, deps_type=ToolDependencies, **kwargs) -> Agent:
+    agent = Agent(fan_out_model(6), deps_type=deps_type)
+    for tool in limit_tool_concurrency([probe.slow_tool], **kwargs):
+        agent.tool(tool, name="slow_tool")
+    return agent
+
+
+class TestLimitToolConcurrency:
+    async def test_parallel_calls_are_capped_per_run(self):
+        probe = Probe()
+        result = await build_agent(probe, max_concurrency=2).run("go", deps=ToolDependencies())
+        assert result.output == "finished"
+        assert probe.peak == 2
+        assert sorted(probe.order) == list(range(6))
+
+    async def test_sequential_mode_runs_in_call_order(self):
+        probe = Probe()
+        await build_agent(probe, mode="sequential").run("go", deps=ToolDependencies())
+        assert probe.peak == 1
+        assert probe.order == list(range(6))
+
+    async def test_runs_do_not_share_a_limit(self):
+        probe = Probe()
+        agent = build_agent(probe, max_concurrency=2)
+        await asyncio.gather(
+            agent.run("go", deps=ToolDependencies()),
+            agent.run("go", deps=ToolDependencies()),
+        )
+        assert probe.peak == 4
+
+    @pytest.mark.parametrize("deps", [None, "config", ("a", 1)], ids=["none", "str", "tuple"])
+    async def test_deps_without_weak_references(self, deps):
+        probe = Probe()
+        agent = build_agent(probe, deps_type=type(deps), max_concurrency=2)
+        result = await agent.run("go", deps=deps)
+        assert result.output == "finished"
+        assert probe.peak == 2
+
+    async def test_none_deps_runs_do_not_share_a_limit(self):
+        probe = Probe()
+        agent = build_agent(probe, deps_type=type(None), max_concurrency=2)
+        await asyncio.gather(agent.run("go"), agent.run("go"))
+        assert probe.peak == 4
+
+    def test_unknown_mode_rejected(self):
+        with pytest.raises(ValueError):
+            limit_tool_concurrency([Probe().slow_tool], mode="burst")